@@ -0,0 +1,96 @@
+"""
+Compares the encoded size and the encode and decode time of the stack
+codecs against the previous pretty printed json attributes.
+
+Usage::
+
+    python benchmarks/codec_bench.py [resources] [iterations]
+"""
+from __future__ import print_function
+
+import sys
+import json
+import time
+
+from shepherd.common.exceptions import ConfigError
+from shepherd.common.serialization import get_codec, decode
+
+
+def make_stack(resources):
+    return {
+        'settings': {
+            'retries': 120, 'delay': 5, 'verbosity': 2,
+            'storage': {'name': 'DynamoStorage', 'settings': {}},
+            'vars': dict(('var{}'.format(i), 'value{}'.format(i)) for i in range(50)),
+        },
+        'resources': [
+            {
+                'local_name': 'Instance{}'.format(i),
+                'global_name': 'Instance{}_stack_2015-01-01-00-00-00'.format(i),
+                'type': 'Instance', 'provider': 'aws', 'available': True,
+                'image_id': 'ami-1234', 'instance_type': 't2.micro',
+                'security_groups': ['WebSecurityGroup', 'SSHSecurityGroup'],
+                'tags': {'role': 'web', 'stack_name': 'stack'},
+                'volumes': [{'VolumeId': 'vol-{}'.format(i), 'Device': '/dev/sdf'}],
+            }
+            for i in range(resources)
+        ],
+    }
+
+
+def legacy_decode(value):
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def bench(label, encode, decode, values, iterations):
+    start = time.time()
+    for _ in range(iterations):
+        encoded = [encode(value) for value in values]
+    encode_time = (time.time() - start) / iterations
+
+    start = time.time()
+    for _ in range(iterations):
+        for value in encoded:
+            decode(value)
+    decode_time = (time.time() - start) / iterations
+
+    size = sum(len(value) for value in encoded)
+    print('{:20} {:10} bytes  encode {:.5f}s  decode {:.5f}s'.format(
+        label, size, encode_time, decode_time
+    ))
+
+
+def main(resources=200, iterations=20):
+    stack = make_stack(resources)
+    values = [stack['settings']] + stack['resources']
+
+    bench('legacy json', json.dumps, legacy_decode, values, iterations)
+
+    for settings in (
+        {'format': 'json'},
+        {'format': 'json', 'compression': 'zlib', 'threshold': 0},
+        {'format': 'json', 'compression': 'zstd', 'threshold': 0},
+        {'format': 'msgpack'},
+        {'format': 'msgpack', 'compression': 'zlib', 'threshold': 0},
+    ):
+        label = '+'.join(filter(None, [settings['format'], settings.get('compression')]))
+
+        try:
+            codec = get_codec(settings)
+        except ConfigError:
+            print('{:20} not installed'.format(label))
+            continue
+
+        bench(label, codec.encode, decode, values, iterations)
+
+    # The whole stack as a single value, ie: a FileStorage document
+    for label, settings in (('json (stack)', None), ('json+zlib (stack)', {'compression': 'zlib'})):
+        codec = get_codec(settings)
+        bench(label, codec.encode, decode, [stack], iterations)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
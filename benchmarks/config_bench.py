@@ -0,0 +1,52 @@
+"""
+Measures the cold and warm startup time of a Config.
+
+Usage::
+
+    python benchmarks/config_bench.py [iterations]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from shepherd.config import Config, REGISTRY
+
+
+def timed(settings, name):
+    start = time.time()
+    Config(settings, name)
+    return time.time() - start
+
+
+def main(iterations=20):
+    tmpdir = tempfile.mkdtemp()
+    settings = {
+        'verbosity': 0,
+        'plugin_index': os.path.join(tmpdir, 'plugins.json'),
+    }
+
+    try:
+        REGISTRY.clear()
+        cold = timed({'verbosity': 0}, 'bench')
+
+        REGISTRY.clear()
+        timed(settings, 'bench')
+        REGISTRY.clear()
+        indexed = timed(settings, 'bench')
+
+        warm = [timed(settings, 'bench') for _ in range(iterations)]
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print('cold:          {:.4f}s'.format(cold))
+    print('cold (index):  {:.4f}s'.format(indexed))
+    print('warm (mean):   {:.4f}s over {} configs'.format(sum(warm) / len(warm), iterations))
+    print('registry:      {}'.format(REGISTRY.stats))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,59 @@
+"""
+Compares searching stacks in DynamoStorage through the tag index
+against a full table scan, using moto's mock dynamodb.
+
+Usage::
+
+    python benchmarks/dynamo_bench.py [stacks] [searches]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from moto import mock_dynamodb
+
+from shepherd.storage.dynamo import DynamoStorage
+
+
+def make_stack(index):
+    return {
+        'global_name': 'stack{}_2015-01-01-00-00-00'.format(index),
+        'local_name': 'stack{}'.format(index),
+        'tags': {
+            'stack_name': 'stack{}'.format(index % 1000),
+            'environment_name': 'env{}'.format(index % 10),
+            'stack_creation': '2015-01-01-00-00-00',
+        },
+        'resources': [],
+    }
+
+
+def timed(store, tags, searches):
+    start = time.time()
+    for _ in range(searches):
+        store.search(tags)
+    return (time.time() - start) / searches
+
+
+@mock_dynamodb
+def main(stacks=100000, searches=10):
+    store = DynamoStorage()
+
+    start = time.time()
+    for index in range(stacks):
+        store.dump(make_stack(index))
+    print('dump:          {:.2f}s for {} stacks'.format(time.time() - start, stacks))
+
+    tags = {'stack_name': 'stack7'}
+    indexed = timed(store, tags, searches)
+
+    store.configure({'indexed_tags': []})
+    scanned = timed(store, tags, searches)
+
+    print('search (index): {:.4f}s'.format(indexed))
+    print('search (scan):  {:.4f}s'.format(scanned))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,66 @@
+"""
+Compares a ParseCache hit, which unpickles a copy of the cached manifest,
+against deepcopying the parsed manifest and reparsing the file.
+
+Usage::
+
+    python benchmarks/manifest_bench.py [count] [iterations]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import tempfile
+
+from shepherd.manifest import ParseCache, parse
+
+
+def make_manifest(count):
+    resources = {}
+    for i in range(count):
+        resources['WebServer{}'.format(i)] = {
+            'provider': 'aws',
+            'type': 'Instance',
+            'image_id': '{{ webserver_ami }}',
+            'instance_type': '{{ instance_type }}',
+            'security_groups': ['WebServerSecurityGroup', 'sg-1234'],
+            'volumes': [{'VolumeID': 'Volume{}'.format(i), 'Device': '/dev/sdf'}],
+        }
+
+    return {'vars': {'instance_type': 't1.micro'}, 'resources': resources}
+
+
+def main(count=2000, iterations=20):
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        filename = os.path.join(tmpdir, 'manifest.json')
+        with open(filename, 'w') as fobj:
+            json.dump(make_manifest(count), fobj)
+
+        with open(filename, 'rb') as fobj:
+            content = fobj.read()
+
+        cache = ParseCache()
+        parsed = cache.load(filename)
+
+        for label, function in (
+            ('reparse', lambda: parse(filename, content)),
+            ('deepcopy', lambda: copy.deepcopy(parsed)),
+            ('cache hit', lambda: cache.load(filename)),
+        ):
+            start = time.time()
+            for _ in range(iterations):
+                function()
+            elapsed = (time.time() - start) / iterations
+            print('{:10} {:.4f}s per load of {} resources'.format(label, elapsed, count))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,46 @@
+"""
+Measures the memory used per resource when holding many resources
+in memory (requires python 3.4+ for tracemalloc).
+
+Usage::
+
+    python benchmarks/memory_bench.py [count]
+"""
+from __future__ import print_function
+
+import gc
+import sys
+import tracemalloc
+
+from resource_bench import make_data
+
+
+def main(count=10000):
+    data = make_data(count)
+
+    # Warm up the per class state so it isn't attributed to the resources.
+    for cls, values in data[:10]:
+        cls().deserialize(values)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    resources = []
+    for cls, values in data:
+        resource = cls()
+        resource.deserialize(values)
+        resources.append(resource)
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print('resources: {}'.format(len(resources)))
+    print('total:     {:.1f} KiB'.format(total / 1024.0))
+    print('per item:  {:.0f} bytes'.format(total / float(count)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,70 @@
+"""
+Measures the deserialize and serialize throughput of resources.
+
+Usage::
+
+    python benchmarks/resource_bench.py [count]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+from shepherd.resources.aws.instance import Instance
+from shepherd.resources.aws.volume import Volume
+from shepherd.resources.aws.securitygroup import SecurityGroup
+from shepherd.resources.aws.key import AccessKey
+
+
+def make_data(count):
+    templates = [
+        (Instance, {
+            'type': 'Instance', 'provider': 'aws', 'ImageId': 'ami-1234',
+            'InstanceType': 't2.micro', 'KeyName': 'test', 'SecurityGroups': ['sg'],
+            'Tags': {'role': 'web'}, 'Volumes': [{'VolumeId': 'vol', 'Device': '/dev/sdf'}],
+        }),
+        (Volume, {
+            'type': 'Volume', 'provider': 'aws', 'AvailabilityZone': 'a',
+            'Size': 10, 'Iops': 500, 'VolumeId': 'vol-1234',
+        }),
+        (SecurityGroup, {
+            'type': 'SecurityGroup', 'provider': 'aws', 'GroupDescription': 'test',
+        }),
+        (AccessKey, {
+            'type': 'AccessKey', 'provider': 'aws', 'UserName': 'test',
+            'AccessKey': {'AccessKeyId': 'AKID'},
+        }),
+    ]
+
+    data = []
+    for i in range(count):
+        cls, template = templates[i % len(templates)]
+        values = dict(template)
+        values['local_name'] = 'Resource{}'.format(i)
+        data.append((cls, values))
+
+    return data
+
+
+def main(count=10000):
+    data = make_data(count)
+
+    start = time.time()
+    resources = []
+    for cls, values in data:
+        resource = cls()
+        resource.deserialize(values)
+        resources.append(resource)
+    deserialize = time.time() - start
+
+    start = time.time()
+    for resource in resources:
+        resource.serialize()
+    serialize = time.time() - start
+
+    print('deserialize: {:.3f}s ({:.0f} resources/s)'.format(deserialize, count / deserialize))
+    print('serialize:   {:.3f}s ({:.0f} resources/s)'.format(serialize, count / serialize))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
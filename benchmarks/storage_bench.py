@@ -0,0 +1,78 @@
+"""
+Measures dumping, loading and searching stacks with the local storage plugins.
+
+Usage::
+
+    python benchmarks/storage_bench.py [stacks] [resources]
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+from shepherd.storage.file import FileStorage
+from shepherd.storage.sqlite import SqliteStorage
+
+
+def make_stack(index, resources):
+    return {
+        'global_name': 'stack{}_2015-01-01-00-00-00'.format(index),
+        'local_name': 'stack{}'.format(index),
+        'config_name': 'bench',
+        'settings': {'retries': 0, 'delay': 0},
+        'tags': {
+            'stack_name': 'stack{}'.format(index % 100),
+            'stack_creation': '2015-01-01-00-00-00',
+        },
+        'resources': [
+            {'local_name': 'resource{}'.format(i), 'type': 'Volume', 'size': i}
+            for i in range(resources)
+        ],
+    }
+
+
+def timed(label, function, count):
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    print('{:20} {:.4f}s ({:.6f}s each)'.format(label, elapsed, elapsed / count))
+
+
+def bench(label, store, stacks):
+    names = [stack['global_name'] for stack in stacks]
+
+    print(label)
+    timed('  dump', lambda: [store.dump(stack) for stack in stacks], len(stacks))
+    timed('  dump_many', lambda: store.dump_many(stacks), len(stacks))
+    timed('  load', lambda: [store.load(name) for name in names], len(stacks))
+    timed('  load_many', lambda: store.load_many(names), len(stacks))
+    timed('  dump_delta', lambda: [store.dump_delta({
+        'global_name': stack['global_name'],
+        'resource_names': [r['local_name'] for r in stack['resources']],
+        'resources': stack['resources'][:1],
+    }) for stack in stacks], len(stacks))
+    timed('  search', lambda: [store.search({'stack_name': 'stack7'}) for _ in range(100)], 100)
+    timed('  delete_many', lambda: store.delete_many(names), len(stacks))
+
+
+def main(count=1000, resources=20):
+    stacks = [make_stack(index, resources) for index in range(count)]
+    tmpdir = tempfile.mkdtemp()
+
+    try:
+        store = FileStorage()
+        store.configure({'path': tmpdir})
+        bench('FileStorage', store, stacks)
+
+        store = SqliteStorage()
+        store.configure({'path': os.path.join(tmpdir, 'stacks.db')})
+        bench('SqliteStorage', store, stacks)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
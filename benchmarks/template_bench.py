@@ -0,0 +1,67 @@
+"""
+Compares rendering manifest resources by walking the structure with
+the TemplateEngine against dumping, rendering and reparsing them as json.
+
+Usage::
+
+    python benchmarks/template_bench.py [count] [iterations]
+"""
+from __future__ import print_function
+
+import sys
+import json
+import time
+
+from jinja2 import Template, StrictUndefined
+
+from shepherd.common.templates import TemplateEngine
+
+
+def make_resources(count):
+    resources = {}
+    for i in range(count):
+        resources['WebServer{}'.format(i)] = {
+            'provider': 'aws',
+            'type': 'Instance',
+            'image_id': '{{ webserver_ami }}',
+            'instance_type': '{{ instance_type }}',
+            'key_name': '{{ key_name }}',
+            'user_data': '#!/bin/bash\necho "initializing {{ stack_name }}"\n',
+            'security_groups': ['WebServerSecurityGroup', 'sg-1234'],
+            'volumes': [{'VolumeID': 'Volume{}'.format(i), 'Device': '/dev/sdf'}],
+        }
+
+    return resources
+
+
+def render_json(resources, context):
+    template = Template(json.dumps(resources))
+    template.environment.undefined = StrictUndefined
+    return json.loads(template.render(context))
+
+
+def main(count=2000, iterations=5):
+    resources = make_resources(count)
+    context = {
+        'webserver_ami': 'ami-abcd1234',
+        'instance_type': 't1.micro',
+        'key_name': 'mykey',
+        'stack_name': 'bench',
+    }
+    engine = TemplateEngine()
+
+    assert engine.render(resources, context) == render_json(resources, context)
+
+    for label, function in (
+        ('json', lambda: render_json(resources, context)),
+        ('structure', lambda: engine.render(resources, context)),
+    ):
+        start = time.time()
+        for _ in range(iterations):
+            function()
+        elapsed = (time.time() - start) / iterations
+        print('{:10} {:.4f}s per render of {} resources'.format(label, elapsed, count))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -22,8 +22,6 @@ TODO:
     - Provide a sample playbook repo with a requirements.yml file
 """
 import os
-import anyconfig
-import jsonschema
 import envoy
 import shutil
 import logging
@@ -33,6 +31,7 @@ from within.shell import working_directory
 from tempfile import mkdtemp
 
 from shepherd.stack import Stack
+from shepherd.common.schemas import validate
 from shepherd.common.plugins import Action
 
 logger = logging.getLogger(__name__)
@@ -57,9 +56,8 @@ class Ansible(Action):
         path = os.path.dirname(os.path.realpath(__file__))
         schema_file = os.path.join(path, 'ansible.schema')
         assert os.path.isfile(schema_file)
-        schema = anyconfig.load(schema_file, 'json')
 
-        jsonschema.validate(kwargs, schema)
+        validate(schema_file, kwargs)
 
     def run(self, config, **kwargs):
         """
@@ -11,6 +11,6 @@ class CreateStack(Action):
 
         stack = Stack.make(kwargs['name'], config)
         stack.provision_resources()
-        stack.save()
+        stack.flush()
 
         return stack.global_name
@@ -11,6 +11,6 @@ class DestroyStack(Action):
 
         stack = Stack.restore(kwargs['name'], config)
         stack.deprovision_resources()
-        stack.save()
+        stack.flush()
 
         return stack.global_name
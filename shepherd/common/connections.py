@@ -0,0 +1,220 @@
+"""
+Provides a thread safe pool of boto connections which resource and
+storage plugins can draw from rather than opening a fresh connection
+(and TLS session) for every api call.
+
+Connections are keyed by service name (ie: 'ec2', 'iam', 'dynamodb')
+and region, checked out for the duration of a ``with`` block and returned
+to the pool afterwards so that they can be reused across arbiter tasks.
+If the pool has a :class:`Limiter <shepherd.common.limits.Limiter>` the
+service concurrency limits are held while the connection is checked out,
+and each api call made on it takes a token from the service rates.
+::
+
+    pool = ConnectionPool()
+
+    with pool.connection('ec2') as conn:
+        conn.get_all_volumes()
+"""
+import logging
+import threading
+
+from contextlib import contextmanager
+from importlib import import_module
+
+import boto
+
+from shepherd.common.limits import Limiter
+
+logger = logging.getLogger(__name__)
+
+
+def connect(service, region=None):
+    """
+    Opens a new boto connection to the given service.
+
+    Args:
+        service (str): the boto service name (ie: 'ec2', 'iam', 'dynamodb').
+        region (str, optional): the region to connect to. If not supplied
+            boto's default region for the service is used.
+
+    Returns:
+        the boto connection object.
+    """
+    if region:
+        module = import_module('boto.{}'.format(service))
+        return module.connect_to_region(region)
+
+    return getattr(boto, 'connect_{}'.format(service))()
+
+
+class LimitedConnection(object):
+    """
+    Wraps a boto connection so that each of its method calls waits for a
+    token from the global and service rates of the limiter.
+    """
+    def __init__(self, conn, limiter, service):
+        """
+        Args:
+            conn: the boto connection object.
+            limiter (Limiter): the limits to throttle calls with.
+            service (str): the boto service name.
+        """
+        self._conn = conn
+        self._limiter = limiter
+        self._service = service
+
+    def __getattr__(self, name):
+        attr = getattr(self._conn, name)
+
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._limiter.throttle(self._service)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class ConnectionPool(object):
+    """
+    A thread safe pool of boto connections keyed by service and region.
+
+    Attributes:
+        opened (int): the number of connections opened by the pool.
+        reused (int): the number of times an idle connection was reused.
+    """
+    def __init__(self, connector=connect, limiter=None):
+        """
+        Args:
+            connector (function, optional): a function taking a service
+                and region which opens a new connection.
+            limiter (Limiter, optional): the limits to hold while a
+                connection is checked out and to throttle its calls with.
+        """
+        self._connector = connector
+        self._limiter = limiter or Limiter()
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the connection counters and number of idle connections.
+        """
+        with self._lock:
+            return {
+                'opened': self.opened,
+                'reused': self.reused,
+                'idle': sum(len(conns) for conns in self._idle.values()),
+            }
+
+    def acquire(self, service, region=None):
+        """
+        Checks out an idle connection for the service and region,
+        opening a new one if none are available.
+
+        Args:
+            service (str): the boto service name.
+            region (str, optional): the region to connect to.
+
+        Returns:
+            the boto connection object.
+        """
+        key = (service, region)
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+
+            self.opened += 1
+
+        logger.debug('Opening new %s connection (region=%s)', service, region)
+        return self._connector(service, region)
+
+    def release(self, service, conn, region=None):
+        """
+        Returns a checked out connection to the pool.
+
+        Args:
+            service (str): the boto service name.
+            conn: the boto connection object being returned.
+            region (str, optional): the region the connection was opened for.
+        """
+        with self._lock:
+            self._idle.setdefault((service, region), []).append(conn)
+
+    @contextmanager
+    def connection(self, service, region=None):
+        """
+        Context manager for checking out a connection and returning it
+        to the pool when the block exits. The service concurrency limits
+        are held for the duration of the block, while a rate limited
+        service's connection is wrapped to take a token per api call.
+
+        Args:
+            service (str): the boto service name.
+            region (str, optional): the region to connect to.
+        """
+        with self._limiter.service(service):
+            conn = self.acquire(service, region)
+            try:
+                if self._limiter.rated(service):
+                    yield LimitedConnection(conn, self._limiter, service)
+                else:
+                    yield conn
+            finally:
+                self.release(service, conn, region)
+
+    def clear(self):
+        """Drops all idle connections."""
+        with self._lock:
+            self._idle = {}
+
+
+DEFAULT_POOL = ConnectionPool()
+
+
+def get_pool(stack=None):
+    """
+    Returns the connection pool owned by the stack's config or the process
+    wide default pool if no stack is supplied.
+
+    Args:
+        stack (Stack, optional): the stack whose pool should be used.
+    """
+    pool = getattr(stack, 'connections', None)
+
+    if isinstance(pool, ConnectionPool):
+        return pool
+
+    return DEFAULT_POOL
+
+
+def get_connection(service, stack=None):
+    """
+    Checks out a connection to the service from the stack's pool, using
+    the region in the stack settings if one is set.
+
+    Args:
+        service (str): the boto service name.
+        stack (Stack, optional): the stack whose pool and region should be used.
+
+    Returns:
+        a context manager yielding the connection.
+    """
+    region = None
+    if stack is not None:
+        region = stack.settings.get('region')
+
+    return get_pool(stack).connection(service, region)
@@ -28,6 +28,13 @@ class StackError(LoggingException):
         self.errors = errors
 
 
+class StorageError(LoggingException):
+
+    def __init__(self, message, error=None, logger=None):
+        LoggingException.__init__(self, message, logger)
+        self.error = error
+
+
 class PluginError(LoggingException):
 
     def __init__(self, message, errors=None, logger=None):
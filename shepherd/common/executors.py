@@ -0,0 +1,323 @@
+"""
+Provides the executors used to run a dependency graph of tasks, such as
+the create and destroy tasks built by a stack.
+
+Tasks are given as ``(name, function, dependencies)`` tuples. A task runs
+once all of its dependencies have completed and fails if its function
+raises or returns a falsy value, in which case every task depending on
+it fails as well.  The executor is selected with the ``executor`` setting.
+
+1. ``arbiter`` (default) hands the tasks to ``arbiter.sync.run_tasks``.
+2. ``asyncio`` drives the graph from a single event loop. Task functions
+   run in a pool of at most ``max_workers`` threads, while the waits
+   created by :func:`shepherd.common.waits.wait_task` are polled from the
+   loop, which sleeps between attempts rather than a worker thread. Graphs
+   executed by a running task (ie: the tasks of a resource's create) are
+   run on the same loop.
+"""
+import logging
+import threading
+import multiprocessing
+
+from collections import namedtuple
+from arbiter import create_task
+from arbiter.sync import run_tasks
+
+from shepherd.common.exceptions import ConfigError
+from shepherd.common.waits import Attempts, Wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXECUTOR = 'arbiter'
+DEFAULT_MAX_WORKERS = min(32, multiprocessing.cpu_count() * 5)
+
+Results = namedtuple('Results', ['completed', 'failed'])
+
+# The asyncio executor running the task in the current worker thread.
+_running = threading.local()
+
+
+def execute(tasks, settings=None):
+    """
+    Runs the tasks with the executor selected in the settings. When called
+    from a task run by the asyncio executor the tasks join its event loop.
+
+    Args:
+        tasks (list): of ``(name, function, dependencies)`` tuples.
+        settings (dict, optional): the config settings.
+
+    Returns:
+        Results: namedtuple with the sets of completed and failed task names.
+
+    Raises:
+        ConfigError: if the executor is unknown or unavailable.
+    """
+    executor = getattr(_running, 'executor', None)
+    if executor is not None:
+        return executor.run_nested(tasks)
+
+    settings = settings or {}
+    name = settings.get('executor', DEFAULT_EXECUTOR)
+
+    if name == 'arbiter':
+        return run_tasks([create_task(*task) for task in tasks])
+    elif name == 'asyncio':
+        executor = AsyncioExecutor(settings.get('max_workers', DEFAULT_MAX_WORKERS))
+        return executor.run(tasks)
+    else:
+        raise ConfigError('Unknown executor {}'.format(name), logger=logger)
+
+
+class AsyncioExecutor(object):
+    """
+    Drives task graphs from an asyncio event loop.
+
+    The scheduling is non-blocking: task functions are submitted to a
+    bounded thread pool as soon as their dependencies complete and the
+    loop waits on their futures, so the number of OS threads and in-flight
+    calls never exceeds ``max_workers`` regardless of the size of the graph.
+    Waits only use a worker while running their check, and sleep between
+    attempts on the loop.
+
+    A task which executes its own graph blocks its worker until that graph
+    completes, so the functions of nested graphs run in a second pool of
+    ``max_workers`` threads to avoid exhausting the first.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Args:
+            max_workers (int, optional): the maximum number of task
+                functions running at once (per pool).
+
+        Raises:
+            ConfigError: if asyncio isn't available.
+        """
+        try:
+            import asyncio
+            from concurrent.futures import Future, ThreadPoolExecutor
+        except ImportError:
+            raise ConfigError(
+                'The asyncio executor requires python 3.4+',
+                logger=logger
+            )
+
+        self._asyncio = asyncio
+        self._future_class = Future
+        self._pool_class = ThreadPoolExecutor
+        self._max_workers = max_workers
+        self._loop = None
+        self._nested_pool = None
+
+    def run(self, tasks):
+        """
+        Runs the tasks, returning once every task has completed or failed.
+
+        Args:
+            tasks (list): of ``(name, function, dependencies)`` tuples.
+
+        Returns:
+            Results: namedtuple with the sets of completed and failed task names.
+        """
+        loop = self._asyncio.new_event_loop()
+        pool = self._pool_class(max_workers=self._max_workers)
+        results = []
+
+        def done(result):
+            results.append(result)
+            loop.stop()
+
+        def start():
+            try:
+                _Graph(self, tasks, pool, done).start()
+            except Exception as exc:
+                logger.exception(exc)
+                done(Results(
+                    completed=set(),
+                    failed=set(task[0] for task in tasks)
+                ))
+
+        self._loop = loop
+        self._nested_pool = self._pool_class(max_workers=self._max_workers)
+
+        try:
+            loop.call_soon(start)
+            loop.run_forever()
+        finally:
+            pool.shutdown(wait=True)
+            self._nested_pool.shutdown(wait=True)
+            loop.close()
+            self._loop = None
+
+        return results[0]
+
+    def run_nested(self, tasks):
+        """
+        Runs the tasks on the loop from one of its worker threads, blocking
+        the worker until every task has completed or failed.
+
+        Args:
+            tasks (list): of ``(name, function, dependencies)`` tuples.
+
+        Returns:
+            Results: namedtuple with the sets of completed and failed task names.
+        """
+        future = self._future_class()
+
+        def start():
+            try:
+                _Graph(self, tasks, self._nested_pool, future.set_result).start()
+            except Exception as exc:
+                future.set_exception(exc)
+
+        self._loop.call_soon_threadsafe(start)
+        return future.result()
+
+    def call(self, pool, function, callback):
+        """
+        Runs the function in the pool and calls back on the loop with the
+        future of its result.
+        """
+        def run():
+            _running.executor = self
+            try:
+                return function()
+            finally:
+                _running.executor = None
+
+        future = self._loop.run_in_executor(pool, run)
+        future.add_done_callback(callback)
+
+    def call_later(self, delay, callback):
+        self._loop.call_later(delay, callback)
+
+
+class _Graph(object):
+    """
+    The scheduling state of a single task graph run by the AsyncioExecutor.
+    Every method is called from the event loop.
+    """
+    def __init__(self, executor, tasks, pool, on_done):
+        self._executor = executor
+        self._pool = pool
+        self._on_done = on_done
+        self._functions = {}
+        self._waiting = {}
+        self._dependents = {}
+        self._running = set()
+        self._completed = set()
+        self._failed = set()
+        self._finished = False
+
+        for name, function, dependencies in tasks:
+            self._functions[name] = function
+            self._waiting[name] = set(dependencies)
+
+            for dep in dependencies:
+                self._dependents.setdefault(dep, []).append(name)
+
+    def start(self):
+        # Dependencies which aren't in the graph can never be satisfied.
+        for name, dependencies in list(self._waiting.items()):
+            if any(dep not in self._functions for dep in dependencies):
+                self._fail(name)
+
+        for name in [key for key, deps in self._waiting.items() if not deps]:
+            self._start(name)
+
+        self._finish()
+
+    def _start(self, name):
+        del self._waiting[name]
+        self._running.add(name)
+        function = self._functions[name]
+
+        if isinstance(function, Wait):
+            _Poll(self._executor, self._pool, function, lambda passed: self._done(name, passed))
+        else:
+            self._executor.call(
+                self._pool, function, lambda future: self._done(name, _passed(future))
+            )
+
+    def _done(self, name, passed):
+        self._running.discard(name)
+
+        if passed:
+            self._completed.add(name)
+
+            for dependent in self._dependents.get(name, []):
+                if dependent in self._waiting:
+                    self._waiting[dependent].discard(name)
+                    if not self._waiting[dependent]:
+                        self._start(dependent)
+        else:
+            self._fail(name)
+
+        self._finish()
+
+    def _fail(self, name):
+        if name in self._failed or name in self._completed:
+            return
+
+        logger.debug('Task %s failed', name)
+        self._failed.add(name)
+        self._waiting.pop(name, None)
+
+        for dependent in self._dependents.get(name, []):
+            self._fail(dependent)
+
+    def _finish(self):
+        if self._running or self._finished:
+            return
+
+        # Anything left waiting is part of a dependency cycle.
+        for name in list(self._waiting):
+            self._fail(name)
+
+        self._finished = True
+        self._on_done(Results(completed=self._completed, failed=self._failed))
+
+
+class _Poll(object):
+    """
+    Polls a Wait from the event loop, running each check in the pool and
+    sleeping between attempts with ``call_later``.
+    """
+    def __init__(self, executor, pool, wait, callback):
+        self._executor = executor
+        self._pool = pool
+        self._wait = wait
+        self._callback = callback
+        self._attempts = Attempts(wait.strategy, label=wait.label)
+        self._attempt()
+
+    def _attempt(self):
+        self._executor.call(self._pool, self._wait.function, self._checked)
+
+    def _checked(self, future):
+        try:
+            ready = bool(future.result())
+            error = None
+        except Exception as exc:
+            logger.debug('Wait attempt %s raised %s', self._attempts.count + 1, exc)
+            ready = False
+            error = exc
+
+        delay = self._attempts.next_delay(ready)
+
+        if delay is not None:
+            self._executor.call_later(delay, self._attempt)
+        else:
+            if error is not None:
+                logger.error('Wait failed with %s', error)
+
+            # The cleanup may block (ie: releasing a polled key), so it
+            # runs in the pool rather than stalling the loop.
+            self._executor.call(self._pool, self._wait.finish, lambda _: self._callback(ready))
+
+
+def _passed(future):
+    try:
+        return bool(future.result())
+    except Exception as exc:
+        logger.exception(exc)
+        return False
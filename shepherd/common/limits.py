@@ -0,0 +1,262 @@
+"""
+Provides configurable concurrency and rate limits for provider api calls
+and resource operations.
+
+Limits are configured with the ``limits`` settings dict, where each limit
+can set a maximum ``concurrency`` and/or a token bucket ``rate`` (calls per
+second) with a ``burst`` size.
+::
+
+    'limits': {
+        'global': {'rate': 20, 'burst': 40},
+        'services': {
+            'ec2': {'concurrency': 10, 'rate': 10},
+            'iam': {'rate': 5},
+            'dynamodb': {'concurrency': 4},
+        },
+        'resources': {
+            'Instance': {'concurrency': 10},
+        },
+    }
+
+The global and service concurrency limits are held while a connection is
+checked out of a :class:`ConnectionPool <shepherd.common.connections.ConnectionPool>`
+and their rates are applied to each api call made on it, while the resource
+limits are applied to each resource create or destroy.
+"""
+import time
+import logging
+import threading
+
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    A thread safe token bucket which refills at a fixed rate.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate (float): the tokens added per second.
+            burst (int, optional): the bucket size. Defaults to the rate (min 1).
+        """
+        self._rate = float(rate)
+        self._burst = float(burst or max(rate, 1))
+        self._tokens = self._burst
+        self._timestamp = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(
+                    self._burst,
+                    self._tokens + (now - self._timestamp) * self._rate
+                )
+                self._timestamp = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                delay = (1 - self._tokens) / self._rate
+
+            time.sleep(delay)
+
+
+class Limit(object):
+    """
+    A limit combining an optional concurrency cap and an optional rate,
+    which keeps track of the time spent queued waiting for it. The cap is
+    held between ``acquire`` and ``release``, while ``throttle`` takes a
+    single token from the rate.
+    """
+    def __init__(self, concurrency=None, rate=None, burst=None):
+        """
+        Args:
+            concurrency (int, optional): the max number of holders at once.
+            rate (float, optional): the max number of acquisitions per second.
+            burst (int, optional): the token bucket size for the rate.
+        """
+        self._semaphore = None
+        self._bucket = None
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.queued = 0.0
+        self.max_queued = 0.0
+
+        if concurrency:
+            self._semaphore = threading.BoundedSemaphore(concurrency)
+
+        if rate:
+            self._bucket = TokenBucket(rate, burst)
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the number of acquisitions, rate tokens taken and the
+                total and max seconds queued.
+        """
+        with self._lock:
+            return {
+                'acquired': self.acquired,
+                'throttled': self.throttled,
+                'queued': self.queued,
+                'max_queued': self.max_queued,
+            }
+
+    @property
+    def rated(self):
+        return self._bucket is not None
+
+    def acquire(self):
+        start = time.time()
+
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+
+        self._record(start, acquired=1)
+
+    def throttle(self):
+        start = time.time()
+
+        if self._bucket is not None:
+            self._bucket.acquire()
+
+        self._record(start, throttled=1)
+
+    def _record(self, start, acquired=0, throttled=0):
+        waited = time.time() - start
+        with self._lock:
+            self.acquired += acquired
+            self.throttled += throttled
+            self.queued += waited
+            self.max_queued = max(self.max_queued, waited)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class Limiter(object):
+    """
+    The collection of global, per service and per resource type limits
+    built from the ``limits`` settings.
+    """
+    def __init__(self, settings=None):
+        """
+        Args:
+            settings (dict, optional): the ``limits`` settings dict.
+        """
+        settings = settings or {}
+        self._global = None
+        self._services = {}
+        self._resources = {}
+
+        if settings.get('global'):
+            self._global = Limit(**settings['global'])
+
+        for name, params in (settings.get('services') or {}).items():
+            self._services[name] = Limit(**params)
+
+        for name, params in (settings.get('resources') or {}).items():
+            self._resources[name] = Limit(**params)
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the stats of each configured limit keyed by
+                'global', 'service.<name>' and 'resource.<type>'.
+        """
+        result = {}
+
+        if self._global is not None:
+            result['global'] = self._global.stats
+
+        for name, limit in self._services.items():
+            result['service.{}'.format(name)] = limit.stats
+
+        for name, limit in self._resources.items():
+            result['resource.{}'.format(name)] = limit.stats
+
+        return result
+
+    def rated(self, name):
+        """
+        Returns:
+            bool: whether api calls to the service are rate limited.
+        """
+        return any(limit.rated for limit in self._service_limits(name))
+
+    @contextmanager
+    def service(self, name):
+        """
+        Context manager holding the global and service concurrency limits.
+
+        Args:
+            name (str): the service name (ie: 'ec2', 'iam', 'dynamodb').
+        """
+        with _hold(self._service_limits(name)):
+            yield
+
+    def throttle(self, name):
+        """
+        Blocks until a single api call to the service is allowed by the
+        global and service rates.
+
+        Args:
+            name (str): the service name (ie: 'ec2', 'iam', 'dynamodb').
+        """
+        for limit in self._service_limits(name):
+            limit.throttle()
+
+    @contextmanager
+    def resource(self, resource_type):
+        """
+        Context manager holding the resource type limit, each create or
+        destroy taking a single token from its rate.
+
+        Args:
+            resource_type (str): the resource type (ie: 'Instance').
+        """
+        limit = self._resources.get(resource_type)
+        limits = [limit] if limit is not None else []
+
+        with _hold(limits):
+            for limit in limits:
+                limit.throttle()
+
+            yield
+
+    def _service_limits(self, name):
+        return [
+            limit for limit in (self._global, self._services.get(name))
+            if limit is not None
+        ]
+
+
+@contextmanager
+def _hold(limits):
+    """
+    Acquires the limits in order and releases them in reverse order.
+    """
+    held = []
+    try:
+        for limit in limits:
+            limit.acquire()
+            held.append(limit)
+
+        yield
+    finally:
+        for limit in reversed(held):
+            limit.release()
@@ -17,7 +17,10 @@ from abc import ABCMeta, abstractmethod
 from yapsy.IPlugin import IPlugin
 
 from shepherd.common.exceptions import StackError
-from shepherd.common.utils import setattrs, getattrs
+from shepherd.common.utils import AttributeMapping
+from shepherd.common.connections import get_connection, DEFAULT_POOL
+from shepherd.common.executors import execute
+from shepherd.common.waits import get_wait_strategy, wait_task
 
 
 class Action(IPlugin):
@@ -86,14 +89,35 @@ class Storage(IPlugin):
 
     FEATURE: should probably support some kind of archiving approach
     for old and unused stacks.
+
+    Attributes:
+        supports_delta (bool): whether the plugin implements ``dump_delta``.
+            If not, stacks always fall back to a full ``dump``.
     """
     __metaclass__ = ABCMeta
+    supports_delta = False
 
     def __init__(self):
         """Summary"""
         self._logger = logging.getLogger(
             'shepherd.storage.{}'.format(type(self).__name__)
         )
+        self._connections = None
+
+    @property
+    def connections(self):
+        """
+        The connection pool (and limits) the storage plugin should use
+        for any provider connections. Defaults to the process wide pool.
+        """
+        if self._connections is None:
+            return DEFAULT_POOL
+
+        return self._connections
+
+    @connections.setter
+    def connections(self, value):
+        self._connections = value
 
     @abstractmethod
     def search(self, tags):
@@ -142,6 +166,80 @@ class Storage(IPlugin):
             'implemented in the Storage abstract base class'
         )
 
+    def delete(self, name):
+        """
+        Given a unique name.
+
+        Removes the serialized stack with that name from the store.
+
+        Args:
+            name (str): the global_name of the stack to delete.
+        """
+        raise NotImplementedError(
+            'delete is not supported by {}'.format(type(self).__name__)
+        )
+
+    def load_many(self, names):
+        """
+        Loads several stacks at once. By default this just calls ``load``
+        for each name, so plugins should override it if their datastore
+        supports batched reads.
+
+        Args:
+            names (list): the global_names of the stacks to load.
+
+        Returns:
+            list: of the stack dicts in the same order as the names, with
+                None for any stacks that couldn't be found.
+        """
+        return [self.load(name) for name in names]
+
+    def dump_many(self, stacks):
+        """
+        Dumps several stacks at once. By default this just calls ``dump``
+        for each stack.
+
+        Args:
+            stacks (list): of the stack dicts to dump.
+        """
+        for stack in stacks:
+            self.dump(stack)
+
+    def delete_many(self, names):
+        """
+        Deletes several stacks at once. By default this just calls ``delete``
+        for each name.
+
+        Args:
+            names (list): the global_names of the stacks to delete.
+        """
+        for name in names:
+            self.delete(name)
+
+    def dump_delta(self, delta):
+        """
+        Takes a partial stack dict and writes only the changed
+        resources to an existing stored stack.
+
+        Only called if ``supports_delta`` is True and the stack has
+        previously been fully dumped.
+
+        Args:
+            delta (dict): containing the stack ``global_name``, the ordered
+                ``resource_names`` of all resources in the stack and the
+                serialized ``resources`` which changed.
+        """
+        raise NotImplementedError(
+            'dump_delta is not supported by {}'.format(type(self).__name__)
+        )
+
+    def close(self):
+        """
+        Releases any connections or files held open by the plugin, which
+        should reopen them if it's used again. Does nothing by default.
+        """
+        pass
+
 
 class Resource(IPlugin):
     """
@@ -150,6 +248,24 @@ class Resource(IPlugin):
     """
     __metaclass__ = ABCMeta
 
+    # Maps the serialized keys to attribute names. Subclasses only declare
+    # their own ``_attributes``, which are merged with those of their parents.
+    # This is the only way to add attributes: the merged ``_attributes_map``
+    # is shared by every instance and is read-only.
+    _attributes = {
+        'local_name': '_local_name',
+        'global_name': '_global_name',
+        'provider': '_provider',
+        'type': '_type',
+        'available': '_available',
+        'tags': '_tags',
+    }
+
+    # The compiled attribute mappings and loggers shared by all
+    # instances of each subclass.
+    _mappings = {}
+    _loggers = {}
+
     def __init__(self, provider):
         """Summary
 
@@ -173,17 +289,36 @@ class Resource(IPlugin):
         self._stack = None
         self._available = False
         self._tags = {}
-        self._logger = logging.getLogger(
-            'shepherd.resources.{}.{}'.format(provider, self._type)
+
+    @property
+    def _logger(self):
+        """
+        The logger shared by every resource of this provider and type.
+        """
+        key = (self._provider, type(self).__name__)
+        logger = Resource._loggers.get(key)
+
+        if logger is None:
+            logger = logging.getLogger('shepherd.resources.{}.{}'.format(*key))
+            Resource._loggers[key] = logger
+
+        return logger
+
+    @property
+    def _attributes_map(self):
+        """
+        A read-only view of the merged attribute map of this resource type,
+        which is shared by every instance. Subclasses add attributes by
+        declaring them in their ``_attributes``.
+        """
+        return self._get_mapping().attrmap
+
+    @_attributes_map.setter
+    def _attributes_map(self, value):
+        raise AttributeError(
+            'The attribute map of {} is read-only, declare the attributes '
+            'in its _attributes instead'.format(type(self).__name__)
         )
-        self._attributes_map = {
-            'local_name': '_local_name',
-            'global_name': '_global_name',
-            'provider': '_provider',
-            'type': '_type',
-            'available': '_available',
-            'tags': '_tags',
-        }
 
     @property
     def local_name(self):
@@ -213,6 +348,10 @@ class Resource(IPlugin):
     def tags(self, value):
         self._tags = value
 
+        # Keep the parent stack's tag index in sync
+        if self._stack is not None:
+            self._stack.reindex(self)
+
     @property
     def stack(self):
         return self._stack
@@ -221,6 +360,59 @@ class Resource(IPlugin):
     def stack(self, value):
         self._stack = value
 
+    def connection(self, service):
+        """
+        Checks out a pooled connection to the provider service.
+
+        Usage::
+
+            with self.connection('ec2') as conn:
+                conn.get_all_volumes()
+
+        Args:
+            service (str): the service to connect to (ie: 'ec2', 'iam').
+
+        Returns:
+            a context manager yielding the connection, which is returned to
+            the pool of the parent stack (or the default pool) on exit.
+        """
+        return get_connection(service, self._stack)
+
+    def run_tasks(self, tasks):
+        """
+        Runs a graph of tasks (ie: the steps of creating this resource) with
+        the executor selected in the parent stack's settings.
+
+        Args:
+            tasks (list): of ``(name, function, dependencies)`` tuples.
+
+        Returns:
+            Results: namedtuple with the sets of completed and failed task names.
+        """
+        return execute(tasks, self._stack.settings)
+
+    def wait_task(self, name, function, dependencies=(), cleanup=None):
+        """
+        Creates a task which polls the function until it succeeds using the
+        wait strategy configured for this resource type.
+
+        Args:
+            name (str): the task name.
+            function (function): the check to run.
+            dependencies (tuple, optional): names of the tasks this one depends on.
+            cleanup (function, optional): called once the wait is over,
+                whether or not the check succeeded.
+
+        Returns:
+            tuple: the ``(name, function, dependencies)`` task.
+        """
+        return wait_task(
+            name, function, dependencies,
+            strategy=get_wait_strategy(self._stack.settings, self._type),
+            label=self._type,
+            cleanup=cleanup
+        )
+
     @classmethod
     def validate_create(cls):
         """
@@ -299,7 +491,7 @@ class Resource(IPlugin):
         Args:
             data (dict): a dictionary of the attributes to deserialize.
         """
-        setattrs(self, self._attributes_map, data)
+        self._get_mapping().setattrs(self, data)
         self._logger.debug(
             'Deserialized %s %s', type(self).__name__, self._local_name
         )
@@ -314,7 +506,25 @@ class Resource(IPlugin):
         self._logger.debug(
             'Serializing %s %s', type(self).__name__, self._local_name
         )
-        return getattrs(self, self._attributes_map)
+        return self._get_mapping().getattrs(self)
+
+    @classmethod
+    def _get_mapping(cls):
+        """
+        Returns the compiled attribute map of this resource type, built on
+        first use by merging the ``_attributes`` declared along the MRO.
+        """
+        mapping = Resource._mappings.get(cls)
+
+        if mapping is None:
+            attrmap = {}
+            for klass in reversed(cls.__mro__):
+                attrmap.update(klass.__dict__.get('_attributes', {}))
+
+            mapping = AttributeMapping(attrmap)
+            Resource._mappings[cls] = mapping
+
+        return mapping
 
     @abstractmethod
     def create(self):
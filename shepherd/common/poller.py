@@ -0,0 +1,168 @@
+"""
+Provides a batching poller which coalesces the "wait until state X" checks
+of many resources into a single describe call per kind per tick.
+
+Each waiting task calls :meth:`BatchPoller.get` with the kind of object
+(ie: 'instances', 'volumes'), the id it is waiting on and a fetch function
+which describes a list of ids.  The first caller in a tick performs one
+fetch for every id currently being watched and the results are fanned back
+out to the other waiters until the results are older than the interval.
+Callers which arrive while a fetch is in flight wait for it, and at most
+one more fetch is made for all of them, even with an interval of 0.
+"""
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BatchPoller(object):
+    """
+    A thread safe poller coalescing describe calls by kind.
+
+    Attributes:
+        interval (float): how long (in seconds) fetched results are considered fresh.
+        requests (int): the number of get requests served.
+        fetches (int): the number of fetch calls issued.
+    """
+    def __init__(self, interval=0):
+        """
+        Args:
+            interval (float, optional): how long fetched results are reused for.
+        """
+        self.interval = interval
+        self.requests = 0
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._kind_locks = {}
+        self._watched = {}
+        self._results = {}
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the number of requests served and fetches issued.
+        """
+        return {'requests': self.requests, 'fetches': self.fetches}
+
+    def get(self, kind, key, fetch):
+        """
+        Returns the latest described object for the key, fetching a
+        new batch of all watched keys of this kind if the cached result
+        is stale.
+
+        Args:
+            kind (str): the kind of object being described.
+            key (str): the id of the object.
+            fetch (function): takes a list of ids and returns a dict of
+                id to described object.
+
+        Returns:
+            the described object or None if it wasn't returned by the fetch.
+
+        Raises:
+            Exception: any exception raised while describing the key.
+        """
+        # Results fetched since this request arrived are fresh enough,
+        # so callers queued behind another's fetch share the next one.
+        with self._lock:
+            arrived = time.time()
+            kind_lock = self._kind_locks.setdefault(kind, threading.Lock())
+            self._watched.setdefault(kind, set()).add(key)
+            self.requests += 1
+
+        with kind_lock:
+            results = self._results.setdefault(kind, {})
+            entry = results.get(key)
+
+            if entry is None or arrived - entry[0] > self.interval:
+                self._refresh(kind, fetch)
+                entry = results.get(key)
+
+        # The key was released by another caller before it was fetched.
+        if entry is None:
+            return None
+
+        _, value, error = entry
+
+        if error is not None:
+            raise error
+
+        return value
+
+    def release(self, kind, key):
+        """
+        Stops watching the key, so that it won't be included in future fetches.
+
+        Args:
+            kind (str): the kind of object.
+            key (str): the id of the object.
+        """
+        # Only the shared lock is taken, so a release never waits behind
+        # an in-flight fetch; its waiter sees the missing result as released.
+        with self._lock:
+            self._watched.get(kind, set()).discard(key)
+            self._results.get(kind, {}).pop(key, None)
+
+    def _refresh(self, kind, fetch):
+        """
+        Fetches all watched keys of the kind in one call. If the batched call
+        fails (ie: one of the ids isn't visible yet) each key is fetched
+        individually so the failure only propagates to that key's waiter.
+        """
+        with self._lock:
+            keys = sorted(self._watched[kind])
+
+        now = time.time()
+        results = {}
+        logger.debug('Describing %s %s', len(keys), kind)
+
+        try:
+            self._count_fetch()
+            fetched = fetch(keys)
+        except Exception as exc:
+            if len(keys) == 1:
+                results[keys[0]] = (now, None, exc)
+            else:
+                logger.debug('Batched describe of %s failed, describing individually', kind)
+                for key in keys:
+                    try:
+                        self._count_fetch()
+                        results[key] = (now, fetch([key]).get(key), None)
+                    except Exception as exc:
+                        results[key] = (now, None, exc)
+        else:
+            for key in keys:
+                results[key] = (now, fetched.get(key), None)
+
+        # Keys released during the fetch stay released.
+        with self._lock:
+            watched = self._watched[kind]
+            self._results[kind].update(
+                (key, entry) for key, entry in results.items() if key in watched
+            )
+
+    def _count_fetch(self):
+        with self._lock:
+            self.fetches += 1
+
+
+DEFAULT_POLLER = BatchPoller()
+
+
+def get_poller(stack=None):
+    """
+    Returns the poller owned by the stack or the process wide default
+    poller if no stack is supplied.
+
+    Args:
+        stack (Stack, optional): the stack whose poller should be used.
+    """
+    poller = getattr(stack, 'poller', None)
+
+    if isinstance(poller, BatchPoller):
+        return poller
+
+    return DEFAULT_POLLER
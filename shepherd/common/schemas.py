@@ -0,0 +1,126 @@
+"""
+Provides a process wide registry of the json schemas used to validate
+config settings and action arguments.
+
+Each schema file is loaded and compiled into a jsonschema validator once
+and reused until the file is modified.
+"""
+import os
+import time
+import logging
+import threading
+import anyconfig
+import jsonschema
+
+from jsonschema.validators import validator_for
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaRegistry(object):
+    """
+    A thread safe cache of compiled schema validators keyed by file path.
+
+    Attributes:
+        loads (int): the number of times a schema file was loaded and compiled.
+        validations (int): the number of validate calls.
+        load_time (float): the total seconds spent loading and compiling schemas.
+        validate_time (float): the total seconds spent validating.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._validators = {}
+        self.loads = 0
+        self.validations = 0
+        self.load_time = 0.0
+        self.validate_time = 0.0
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the load and validation counts and times.
+        """
+        return {
+            'loads': self.loads,
+            'validations': self.validations,
+            'load_time': self.load_time,
+            'validate_time': self.validate_time,
+        }
+
+    def get(self, schema_file):
+        """
+        Returns the compiled validator for the schema file, loading it if
+        it hasn't been loaded yet or the file has changed since.
+
+        Args:
+            schema_file (str): the path to the json schema file.
+
+        Returns:
+            the jsonschema validator object.
+        """
+        mtime = os.path.getmtime(schema_file)
+
+        with self._lock:
+            cached = self._validators.get(schema_file)
+
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            start = time.time()
+            schema = anyconfig.load(schema_file, 'json')
+            cls = validator_for(schema)
+            cls.check_schema(schema)
+            validator = cls(schema)
+
+            self.loads += 1
+            self.load_time += time.time() - start
+            logger.debug('Loaded schema %s', schema_file)
+
+            self._validators[schema_file] = (mtime, validator)
+            return validator
+
+    def validate(self, schema_file, data):
+        """
+        Validates the data against the schema file.
+
+        Args:
+            schema_file (str): the path to the json schema file.
+            data (dict): the data to validate.
+
+        Raises:
+            jsonschema.ValidationError: if the data doesn't match the schema.
+        """
+        validator = self.get(schema_file)
+        start = time.time()
+
+        try:
+            error = jsonschema.exceptions.best_match(validator.iter_errors(data))
+        finally:
+            with self._lock:
+                self.validations += 1
+                self.validate_time += time.time() - start
+
+        if error is not None:
+            raise error
+
+    def clear(self):
+        with self._lock:
+            self._validators = {}
+
+
+REGISTRY = SchemaRegistry()
+
+
+def validate(schema_file, data):
+    """
+    Validates the data against the schema file using the process wide registry.
+
+    Args:
+        schema_file (str): the path to the json schema file.
+        data (dict): the data to validate.
+
+    Raises:
+        jsonschema.ValidationError: if the data doesn't match the schema.
+    """
+    REGISTRY.validate(schema_file, data)
@@ -0,0 +1,251 @@
+"""
+Provides the codecs storage plugins use to serialize stack data.
+
+A :class:`StackCodec` encodes values as compact json, or with msgpack
+(``format``), and compresses any encoded value of at least ``threshold``
+bytes with zlib or zstd (``compression``). Every encoded value starts with
+a marker naming its codec, so :func:`decode` can read values written by any
+codec and never mistakes another string for one. Plain json follows the
+marker as is, so it stays readable (ie: ``\\x1fjson\\x1f{...}``), while
+msgpack and compressed values are base64 encoded
+(ie: ``\\x1fjson+zlib\\x1feJy...``).
+::
+
+    'storage': {
+        'name': 'DynamoStorage',
+        'settings': {
+            'codec': {
+                'format': 'msgpack',
+                'compression': 'zlib',
+                'threshold': 1024,
+            },
+        },
+    }
+
+The msgpack format and zstd compression require the optional ``msgpack``
+and ``zstandard`` packages.
+"""
+import json
+import zlib
+import base64
+import logging
+
+from past.builtins import basestring
+
+from shepherd.common.exceptions import ConfigError, StorageError
+
+logger = logging.getLogger(__name__)
+
+MARKER = u'\x1f'
+FORMATS = ('json', 'msgpack')
+COMPRESSIONS = ('zlib', 'zstd')
+DEFAULT_THRESHOLD = 1024
+
+# The optional packages required by formats and compressions, and the
+# modules imported so far.
+_PACKAGES = {'msgpack': 'msgpack', 'zstd': 'zstandard'}
+_MODULES = {}
+
+
+def _import(name):
+    """
+    Imports the optional module required by a format or compression.
+    """
+    module = _MODULES.get(name)
+    if module is None:
+        package = _PACKAGES.get(name)
+        if package is None:
+            return None
+
+        try:
+            module = __import__(package)
+        except ImportError:
+            raise ConfigError(
+                'The {} codec requires the {} package'.format(name, package),
+                logger=logger
+            )
+
+        _MODULES[name] = module
+
+    return module
+
+
+def _dumps(format, value):
+    if format == 'msgpack':
+        return _import('msgpack').packb(value, use_bin_type=True)
+
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(format, data):
+    if format == 'msgpack':
+        return _import('msgpack').unpackb(data, raw=False)
+
+    return json.loads(data.decode('utf-8'))
+
+
+def _compress(compression, data):
+    if compression == 'zstd':
+        return _import('zstd').ZstdCompressor().compress(data)
+
+    return zlib.compress(data)
+
+
+def _decompress(compression, data):
+    if compression == 'zstd':
+        return _import('zstd').ZstdDecompressor().decompress(data)
+
+    return zlib.decompress(data)
+
+
+class StackCodec(object):
+    """
+    Encodes values to strings with a format and optional compression.
+    """
+    def __init__(self, format='json', compression=None, threshold=DEFAULT_THRESHOLD):
+        """
+        Args:
+            format (str, optional): 'json' or 'msgpack'.
+            compression (str, optional): 'zlib', 'zstd' or None.
+            threshold (int, optional): the minimum encoded size to compress.
+
+        Raises:
+            ConfigError: if the format or compression is unknown or its
+                package isn't installed.
+        """
+        if format not in FORMATS:
+            raise ConfigError(
+                'Unknown codec format {}, expected one of {}'
+                .format(format, ', '.join(FORMATS)),
+                logger=logger
+            )
+
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ConfigError(
+                'Unknown codec compression {}, expected one of {}'
+                .format(compression, ', '.join(COMPRESSIONS)),
+                logger=logger
+            )
+
+        _import(format)
+        _import(compression)
+
+        self._format = format
+        self._compression = compression
+        self._threshold = threshold
+
+    @property
+    def format(self):
+        return self._format
+
+    @property
+    def compression(self):
+        return self._compression
+
+    def encode(self, value):
+        """
+        Encodes the value.
+
+        Args:
+            value: a json serializable value.
+
+        Returns:
+            str: the marked encoded value.
+        """
+        data = _dumps(self._format, value)
+        name = self._format
+
+        if self._compression and len(data) >= self._threshold:
+            data = _compress(self._compression, data)
+            name = '{}+{}'.format(self._format, self._compression)
+
+        # Plain json stays readable, anything else is binary.
+        if name == 'json':
+            payload = data.decode('utf-8')
+        else:
+            payload = base64.b64encode(data).decode('ascii')
+
+        return u'{0}{1}{0}{2}'.format(MARKER, name, payload)
+
+
+def is_encoded(value):
+    """
+    Returns whether the value is a string written by a StackCodec.
+
+    Args:
+        value: the value to check.
+    """
+    return isinstance(value, basestring) and value.startswith(MARKER)
+
+
+def decode(value, legacy=False):
+    """
+    Decodes a value written by any StackCodec. Any other value
+    is returned unchanged.
+
+    Args:
+        value: the value to decode.
+        legacy (bool, optional): whether to also parse unmarked json dicts
+            and lists, which is how values were stored before codecs. Only
+            set this for values which are known to have been encoded.
+
+    Returns:
+        the decoded value.
+
+    Raises:
+        ConfigError: if the value was written with a format or compression
+            whose package isn't installed.
+        StorageError: if the marker isn't followed by a known codec header.
+    """
+    if not is_encoded(value):
+        if legacy and isinstance(value, basestring) and value[:1] in ('{', '['):
+            try:
+                return json.loads(value)
+            except ValueError:
+                pass
+
+        return value
+
+    parts = value.split(MARKER, 2)
+    name = parts[1] if len(parts) == 3 else None
+    format, _, compression = (name or '').partition('+')
+
+    if format not in FORMATS or (compression and compression not in COMPRESSIONS):
+        raise StorageError(
+            'Invalid codec header in encoded value {!r}'.format(value[:32]),
+            logger=logger
+        )
+
+    payload = parts[2]
+
+    if name == 'json':
+        return json.loads(payload)
+
+    data = base64.b64decode(payload)
+
+    if compression:
+        data = _decompress(compression, data)
+
+    return _loads(format, data)
+
+
+DEFAULT_CODEC = StackCodec()
+
+
+def get_codec(settings=None):
+    """
+    Returns the codec for the ``codec`` settings of a storage plugin.
+
+    Args:
+        settings (dict, optional): the format, compression and threshold.
+
+    Returns:
+        StackCodec: the codec, or a plain json codec if settings is empty.
+
+    Raises:
+        ConfigError: if the settings are invalid.
+    """
+    if not settings:
+        return DEFAULT_CODEC
+
+    return StackCodec(**dict(settings))
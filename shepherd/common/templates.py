@@ -0,0 +1,253 @@
+"""
+Provides structure aware templating of manifest resources.
+
+Rather than dumping the resources to a json string, rendering it as a
+single template and parsing the result, the :class:`TemplateEngine` walks
+the resources and only renders the strings which contain template markup.
+Compiled templates are cached by their source, so the same strings used
+across resources and stacks are only compiled once.
+
+Engines are shared process wide per ``templates`` settings dict, which
+can set the number of compiled templates kept in memory (``cache_size``)
+and where compiled bytecode is cached (``bytecode_cache``), either
+``'memory'`` (default), a directory path or ``None`` to disable it.
+::
+
+    'templates': {
+        'cache_size': 5000,
+        'bytecode_cache': '/var/cache/shepherd/templates',
+    }
+"""
+import hashlib
+import logging
+import threading
+
+from past.builtins import basestring
+from jinja2 import Environment, StrictUndefined, FunctionLoader, meta
+from jinja2 import BytecodeCache, FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+MARKERS = ('{{', '{%')
+DEFAULT_CACHE_SIZE = 1000
+DEFAULT_BYTECODE_CACHE = 'memory'
+
+
+def is_template(value):
+    """
+    Returns whether the value is a string containing template markup.
+
+    Args:
+        value: the value to check.
+    """
+    return isinstance(value, basestring) and any(
+        marker in value for marker in MARKERS
+    )
+
+
+class MemoryBytecodeCache(BytecodeCache):
+    """
+    A thread safe in-memory jinja2 bytecode cache.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytecode = {}
+
+    def load_bytecode(self, bucket):
+        with self._lock:
+            bytecode = self._bytecode.get(bucket.key)
+
+        if bytecode is not None:
+            bucket.bytecode_from_string(bytecode)
+
+    def dump_bytecode(self, bucket):
+        bytecode = bucket.bytecode_to_string()
+
+        with self._lock:
+            self._bytecode[bucket.key] = bytecode
+
+    def clear(self):
+        with self._lock:
+            self._bytecode = {}
+
+
+MEMORY_BYTECODE_CACHE = MemoryBytecodeCache()
+_LOCK = threading.Lock()
+
+
+class TemplateEngine(object):
+    """
+    Renders the string leaves of nested dicts and lists with jinja2.
+
+    Templates are loaded into the environment by the hash of their source,
+    so they are cached by the environment's LRU and compiled bytecode is
+    reused through its bytecode cache.
+
+    Attributes:
+        requests (int): the number of templates requested.
+        compiled (int): the number of templates loaded into the environment.
+    """
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, bytecode_cache=DEFAULT_BYTECODE_CACHE):
+        """
+        Args:
+            cache_size (int, optional): the max number of compiled templates cached.
+            bytecode_cache (str, optional): 'memory', a directory to cache
+                bytecode in or None to disable the bytecode cache.
+        """
+        if bytecode_cache == 'memory':
+            bytecode_cache = MEMORY_BYTECODE_CACHE
+        elif bytecode_cache:
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._environment = Environment(
+            loader=FunctionLoader(self._load),
+            undefined=StrictUndefined,
+            keep_trailing_newline=True,
+            cache_size=cache_size,
+            bytecode_cache=bytecode_cache or None,
+            auto_reload=False
+        )
+        self._cache_size = cache_size
+        self._variables = {}
+        self.requests = 0
+        self.compiled = 0
+
+    @property
+    def environment(self):
+        return self._environment
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the number of templates compiled and cache hits.
+        """
+        return {'compiled': self.compiled, 'hits': self.requests - self.compiled}
+
+    def compile(self, source):
+        """
+        Returns the compiled template for the source.
+
+        Args:
+            source (str): the template source.
+
+        Returns:
+            jinja2.Template: the compiled template.
+        """
+        name = hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            self.requests += 1
+
+        # The loader is called synchronously from get_template on a cache
+        # miss, so the source only needs to be visible to this thread.
+        self._local.source = source
+        try:
+            return self._environment.get_template(name)
+        finally:
+            self._local.source = None
+
+    def _load(self, name):
+        with self._lock:
+            self.compiled += 1
+
+        return self._local.source, None, lambda: True
+
+    def render(self, data, context):
+        """
+        Renders any templates in the data, which is left unmodified.
+
+        Args:
+            data: a string, or dicts and lists containing strings, to render.
+            context (dict): the variables available to the templates.
+
+        Returns:
+            a copy of the data with its templates rendered.
+        """
+        if isinstance(data, dict):
+            return dict(
+                (self.render(key, context), self.render(value, context))
+                for key, value in data.items()
+            )
+        elif isinstance(data, list):
+            return [self.render(value, context) for value in data]
+        elif is_template(data):
+            return self.compile(data).render(context)
+
+        return data
+
+    def variables(self, data):
+        """
+        Returns the names of the variables referenced by the templates in the data.
+
+        Args:
+            data: a string, or dicts and lists containing strings.
+
+        Returns:
+            frozenset: of the referenced variable names.
+        """
+        if isinstance(data, dict):
+            result = set()
+            for key, value in data.items():
+                result |= self.variables(key)
+                result |= self.variables(value)
+            return frozenset(result)
+        elif isinstance(data, list):
+            result = set()
+            for value in data:
+                result |= self.variables(value)
+            return frozenset(result)
+        elif not is_template(data):
+            return frozenset()
+
+        names = self._variables.get(data)
+
+        if names is None:
+            names = frozenset(
+                meta.find_undeclared_variables(self._environment.parse(data))
+            )
+
+            with self._lock:
+                if len(self._variables) >= self._cache_size:
+                    self._variables = {}
+
+                self._variables[data] = names
+
+        return names
+
+    def clear(self):
+        self._variables = {}
+
+        if self._environment.cache is not None:
+            self._environment.cache.clear()
+
+
+DEFAULT_ENGINE = TemplateEngine()
+_ENGINES = {}
+
+
+def get_template_engine(settings=None):
+    """
+    Returns the process wide template engine for the ``templates`` settings.
+
+    Args:
+        settings (dict, optional): the ``templates`` settings.
+
+    Returns:
+        TemplateEngine: the shared engine for those settings.
+    """
+    if not settings:
+        return DEFAULT_ENGINE
+
+    key = (
+        settings.get('cache_size', DEFAULT_CACHE_SIZE),
+        settings.get('bytecode_cache', DEFAULT_BYTECODE_CACHE),
+    )
+
+    with _LOCK:
+        if key not in _ENGINES:
+            _ENGINES[key] = TemplateEngine(*key)
+
+        return _ENGINES[key]
@@ -8,14 +8,43 @@ from __future__ import print_function
 import os
 import re
 import jsonschema
-import anyconfig
 import logging
 
+from shepherd.common import schemas
 from shepherd.common.exceptions import ConfigError, LoggingException, PluginError
 
+try:
+    from types import MappingProxyType
+except ImportError:
+    from collections import Mapping
+
+    class MappingProxyType(Mapping):
+        """
+        A read-only view of a dict (python 2's fallback for
+        ``types.MappingProxyType``).
+        """
+        def __init__(self, mapping):
+            self._mapping = mapping
+
+        def __getitem__(self, key):
+            return self._mapping[key]
+
+        def __iter__(self):
+            return iter(self._mapping)
+
+        def __len__(self):
+            return len(self._mapping)
+
 LOCALREF = 'Fn::LocalRef'
 IMPORTREF = 'Fn::ImportRef'
 LOGFORMAT = '[%(levelname)s  %(asctime)s  %(name)s] - "%(message)s"'
+CONFIG_SCHEMA = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), 'config.schema'
+)
+
+_FIRST_CAP_RE = re.compile('(.)([A-Z][a-z]+)')
+_ALL_CAP_RE = re.compile('([a-z0-9])([A-Z])')
+_UNDERSCORE_CACHE = {}
 
 
 def run(action_name, config, **kwargs):
@@ -31,10 +60,9 @@ def run(action_name, config, **kwargs):
     Returns:
         the action output
     """
-    actions = config.get_plugins(category_name='Action', plugin_name=action_name)
+    action = config.make_plugin('Action', action_name)
 
-    if actions:
-        action = actions[0]
+    if action is not None:
         return action.run(config, **kwargs)
     else:
         raise PluginError('Failed to locate task {}'.format(action_name))
@@ -46,11 +74,20 @@ def pascal_to_underscore(pascal_str):
 
     http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-camel-case
 
+    Conversions are memoized since the same handful of keys are
+    converted for every resource.
+
     Args:
         pascal_str (TYPE): the pascal case string we want to convert to underscore format.
     """
-    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', pascal_str)
-    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+    result = _UNDERSCORE_CACHE.get(pascal_str)
+
+    if result is None:
+        s1 = _FIRST_CAP_RE.sub(r'\1_\2', pascal_str)
+        result = _ALL_CAP_RE.sub(r'\1_\2', s1).lower()
+        _UNDERSCORE_CACHE[pascal_str] = result
+
+    return result
 
 
 def validate_config(config):
@@ -61,11 +98,7 @@ def validate_config(config):
         config (dict): a dictionary of the config settings.
     """
     try:
-        path = os.path.dirname(os.path.realpath(__file__))
-        schema_file = os.path.join(path, 'config.schema')
-        schema = anyconfig.load(schema_file, 'json')
-
-        jsonschema.validate(config, schema)
+        schemas.validate(CONFIG_SCHEMA, config)
     except jsonschema.ValidationError as exc:
         ConfigError(exc.message)
 
@@ -115,6 +148,71 @@ def getattrs(obj, attrmap):
     return result
 
 
+class AttributeMapping(object):
+    """
+    A precompiled version of an attribute map for use with objects which
+    all share the same map (ie: every instance of a Resource subclass).
+
+    The declared keys and their pascal case forms are resolved to attribute
+    names once, so repeated calls avoid the pascal to underscore conversion
+    and the attribute map lookups done by :func:`setattrs` and :func:`getattrs`.
+    Any other key is converted on each call rather than cached, so the
+    setters don't grow with every key ever set.
+    """
+    def __init__(self, attrmap):
+        """
+        Args:
+            attrmap (dict): a dict mapping dict keys (underscore case) to attribute names.
+        """
+        self._attrmap = dict(attrmap)
+        self._items = tuple(self._attrmap.items())
+        self._setters = {}
+
+        for key, attr in self._items:
+            self._setters[key] = attr
+            self._setters[''.join(part.capitalize() for part in key.split('_'))] = attr
+
+        # A read-only view, since the compiled items and setters
+        # wouldn't reflect any changes made to the map.
+        self.attrmap = MappingProxyType(self._attrmap)
+
+    def setattrs(self, obj, values):
+        """
+        Equivalent to ``setattrs(obj, self.attrmap, values)``.
+
+        Args:
+            obj (object): the object with the attributes being set.
+            values (dict): the dict whose values are mapping to the object.
+
+        Returns:
+            obj (object): the updated object
+        """
+        setters = self._setters
+
+        for key in values:
+            attr = setters.get(key)
+            if attr is None:
+                attr = self._attrmap.get(pascal_to_underscore(key))
+
+            if attr is not None:
+                setattr(obj, attr, values[key])
+
+        return obj
+
+    def getattrs(self, obj):
+        """
+        Equivalent to ``getattrs(obj, self.attrmap)``.
+
+        Args:
+            obj (object): the object to extract the attributes from.
+
+        Returns:
+            result (dict): dictionary of the mapped attributes from obj
+        """
+        attrs = obj.__dict__
+        return dict((key, attrs[attr]) for key, attr in self._items if attr in attrs)
+
+
 def dict_contains(superdict, subdict):
     """
     Returns a boolean as to whether the
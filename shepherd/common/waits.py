@@ -0,0 +1,363 @@
+"""
+Provides pluggable wait strategies for tasks that poll until a resource
+reaches a desired state, along with stats on how long each resource type
+takes to become ready.
+
+By default waits use the fixed ``retries`` and ``delay`` from the config
+settings.  An optional ``wait`` settings dict selects another strategy,
+an overall deadline and per resource type overrides.
+::
+
+    'wait': {
+        'strategy': 'exponential',
+        'initial': 0.5,
+        'factor': 2,
+        'max_delay': 30,
+        'jitter': 0.5,
+        'timeout': 900,
+        'resources': {
+            'Instance': {'initial': 5, 'max_delay': 60},
+        },
+    }
+"""
+import time
+import random
+import logging
+import threading
+
+from shepherd.common.exceptions import ConfigError
+
+logger = logging.getLogger(__name__)
+
+# Starting points for the exponential strategy which reflect how long
+# each builtin resource type typically takes to become ready.
+RESOURCE_DEFAULTS = {
+    'SecurityGroup': {'initial': 0.25, 'max_delay': 5},
+    'SecurityGroupIngress': {'initial': 0.25, 'max_delay': 5},
+    'AccessKey': {'initial': 0.5, 'max_delay': 5},
+    'User': {'initial': 0.5, 'max_delay': 5},
+    'Volume': {'initial': 1, 'max_delay': 15},
+    'Instance': {'initial': 2, 'max_delay': 30},
+}
+
+
+class FixedWait(object):
+    """
+    Waits the same delay between each attempt.
+    """
+    # The settings accepted from the wait config.
+    params = ('retries', 'delay', 'timeout')
+
+    def __init__(self, retries, delay, timeout=None):
+        """
+        Args:
+            retries (int): the number of attempts after the first.
+            delay (float): the seconds to wait between attempts.
+            timeout (float, optional): the overall deadline in seconds.
+        """
+        self.retries = retries
+        self.delay = delay
+        self.timeout = timeout
+
+    def delays(self):
+        """
+        Yields:
+            float: the delay to wait before each retry.
+        """
+        for _ in range(self.retries):
+            yield self.delay
+
+
+class ExponentialWait(object):
+    """
+    Waits an exponentially increasing (capped) delay with random jitter
+    between each attempt.
+    """
+    # The settings accepted from the wait config.
+    params = ('retries', 'initial', 'factor', 'max_delay', 'jitter', 'timeout')
+
+    def __init__(self, retries, initial=1, factor=2, max_delay=30, jitter=0.5, timeout=None):
+        """
+        Args:
+            retries (int): the number of attempts after the first.
+            initial (float, optional): the delay before the first retry.
+            factor (float, optional): the multiplier applied after each retry.
+            max_delay (float, optional): the cap on any single delay.
+            jitter (float, optional): the fraction (0 - 1) of each delay to randomize.
+            timeout (float, optional): the overall deadline in seconds.
+        """
+        self.retries = retries
+        self.initial = initial
+        self.factor = factor
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.timeout = timeout
+
+    def delays(self):
+        """
+        Yields:
+            float: the delay to wait before each retry.
+        """
+        delay = self.initial
+        for _ in range(self.retries):
+            capped = min(delay, self.max_delay)
+            yield random.uniform(capped * (1 - self.jitter), capped)
+            delay *= self.factor
+
+
+STRATEGIES = {
+    'fixed': FixedWait,
+    'exponential': ExponentialWait,
+}
+
+
+def get_wait_strategy(settings, resource_type=None):
+    """
+    Builds the wait strategy for a resource type from the config settings.
+
+    The strategy's settings are layered from the ``retries`` and ``delay``
+    settings, the RESOURCE_DEFAULTS for the resource type, the top level
+    ``wait`` settings and then the type's ``wait.resources`` overrides.
+    Settings the strategy doesn't accept are ignored.
+
+    Args:
+        settings (dict): the config settings.
+        resource_type (str, optional): the resource type waiting.
+
+    Returns:
+        the wait strategy object.
+
+    Raises:
+        ConfigError: if the strategy is unknown.
+    """
+    wait = settings.get('wait') or {}
+    strategy = wait.get('strategy', 'fixed')
+
+    if strategy not in STRATEGIES:
+        raise ConfigError(
+            'Unknown wait strategy {}, expected one of {}'
+            .format(strategy, ', '.join(sorted(STRATEGIES))),
+            logger=logger
+        )
+
+    cls = STRATEGIES[strategy]
+    params = {}
+    layers = [
+        {'retries': settings.get('retries', 0), 'delay': settings.get('delay', 0)},
+        RESOURCE_DEFAULTS.get(resource_type, {}),
+        wait,
+        (wait.get('resources') or {}).get(resource_type, {}),
+    ]
+
+    for layer in layers:
+        for key, value in layer.items():
+            if key in cls.params:
+                params[key] = value
+
+    return cls(**params)
+
+
+class WaitStats(object):
+    """
+    Thread safe collection of how long waits took to complete per resource type.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, resource_type, elapsed, attempts, ready):
+        """
+        Records a completed wait.
+
+        Args:
+            resource_type (str): the resource type which waited.
+            elapsed (float): the seconds spent waiting.
+            attempts (int): the number of attempts made.
+            ready (bool): whether the resource became ready.
+        """
+        with self._lock:
+            stats = self._stats.setdefault(resource_type, {
+                'count': 0,
+                'failed': 0,
+                'attempts': 0,
+                'total': 0.0,
+                'min': None,
+                'max': None,
+            })
+            stats['count'] += 1
+            stats['attempts'] += attempts
+
+            if ready:
+                stats['total'] += elapsed
+                stats['min'] = elapsed if stats['min'] is None else min(stats['min'], elapsed)
+                stats['max'] = elapsed if stats['max'] is None else max(stats['max'], elapsed)
+            else:
+                stats['failed'] += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: per resource type counts, attempts and min/mean/max time-to-ready.
+        """
+        with self._lock:
+            result = {}
+            for resource_type, stats in self._stats.items():
+                summary = dict(stats)
+                ready = stats['count'] - stats['failed']
+                summary['mean'] = stats['total'] / ready if ready else None
+                result[resource_type] = summary
+
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+
+
+STATS = WaitStats()
+
+
+class Attempts(object):
+    """
+    Tracks the attempts of a wait, deciding how long to sleep before the
+    next one and recording the stats once the wait is over. This lets a
+    wait be driven by a blocking loop (:func:`wait`) or an event loop.
+    """
+    def __init__(self, strategy, label=None):
+        """
+        Args:
+            strategy: the wait strategy.
+            label (str, optional): the resource type used when recording stats.
+        """
+        self._strategy = strategy
+        self._label = label
+        self._delays = strategy.delays()
+        self._start = time.time()
+        self.count = 0
+
+    def next_delay(self, ready):
+        """
+        Records an attempt.
+
+        Args:
+            ready (bool): whether the attempt succeeded.
+
+        Returns:
+            float: the delay before the next attempt, or None if the wait is over.
+        """
+        self.count += 1
+        delay = None
+
+        if not ready:
+            delay = next(self._delays, None)
+            timeout = self._strategy.timeout
+            if delay is not None and timeout is not None and (
+                time.time() - self._start + delay > timeout
+            ):
+                delay = None
+
+        if delay is None:
+            STATS.record(self._label, time.time() - self._start, self.count, ready)
+
+        return delay
+
+
+def wait(function, strategy, label=None):
+    """
+    Calls the function until it returns a truthy value, sleeping between
+    attempts as dictated by the strategy.
+
+    Args:
+        function (function): the check to run.
+        strategy: the wait strategy.
+        label (str, optional): the resource type used when recording stats.
+
+    Returns:
+        the last result of the function.
+
+    Raises:
+        Exception: the last exception raised by the function if it never succeeded.
+    """
+    attempts = Attempts(strategy, label=label)
+
+    while True:
+        try:
+            result = function()
+            error = None
+        except Exception as exc:
+            logger.debug('Wait attempt %s raised %s', attempts.count + 1, exc)
+            result = False
+            error = exc
+
+        delay = attempts.next_delay(bool(result))
+        if delay is None:
+            break
+
+        time.sleep(delay)
+
+    if error is not None:
+        raise error
+
+    return result
+
+
+class Wait(object):
+    """
+    A check polled with a wait strategy. Calling it blocks until the wait
+    is over (see :func:`wait`), while the asyncio executor polls it from
+    its event loop instead, so sleeping between attempts doesn't hold a
+    worker thread. Either way the cleanup is called once the wait is over,
+    whether or not the check succeeded.
+    """
+    def __init__(self, function, strategy, label=None, cleanup=None):
+        """
+        Args:
+            function (function): the check to run.
+            strategy: the wait strategy.
+            label (str, optional): the resource type used when recording stats.
+            cleanup (function, optional): called once the wait is over.
+        """
+        self.function = function
+        self.strategy = strategy
+        self.label = label
+        self.cleanup = cleanup
+
+    def __call__(self):
+        try:
+            return wait(self.function, self.strategy, label=self.label)
+        finally:
+            self.finish()
+
+    def finish(self):
+        """
+        Calls the cleanup, logging rather than raising its errors so they
+        don't mask the outcome of the wait.
+        """
+        if self.cleanup is not None:
+            try:
+                self.cleanup()
+            except Exception as exc:
+                logger.exception(exc)
+
+
+def wait_task(name, function, dependencies=(), strategy=None, label=None, cleanup=None):
+    """
+    Creates a task which waits on the function using the strategy rather
+    than a fixed number of retries and delay.
+
+    Args:
+        name (str): the task name.
+        function (function): the check to run.
+        dependencies (tuple, optional): the names of tasks this task depends on.
+        strategy (optional): the wait strategy, defaults to a single attempt.
+        label (str, optional): the resource type used when recording stats.
+        cleanup (function, optional): called once the wait is over.
+
+    Returns:
+        tuple: the ``(name, function, dependencies)`` task, see
+            :func:`shepherd.common.executors.execute`.
+    """
+    if strategy is None:
+        strategy = FixedWait(0, 0)
+
+    return (name, Wait(function, strategy, label=label, cleanup=cleanup), tuple(dependencies))
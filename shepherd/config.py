@@ -28,9 +28,12 @@ from __future__ import print_function
 
 import os
 import sys
+import json
+import time
 import inspect
 import fnmatch
 import logging
+import threading
 import anyconfig
 
 from os.path import dirname, join, abspath
@@ -47,6 +50,9 @@ from shepherd.common.plugins import Action
 from shepherd.common.plugins import Storage
 from shepherd.common.plugins import Parser
 from shepherd.common.plugins import is_plugin
+from shepherd.common.connections import ConnectionPool
+from shepherd.common.limits import Limiter
+from shepherd.common.templates import get_template_engine
 from shepherd.common.utils import validate_config, configure_logging
 
 if sys.version > '3':
@@ -72,6 +78,14 @@ _DEFAULT_SETTINGS = AttrDict({
     },
 })
 
+_CATEGORIES = {
+    "Resource": Resource,
+    "Action": Action,
+    "Storage": Storage,
+    "Parser": Parser,
+}
+_PLUGIN_PATTERNS = ('*.py', '*.plugin')
+
 logger = logging.getLogger(__name__)
 
 
@@ -95,12 +109,14 @@ class Config(object):
 
         self._name = name
         self._settings = settings
-        self._inspect_analyzer = None
-        self._default_analyzer = None
         self._categories = None
-        self._paths = _BUILTIN_PATHS
+        self._paths = list(_BUILTIN_PATHS)
         self._plugins = None
+        self._startup_time = None
         self._stacks = []
+        self._limiter = Limiter(settings.get('limits'))
+        self._connections = ConnectionPool(limiter=self._limiter)
+        self._templates = get_template_engine(settings.get('templates'))
 
         validate_config(settings)
         if Config.logging_verbosity < settings['verbosity']:
@@ -121,48 +137,21 @@ class Config(object):
         outside of this class.
         """
         logger.debug('Configuring Config')
-
-        # Setup the locators
-        # Inspection analyzer, mostly for builtin plugins
-        # (resources, tasks, etc)
-        self._inspect_analyzer = PluginFileAnalyzerInspection(
-            'inspector',
-            _BUILTIN_PATHS
-        )
-        # The default analyzer for any extension paths that we don't trust.
-        self._default_analyzer = PluginFileAnalyzerWithInfoFile(
-            'default',
-            extensions='plugin'
-        )
-        # The order of the analyzers could matter.
-        self._locator = PluginFileLocator(
-            analyzers=[
-                self._inspect_analyzer,
-                self._default_analyzer,
-            ]
-        )
+        start = time.time()
 
         # Create the categories filter dict
-        self._categories = {
-            "Resource": Resource,
-            "Action": Action,
-            "Storage": Storage,
-            "Parser": Parser,
-        }
+        self._categories = _CATEGORIES
 
         # Setup the search paths
         if self._settings and "extension_paths" in self._settings:
             self._paths.extend(self._settings["extension_paths"])
 
-        # Actually create the PluginManager
-        self._plugins = PluginManager(
-            categories_filter=self._categories,
-            directories_list=self._paths,
-            plugin_locator=self._locator
+        # Fetch the collected plugins from the process wide registry
+        self._plugins = REGISTRY.get(
+            self._paths,
+            index_path=self._settings.get('plugin_index')
         )
-
-        # Collect the plugins
-        self._plugins.collectPlugins()
+        self._startup_time = time.time() - start
 
     @property
     def name(self):
@@ -172,6 +161,30 @@ class Config(object):
     def settings(self):
         return self._settings
 
+    @property
+    def connections(self):
+        return self._connections
+
+    @property
+    def limiter(self):
+        return self._limiter
+
+    @property
+    def templates(self):
+        """
+        Returns:
+            TemplateEngine: the shared engine used to render manifests.
+        """
+        return self._templates
+
+    @property
+    def startup_time(self):
+        """
+        Returns:
+            float: the seconds spent collecting (or fetching the cached) plugins.
+        """
+        return self._startup_time
+
     @classmethod
     def make(cls, settings=None, name=""):
         """
@@ -253,40 +266,114 @@ class Config(object):
         Returns:
             list: of the plugins that match the criteria.
         """
-        results = []
+        return [
+            plugin_class()
+            for plugin_class in self._plugins.find(category_name, plugin_name)
+        ]
 
-        if category_name and plugin_name:
-            plugin_info = self._plugins.getPluginByName(
-                plugin_name,
-                category=category_name
+    def make_plugin(self, category_name, plugin_name, provider=None):
+        """
+        Creates a new instance of a single plugin by direct lookup,
+        which is cheaper than get_plugins when the plugin is known.
+
+        Args:
+            category_name (str): the category of the plugin.
+            plugin_name (str): the name of the plugin.
+            provider (str, optional): the provider the plugin must support
+                (only applies to Resources).
+
+        Returns:
+            the new plugin object or None if no plugin matches.
+        """
+        if provider is None:
+            plugin_class = self._plugins.by_name.get((category_name, plugin_name))
+        else:
+            plugin_class = self._plugins.by_type.get(
+                (category_name, provider.lower(), plugin_name)
             )
 
-            if plugin_info:
-                results.append(plugin_info.plugin_object.__class__())
+        if plugin_class is None:
+            return None
 
-        elif category_name and not plugin_name:
-            plugin_infos = self._plugins.getPluginsOfCategory(category_name)
+        return plugin_class()
 
-            for plugin_info in plugin_infos:
-                results.append(plugin_info.plugin_object.__class__())
 
-        elif plugin_name and not category_name:
-            for category in self._plugins.getCategories():
-                plugin_info = self._plugins.getPluginByName(
-                    plugin_name,
-                    category=category
-                )
+class PluginTable(object):
+    """
+    The lookup tables of plugin classes built once from a collected
+    plugin manager.
+
+    Attributes:
+        manager (PluginManager): the yapsy plugin manager the table was built from.
+        categories (tuple): the category names in collection order.
+        by_category (dict): category -> tuple of plugin classes.
+        by_name (dict): (category, name) -> plugin class.
+        by_type (dict): (category, provider, name) -> plugin class, for
+            plugins with a provider (ie: Resources).
+        all (tuple): every plugin class.
+    """
+    def __init__(self, manager):
+        """
+        Args:
+            manager (PluginManager): the collected yapsy plugin manager.
+        """
+        self.manager = manager
+        self.categories = tuple(manager.getCategories())
+        self.by_category = {}
+        self.by_name = {}
+        self.by_type = {}
+
+        for category in self.categories:
+            classes = []
+
+            for plugin_info in manager.getPluginsOfCategory(category):
+                plugin_object = plugin_info.plugin_object
+                plugin_class = plugin_object.__class__
+                classes.append(plugin_class)
+
+                # Keep the first plugin found for a name, like getPluginByName
+                self.by_name.setdefault((category, plugin_info.name), plugin_class)
+
+                provider = getattr(plugin_object, 'provider', None)
+                if provider:
+                    self.by_type.setdefault(
+                        (category, provider.lower(), plugin_info.name),
+                        plugin_class
+                    )
+
+            self.by_category[category] = tuple(classes)
+
+        self.all = tuple(
+            plugin_info.plugin_object.__class__
+            for plugin_info in manager.getAllPlugins()
+        )
 
-                if plugin_info:
-                    results.append(plugin_info.plugin_object.__class__())
+    def find(self, category_name=None, plugin_name=None):
+        """
+        Returns the plugin classes matching the search criteria.
 
-        elif not category_name and not plugin_name:
-            plugin_infos = self._plugins.getAllPlugins()
+        Args:
+            category_name (str, optional): a category to search for plugins in.
+            plugin_name (str, optional): the name of the plugin to look for.
 
-            for plugin_info in plugin_infos:
-                results.append(plugin_info.plugin_object.__class__())
+        Returns:
+            list: of the matching plugin classes.
+        """
+        if category_name and plugin_name:
+            plugin_class = self.by_name.get((category_name, plugin_name))
+            return [plugin_class] if plugin_class is not None else []
+
+        elif category_name:
+            return list(self.by_category.get(category_name, ()))
+
+        elif plugin_name:
+            return [
+                self.by_name[(category, plugin_name)]
+                for category in self.categories
+                if (category, plugin_name) in self.by_name
+            ]
 
-        return results
+        return list(self.all)
 
 
 class PluginFileAnalyzerInspection(IPluginFileAnalyzer):
@@ -294,15 +381,18 @@ class PluginFileAnalyzerInspection(IPluginFileAnalyzer):
     This PluginFileAnalyzer determines the plugins via inspection.
     If the module contains a class that subclasses
     """
-    def __init__(self, name, paths):
+    def __init__(self, name, paths, index=None):
         """Summary
 
         Args:
             name (str): name of the Analyzer [requirement of yapsy]
             paths (list): the paths search through for loadable plugins
+            index (dict, optional): a previously built index of file paths to
+                their mtime and plugin class, used to skip importing unchanged files.
         """
         IPluginFileAnalyzer.__init__(self, name)
         self.module_paths = {}
+        self.index = index if index is not None else {}
         self.getModulePaths(paths)
 
     def isValidPlugin(self, filename):
@@ -353,6 +443,13 @@ class PluginFileAnalyzerInspection(IPluginFileAnalyzer):
         plugin_class = None
 
         if filename in self.module_paths:
+            path = os.path.join(self.module_paths[filename], filename)
+            mtime = os.path.getmtime(path)
+            entry = self.index.get(path)
+
+            if entry and entry[0] == mtime:
+                return entry[1]
+
             sys.path.insert(0, self.module_paths[filename])
 
             mod_name = os.path.splitext(filename)[0]
@@ -364,6 +461,7 @@ class PluginFileAnalyzerInspection(IPluginFileAnalyzer):
                     break
 
             sys.path.remove(self.module_paths[filename])
+            self.index[path] = [mtime, plugin_class]
 
         return plugin_class
 
@@ -378,3 +476,165 @@ class PluginFileAnalyzerInspection(IPluginFileAnalyzer):
             for root, _, filenames in os.walk(path):
                 for filename in fnmatch.filter(filenames, '*.py'):
                     self.module_paths[filename] = os.path.abspath(root)
+
+
+class PluginRegistry(object):
+    """
+    A process wide cache of collected plugins, so that creating a
+    :class:`Config <Config>` (ie: on every stack restore) doesn't rescan
+    and reimport the plugin paths.
+
+    Entries are keyed by the list of search paths and are invalidated when
+    the mtime of any python or plugin info file under those paths changes.
+    Optionally, the class names found by inspection can be persisted to an
+    on-disk index so that a cold start only imports the modules which
+    actually contain plugins.
+
+    Attributes:
+        hits (int): the number of lookups served from the cache.
+        misses (int): the number of lookups which collected the plugins.
+        load_time (float): the total seconds spent collecting plugins.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the number of hits and misses and the total load time.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'load_time': self.load_time,
+        }
+
+    def get(self, paths, index_path=None):
+        """
+        Returns the collected plugin manager for the paths, collecting
+        the plugins if they aren't cached or the files have changed.
+
+        Args:
+            paths (list): the plugin search paths.
+            index_path (str, optional): the path of the on-disk inspection index.
+
+        Returns:
+            PluginTable: the lookup tables of the collected plugins.
+        """
+        key = tuple(paths)
+        fingerprint = _fingerprint(paths)
+
+        with self._lock:
+            cached = self._entries.get(key)
+
+            if cached is not None and cached[0] == fingerprint:
+                self.hits += 1
+                return cached[1]
+
+            self.misses += 1
+            start = time.time()
+            table = PluginTable(_collect_plugins(paths, index_path))
+            elapsed = time.time() - start
+            self.load_time += elapsed
+            logger.debug('Collected plugins in %.3f seconds', elapsed)
+
+            self._entries[key] = (fingerprint, table)
+            return table
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+REGISTRY = PluginRegistry()
+
+
+def _fingerprint(paths):
+    """
+    Returns the sorted (path, mtime) pairs of the plugin files under the paths.
+    """
+    result = []
+
+    for path in paths:
+        for root, _, filenames in os.walk(path):
+            for pattern in _PLUGIN_PATTERNS:
+                for filename in fnmatch.filter(filenames, pattern):
+                    filepath = os.path.join(os.path.abspath(root), filename)
+                    result.append((filepath, os.path.getmtime(filepath)))
+
+    return tuple(sorted(result))
+
+
+def _collect_plugins(paths, index_path=None):
+    """
+    Builds a plugin manager for the paths and collects the plugins.
+
+    Args:
+        paths (list): the plugin search paths.
+        index_path (str, optional): the path of the on-disk inspection index.
+    """
+    index = _load_index(index_path) if index_path else {}
+
+    # Setup the locators
+    # Inspection analyzer, mostly for builtin plugins
+    # (resources, tasks, etc)
+    inspect_analyzer = PluginFileAnalyzerInspection(
+        'inspector',
+        _BUILTIN_PATHS,
+        index=index
+    )
+    # The default analyzer for any extension paths that we don't trust.
+    default_analyzer = PluginFileAnalyzerWithInfoFile(
+        'default',
+        extensions='plugin'
+    )
+    # The order of the analyzers could matter.
+    locator = PluginFileLocator(
+        analyzers=[
+            inspect_analyzer,
+            default_analyzer,
+        ]
+    )
+
+    # Actually create the PluginManager
+    manager = PluginManager(
+        categories_filter=_CATEGORIES,
+        directories_list=paths,
+        plugin_locator=locator
+    )
+
+    # Collect the plugins
+    manager.collectPlugins()
+
+    if index_path:
+        _dump_index(index_path, inspect_analyzer.index)
+
+    return manager
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path) as fobj:
+            return json.load(fobj)
+    except (IOError, OSError, ValueError) as exc:
+        logger.debug('Unable to load the plugin index %s: %s', index_path, exc)
+        return {}
+
+
+def _dump_index(index_path, index):
+    # Write to a temporary file first so concurrent readers never see
+    # a partially written index.
+    tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+
+    try:
+        with open(tmp_path, 'w') as fobj:
+            json.dump(index, fobj)
+
+        os.rename(tmp_path, index_path)
+    except (IOError, OSError) as exc:
+        logger.warn('Unable to write the plugin index %s: %s', index_path, exc)
@@ -80,10 +80,6 @@ class Environment(Stack):
         """
         Restores all stack object identified by our stack_names.
         """
-        self._stacks = []
-
-        for name in self._stack_names:
-            stack = Stack.restore(name, self._config_name)
-            self._stacks.append(stack)
+        self._stacks = Stack.restore_many(self._stack_names, self._config)
 
         return self._stacks
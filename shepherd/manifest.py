@@ -6,16 +6,20 @@ from __future__ import print_function
 from future.builtins import dict
 
 import os
-import logging
 import json
+import pickle
+import hashlib
+import logging
+import threading
 import anyconfig
 
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from tempfile import mkdtemp
 from shutil import rmtree
-from within.shell import working_directory
-from jinja2 import Template, StrictUndefined
 
-from shepherd.common.exceptions import ManifestError
+from shepherd.common.exceptions import ManifestError, ConfigError
 
 INCLUDE_KEY = 'include'
 INCLUDE_ERROR_MSG = (
@@ -27,6 +31,16 @@ INCLUDE_ERROR_MSG = (
 # In the future this could be a list of extension paths stored
 # in some kind of settings
 EXTENSIONS_PATH = os.path.realpath('shepherd/extensions/')
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_WORKERS = 4
+ARTIFACT_POLICIES = ('off', 'on_error', 'always')
+DEFAULT_ARTIFACT_POLICY = 'on_error'
+_MISSING = object()
+PARSER_TYPES = {
+    '.json': 'json',
+    '.yml': 'yaml',
+    '.yaml': 'yaml',
+}
 
 logger = logging.getLogger(__name__)
 
@@ -128,15 +142,28 @@ class Manifest(object):
         self._template = {}
         self._vars = {}
         self._resources = []
+        self._inputs = {}
+        self._origin = None
         self._settings = self._config.settings
         self._filename = self._settings.manifest_path
 
-        self._working_dir = mkdtemp(prefix=__name__)
-        logger.debug(
-            'Storing manifest temp files in %s.',
-            self._working_dir
+        artifacts = self._settings.get('manifest_artifacts') or {}
+        self._artifact_policy = artifacts.get('policy', DEFAULT_ARTIFACT_POLICY)
+        self._artifact_path = artifacts.get('path')
+        self._artifacts = OrderedDict()
+        self._working_dir = None
+
+        if self._artifact_policy not in ARTIFACT_POLICIES:
+            raise ConfigError(
+                'Unknown manifest artifact policy {}'.format(self._artifact_policy),
+                logger=logger
+            )
+
+        self._loader = Loader(
+            self._filename,
+            cache=get_parse_cache(self._settings.get('manifest_cache')),
+            workers=self._settings.get('manifest_workers', DEFAULT_WORKERS)
         )
-        self._loader = Loader(self._filename)
 
     @property
     def resources(self):
@@ -151,17 +178,15 @@ class Manifest(object):
         """
         logger.debug('Loading %s', self._filename)
 
-        try:
-            self._template = self._loader.run()
-        except:
-            logger.error('Failed to load stack spec')
-            raise
+        with self._artifacts_on_error():
+            try:
+                self._template = self._loader.run()
+            except:
+                logger.error('Failed to load stack spec')
+                raise
 
-        # Write result to file nicely so we can inspect the results later.
-        outfile = os.path.join(self._working_dir, "loaded.json")
-        logger.debug('Writing loaded template to %s', outfile)
-        with open(outfile, 'w+') as fobj:
-            fobj.write(json.dumps(dict(self._template), indent=1, sort_keys=True))
+            # Record the result so we can inspect it later.
+            self._artifact('loaded.json', self._template)
 
     def parse(self):
         """
@@ -170,66 +195,440 @@ class Manifest(object):
         """
         logger.debug('Parsing Parameters dict.')
 
-        # Simplify the Parameters dict to just key : values
-        if 'vars' not in self._template:
-            raise ManifestError(
-                'Parameters not in template dict',
-                logger=logger
-            )
+        with self._artifacts_on_error():
+            # Simplify the Parameters dict to just key : values
+            if 'vars' not in self._template:
+                raise ManifestError(
+                    'Parameters not in template dict',
+                    logger=logger
+                )
 
-        self._vars = self._template['vars']
+            # Copied so the loaded template is left as it was loaded
+            self._vars = dict(self._template['vars'])
 
-        if 'vars' in self._settings:
-            self._vars.update(dict(self._settings.vars))
+            if 'vars' in self._settings:
+                self._vars.update(dict(self._settings.vars))
 
-        # Run any of the parser plugins on the Parameters dict
-        parsers = self._config.get_plugins(category_name='Parser')
-        for parser in parsers:
-            self._vars = parser.run(self._vars)
+            # Run any of the parser plugins on the Parameters dict
+            parsers = self._config.get_plugins(category_name='Parser')
+            for parser in parsers:
+                self._vars = parser.run(self._vars)
 
-        outfile = os.path.join(self._working_dir, "parsed.json")
-        logger.debug('Writing parsed vars to %s', outfile)
-        with open(outfile, 'w+') as fobj:
-            fobj.write(json.dumps(dict(self._vars), indent=1, sort_keys=True))
+            self._artifact('parsed.json', self._vars)
 
-        # Validate that we don't have any None values in the Parameters dict.
-        for val in self._vars.values():
-            if val is None:
-                raise ManifestError(
-                    'Some parameters still equal None after parsing.',
-                    logger=logger
-                )
+            # Validate that we don't have any None values in the Parameters dict.
+            for val in self._vars.values():
+                if val is None:
+                    raise ManifestError(
+                        'Some parameters still equal None after parsing.',
+                        logger=logger
+                    )
 
     def map(self):
         """
         Maps values in the params dict to the values in the resources dict
-        using jinja2 variable referencing syntax
+        using jinja2 variable referencing syntax.  Only the strings in the
+        resources dict which contain template markup are rendered.
         """
         logger.debug('Mapping Parameters into and simplifying resources list')
 
-        if 'resources' not in self._template:
-            raise ManifestError(
-                'Resources not in template dict',
-                logger=logger
+        with self._artifacts_on_error():
+            if 'resources' not in self._template:
+                raise ManifestError(
+                    'Resources not in template dict',
+                    logger=logger
+                )
+
+            context = dict(self._vars)
+            self._resources = []
+            self._inputs = {}
+            self._origin = self._get_resources_origin()
+
+            # Turn resources into a list where the key ==> local_name
+            for key, value in self._template['resources'].items():
+                self._resources.append(self._map_resource(key, value, context))
+
+            self._artifact('final.json', self._resources)
+
+    def rebuild(self):
+        """
+        Reloads the manifest after its files or the settings vars have
+        changed, only re-rendering the resources whose definition or the
+        vars they reference have changed.
+
+        Returns:
+            dict: the sorted 'added', 'changed' and 'removed' lists of
+                resource local names.
+        """
+        logger.debug('Rebuilding %s', self._filename)
+        previous_vars = dict(self._vars)
+        previous_inputs = self._inputs
+        previous_origin = self._origin
+        previous = dict(
+            (resource['local_name'], resource) for resource in self._resources
+        )
+
+        self.load()
+        self.parse()
+
+        with self._artifacts_on_error():
+            if 'resources' not in self._template:
+                raise ManifestError(
+                    'Resources not in template dict',
+                    logger=logger
+                )
+
+            context = dict(self._vars)
+            changed_vars = set(
+                key for key in set(previous_vars) | set(context)
+                if previous_vars.get(key, _MISSING) != context.get(key, _MISSING)
             )
 
-        jinja_template = Template(json.dumps(dict(self._template['resources'])))
-        jinja_template.environment.undefined = StrictUndefined()
-        resources_dict = json.loads(jinja_template.render(dict(self._vars)))
+            # If the file defining the resources is unchanged so is each definition.
+            self._origin = self._get_resources_origin()
+            same_origin = previous_origin is not None and previous_origin == self._origin
+
+            self._resources = []
+            self._inputs = {}
+
+            for key, value in self._template['resources'].items():
+                inputs = previous_inputs.get(key)
+
+                if (
+                    inputs is not None and
+                    (same_origin or inputs[0] == value) and
+                    not inputs[1] & changed_vars
+                ):
+                    self._inputs[key] = inputs
+                    self._resources.append(inputs[2])
+                else:
+                    self._resources.append(self._map_resource(key, value, context))
+
+            self._artifact('final.json', self._resources)
+
+        current = dict(
+            (resource['local_name'], resource) for resource in self._resources
+        )
+
+        return {
+            'added': sorted(set(current) - set(previous)),
+            'removed': sorted(set(previous) - set(current)),
+            'changed': sorted(
+                name for name in set(current) & set(previous)
+                if current[name] is not previous[name] and
+                current[name] != previous[name]
+            ),
+        }
+
+    def _map_resource(self, key, value, context):
+        """
+        Renders a single resource, recording the definition and vars
+        it was rendered from.
+        """
+        templates = self._config.templates
+        resource = templates.render(value, context)
+        resource['local_name'] = templates.render(key, context)
+        self._inputs[key] = (
+            value,
+            templates.variables(value) | templates.variables(key),
+            resource
+        )
+
+        return resource
+
+    def _get_resources_origin(self):
+        """
+        Returns the path and content hash of the file defining the resources.
+        """
+        filename = self._loader.origins.get('resources')
 
-        # Turn resources into a list where the key ==> local_name
-        for key, value in resources_dict.items():
-            resource = value
-            resource['local_name'] = key
-            self._resources.append(resource)
+        if filename is None:
+            return None
 
-        with open(os.path.join(self._working_dir, "final.json"), "w+") as fobj:
-            fobj.write(json.dumps(self._resources, indent=1, sort_keys=True))
+        return filename, self._loader.cache.digest(filename)
 
     def clear(self):
-        """Cleans up the working directory"""
-        logger.debug('Removing %s', self._working_dir)
-        rmtree(self._working_dir)
+        """
+        Cleans up the working directory, unless the artifacts were written
+        to the configured artifact path.
+        """
+        if self._working_dir and not self._artifact_path:
+            logger.debug('Removing %s', self._working_dir)
+            rmtree(self._working_dir)
+
+        self._working_dir = None
+        self._artifacts = OrderedDict()
+
+    def _artifact(self, filename, data):
+        """
+        Records a debug artifact when a stage completes, only serializing
+        it if the artifact policy says it should be written. The 'on_error'
+        policy keeps a reference to the data rather than a copy, so each
+        stage builds new objects instead of modifying the results of the
+        stages before it.
+
+        Args:
+            filename (str): the name of the artifact file.
+            data: the result of the stage to serialize.
+        """
+        if self._artifact_policy == 'always':
+            self._write_artifact(filename, data)
+        elif self._artifact_policy == 'on_error':
+            self._artifacts[filename] = data
+
+    @contextmanager
+    def _artifacts_on_error(self):
+        """
+        Writes the recorded artifacts if an error occurs, so the
+        intermediate results can be inspected.
+        """
+        try:
+            yield
+        except Exception:
+            if self._artifact_policy == 'on_error':
+                for filename, data in self._artifacts.items():
+                    try:
+                        self._write_artifact(filename, data)
+                    except Exception as exc:
+                        logger.debug('Failed to write %s: %s', filename, exc)
+
+                if self._working_dir:
+                    logger.error('Manifest artifacts written to %s', self._working_dir)
+
+            raise
+
+    def _write_artifact(self, filename, data):
+        if self._working_dir is None:
+            if self._artifact_path and not os.path.isdir(self._artifact_path):
+                os.makedirs(self._artifact_path)
+
+            self._working_dir = mkdtemp(prefix=__name__, dir=self._artifact_path)
+            logger.debug(
+                'Storing manifest temp files in %s.',
+                self._working_dir
+            )
+
+        # Write result to file nicely so we can inspect the results later.
+        outfile = os.path.join(self._working_dir, filename)
+        logger.debug('Writing %s', outfile)
+        with open(outfile, 'w+') as fobj:
+            fobj.write(json.dumps(data, indent=1, sort_keys=True))
+
+
+class ParseCache(object):
+    """
+    A content addressed cache of parsed manifest files.
+
+    Files are identified by the hash of their contents, so a file is only
+    parsed once no matter how many manifests include it.  The path, mtime
+    and size of each file are remembered so unchanged files aren't reread
+    to be hashed.  Parsed results are kept pickled in an in-memory LRU, so
+    every hit unpickles a fresh copy for the caller (which is several times
+    faster than deepcopying or reparsing them, see
+    ``benchmarks/manifest_bench.py``). The pickles can optionally be written
+    to a cache directory to be shared across processes, which should only
+    be a directory you trust.
+
+    Attributes:
+        hits (int): the number of loads served from memory.
+        disk_hits (int): the number of loads served from the cache directory.
+        misses (int): the number of loads which parsed the file.
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE, path=None):
+        """
+        Args:
+            size (int, optional): the max number of parsed files kept in memory.
+            path (str, optional): the directory to pickle parsed files to.
+        """
+        self._size = size
+        self._path = path
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if path and not os.path.isdir(path):
+            os.makedirs(path)
+
+    @property
+    def stats(self):
+        """
+        Returns:
+            dict: the number of hits, disk hits and misses.
+        """
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+        }
+
+    def load(self, filename):
+        """
+        Returns a copy of the parsed contents of the file, which the
+        caller is free to modify.
+
+        Args:
+            filename (str): the real path of the file to load.
+
+        Returns:
+            the parsed file contents.
+        """
+        stat = os.stat(filename)
+        signature = (stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            known = self._digests.get(filename)
+            blob = self._get(known[1]) if known is not None and known[0] == signature else None
+
+            if blob is not None:
+                self.hits += 1
+
+        if blob is not None:
+            return pickle.loads(blob)
+
+        with open(filename, 'rb') as fobj:
+            content = fobj.read()
+
+        digest = hashlib.sha1(content).hexdigest()
+
+        with self._lock:
+            self._digests[filename] = (signature, digest)
+            blob = self._get(digest)
+
+            if blob is not None:
+                self.hits += 1
+
+        if blob is not None:
+            return pickle.loads(blob)
+
+        data = self._read_pickle(digest)
+        cached = data is not None
+
+        if not cached:
+            data = parse(filename, content)
+
+        blob = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+        if not cached:
+            self._write_pickle(digest, blob)
+
+        with self._lock:
+            if cached:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+
+            self._put(digest, blob)
+
+        return data
+
+    def digest(self, filename):
+        """
+        Returns the content hash of the file when it was last loaded.
+
+        Args:
+            filename (str): the real path of the file.
+
+        Returns:
+            str: the hash or None if the file hasn't been loaded.
+        """
+        with self._lock:
+            known = self._digests.get(filename)
+
+        return known[1] if known is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._digests = {}
+            self._entries = OrderedDict()
+
+    def _get(self, digest):
+        data = self._entries.pop(digest, None)
+        if data is not None:
+            self._entries[digest] = data
+
+        return data
+
+    def _put(self, digest, data):
+        if self._size:
+            self._entries[digest] = data
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def _read_pickle(self, digest):
+        if not self._path:
+            return None
+
+        try:
+            with open(os.path.join(self._path, digest + '.pickle'), 'rb') as fobj:
+                return pickle.load(fobj)
+        except (IOError, OSError):
+            return None
+        except Exception as exc:
+            logger.debug('Ignoring unreadable cache entry %s: %s', digest, exc)
+            return None
+
+    def _write_pickle(self, digest, blob):
+        if not self._path:
+            return
+
+        filename = os.path.join(self._path, digest + '.pickle')
+        tmp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+
+        try:
+            with open(tmp_filename, 'wb') as fobj:
+                fobj.write(blob)
+
+            os.rename(tmp_filename, filename)
+        except (IOError, OSError) as exc:
+            logger.warn('Unable to write cache entry %s: %s', filename, exc)
+
+
+PARSE_CACHE = ParseCache()
+_PARSE_CACHES = {}
+
+
+def get_parse_cache(settings=None):
+    """
+    Returns the process wide parse cache for the ``manifest_cache``
+    settings, which may set the in-memory ``size`` and a cache ``path``.
+
+    Args:
+        settings (dict, optional): the ``manifest_cache`` settings.
+
+    Returns:
+        ParseCache: the shared cache for those settings.
+    """
+    if not settings:
+        return PARSE_CACHE
+
+    key = (settings.get('size', DEFAULT_CACHE_SIZE), settings.get('path'))
+
+    if key not in _PARSE_CACHES:
+        _PARSE_CACHES[key] = ParseCache(*key)
+
+    return _PARSE_CACHES[key]
+
+
+def parse(filename, content):
+    """
+    Parses the contents of a json or yaml manifest file.
+
+    Args:
+        filename (str): the name of the file the contents were read from.
+        content (bytes): the file contents.
+
+    Returns:
+        the parsed file contents.
+    """
+    parser_type = PARSER_TYPES.get(os.path.splitext(filename)[1].lower())
+
+    if parser_type is None:
+        return anyconfig.load(filename, safe=True)
+
+    return anyconfig.loads(content.decode('utf-8'), parser_type, safe=True)
 
 
 class Loader(object):
@@ -259,8 +658,13 @@ class Loader(object):
     NOTE: in the dict case the key value pair will be ignore like the value
     in the list.  Also, the file being imported must be a dict at the top
     level.
+
+    Include paths are resolved relative to the including file rather than
+    by changing the working directory, so loaders can safely be run from
+    multiple threads.  The files of each level of the include tree are read
+    and parsed in a thread pool and then merged in their declared order.
     """
-    def __init__(self, filename):
+    def __init__(self, filename, cache=None, workers=DEFAULT_WORKERS):
         """
         recursively includes references to other template files with the json.
         While good practice will be to include your files to variables
@@ -268,8 +672,28 @@ class Loader(object):
 
         Args:
             filename (str): file to start loading
+            cache (ParseCache, optional): the cache of parsed files to use,
+                defaults to the process wide cache.
+            workers (int, optional): the max number of files read at once,
+                where 1 reads the files sequentially.
         """
         self._filename = filename
+        self._cache = cache if cache is not None else PARSE_CACHE
+        self._workers = workers
+        self._origins = {}
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def origins(self):
+        """
+        Returns:
+            dict: of the top level keys of the last loaded template to
+                the real path of the file which defined them.
+        """
+        return self._origins
 
     def run(self):
         """
@@ -289,46 +713,117 @@ class Loader(object):
         Returns:
             collection: returns load collection and all recusively loaded ones.
         """
-        try:
-            realname = os.path.realpath(filename)
-            working_path = os.path.dirname(realname)
+        realname = os.path.realpath(filename)
+        files = self._read_tree(realname)
+        self._origins = {}
+        return self._merge(realname, files, ())
+
+    def _read_tree(self, realname):
+        """
+        Reads every file in the include tree, a level at a time.
+
+        Returns:
+            dict: of real file paths to their parsed contents.
+        """
+        files = {}
+        pending = [realname]
+        pool = None
 
-            with working_directory(working_path):
-                data = anyconfig.load(realname, safe=True)
+        try:
+            while pending:
+                if len(pending) > 1 and self._workers > 1:
+                    if pool is None:
+                        pool = ThreadPool(self._workers)
 
-                assert isinstance(data, dict)
+                    loaded = pool.map(self._read, pending)
+                else:
+                    loaded = [self._read(name) for name in pending]
 
-                if 'includes' in data:
-                    include_data = {}
+                includes = []
+                for name, data in zip(pending, loaded):
+                    files[name] = data
 
-                    # Iterate through the includes in order merging
-                    # the dictionaries.  NOTE: Ordering matters here.
-                    for include_file in data['includes']:
-                        # Dict entries in new include file can override entries
-                        # already in include_data.
-                        sub = self.load(include_file)
+                    for include in get_includes(name, data):
+                        if include not in files and include not in includes:
+                            includes.append(include)
 
-                        if sub:
-                            if include_data:
-                                include_data.update(sub)
-                            else:
-                                include_data = sub
+                pending = includes
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
 
-                    # Finally, merge the include data with our data
-                    # our data will take priority in the merge if
-                    # duplicate keys are found.
-                    if include_data:
-                        include_data.update(data)
-                        data = include_data
+        return files
 
-                return data
+    def _read(self, realname):
+        try:
+            data = self._cache.load(realname)
         except ValueError as exc:
             # If we get a ValueError while building up
             # the dict, rethrow the error but supply the
             # filename it failed on.
-            raise ValueError(
-                '{} file {}'.format(
-                    exc.message,
-                    os.path.realpath(filename)
-                )
+            raise ValueError('{} file {}'.format(exc, realname))
+
+        assert isinstance(data, dict)
+        return data
+
+    def _merge(self, realname, files, chain):
+        """
+        Merges the includes of a file into its data in the declared order.
+        """
+        if realname in chain:
+            raise ManifestError(
+                'Circular include of {}'.format(realname),
+                logger=logger
             )
+
+        data = files[realname]
+
+        if 'includes' in data:
+            include_data = {}
+
+            # Iterate through the includes in order merging
+            # the dictionaries.  NOTE: Ordering matters here.
+            for include in get_includes(realname, data):
+                # Dict entries in new include file can override entries
+                # already in include_data.
+                sub = self._merge(include, files, chain + (realname,))
+
+                if sub:
+                    if include_data:
+                        include_data.update(sub)
+                    else:
+                        # Copy, since a file may be included more than once.
+                        include_data = dict(sub)
+
+            # Finally, merge the include data with our data
+            # our data will take priority in the merge if
+            # duplicate keys are found.
+            if include_data:
+                include_data.update(data)
+                data = include_data
+
+        for key in files[realname]:
+            self._origins[key] = realname
+
+        return data
+
+
+def get_includes(realname, data):
+    """
+    Returns the real paths of the files included by a file, which are
+    relative to the directory of that file.
+
+    Args:
+        realname (str): the real path of the including file.
+        data (dict): the parsed contents of the file.
+
+    Returns:
+        list: of the real paths of the included files in declared order.
+    """
+    working_path = os.path.dirname(realname)
+
+    return [
+        os.path.realpath(os.path.join(working_path, include_file))
+        for include_file in data.get('includes', [])
+    ]
@@ -7,17 +7,18 @@
 
 # max seconds to wait for any non instance stack resources to create
 # CREATE_TIMEOUT = 60
-import boto
+from shepherd.common.connections import get_connection
+from shepherd.common.poller import get_poller
 
 
-def get_access_key(username, access_key):
+def get_access_key(username, access_key, stack=None):
     """
     Boto doesn't provide a way to query for a specific access_key
     so we have our own for now.
     """
     result = None
-    conn = boto.connect_iam()
-    resp = conn.get_all_access_keys(username)
+    with get_connection('iam', stack) as conn:
+        resp = conn.get_all_access_keys(username)
     results = resp['list_access_keys_response']['list_access_keys_result']
     keys = results['access_key_metadata']
 
@@ -30,17 +31,17 @@ def get_access_key(username, access_key):
 
 def get_security_group(group_id=None, group_name=None, stack=None):
     result = None
-    conn = boto.connect_ec2()
     resp = None
 
-    if group_name:
-        name = group_name
-        if stack and stack.get_resource_by_name(group_name):
-            name = stack.get_global_resource_name(group_name)
+    with get_connection('ec2', stack) as conn:
+        if group_name:
+            name = group_name
+            if stack and stack.get_resource_by_name(group_name):
+                name = stack.get_global_resource_name(group_name)
 
-        resp = conn.get_all_security_groups(groupnames=[name])
-    elif group_id:
-        resp = conn.get_all_security_groups(group_ids=[group_id])
+            resp = conn.get_all_security_groups(groupnames=[name])
+        elif group_id:
+            resp = conn.get_all_security_groups(group_ids=[group_id])
 
     if resp is not None and len(resp) == 1:
         result = resp[0]
@@ -48,12 +49,84 @@ def get_security_group(group_id=None, group_name=None, stack=None):
     return result
 
 
-def get_volume(volume_id):
+def get_volume(volume_id, stack=None):
     result = None
-    conn = boto.connect_ec2()
-    resp = conn.get_all_volumes(volume_id)
+    with get_connection('ec2', stack) as conn:
+        resp = conn.get_all_volumes(volume_id)
 
     if resp is not None and len(resp) == 1:
         result = resp[0]
 
     return result
+
+
+def describe_instances(instance_ids, stack=None):
+    with get_connection('ec2', stack) as conn:
+        instances = conn.get_only_instances(instance_ids=instance_ids)
+
+    return dict((instance.id, instance) for instance in instances)
+
+
+def describe_instance_status(instance_ids, stack=None):
+    with get_connection('ec2', stack) as conn:
+        statuses = conn.get_all_instance_status(instance_ids=instance_ids)
+
+    return dict((status.id, status) for status in statuses)
+
+
+def describe_spot_requests(request_ids, stack=None):
+    with get_connection('ec2', stack) as conn:
+        requests = conn.get_all_spot_instance_requests(request_ids=request_ids)
+
+    return dict((request.id, request) for request in requests)
+
+
+def describe_volumes(volume_ids, stack=None):
+    with get_connection('ec2', stack) as conn:
+        volumes = conn.get_all_volumes(volume_ids=volume_ids)
+
+    return dict((volume.id, volume) for volume in volumes)
+
+
+def describe_security_groups(group_ids, stack=None):
+    with get_connection('ec2', stack) as conn:
+        groups = conn.get_all_security_groups(group_ids=group_ids)
+
+    return dict((group.id, group) for group in groups)
+
+
+_DESCRIBERS = {
+    'instances': describe_instances,
+    'instance_status': describe_instance_status,
+    'spot_requests': describe_spot_requests,
+    'volumes': describe_volumes,
+    'security_groups': describe_security_groups,
+}
+
+
+def poll(kind, object_id, stack=None):
+    """
+    Describes the object through the stack's batching poller, so that all
+    resources waiting on the same kind of object share a single describe
+    call per tick.
+
+    Args:
+        kind (str): one of 'instances', 'instance_status', 'spot_requests',
+            'volumes' or 'security_groups'.
+        object_id (str): the id of the object to describe.
+        stack (Stack, optional): the stack whose poller and connections are used.
+
+    Returns:
+        the described boto object or None if it wasn't found.
+    """
+    describe = _DESCRIBERS[kind]
+    return get_poller(stack).get(
+        kind, object_id, lambda ids: describe(ids, stack=stack)
+    )
+
+
+def unpoll(kind, object_id, stack=None):
+    """
+    Stops polling the object once a resource is no longer waiting on it.
+    """
+    get_poller(stack).release(kind, object_id)
@@ -1,44 +1,53 @@
 from __future__ import print_function
 
-import boto
-
 from boto.ec2.blockdevicemapping import BlockDeviceMapping
 from boto.ec2.blockdevicemapping import BlockDeviceType
 
-from arbiter import create_task
-from arbiter.sync import run_tasks
-
 from shepherd.common.plugins import Resource
 from shepherd.common.utils import tasks_passed
-from shepherd.resources.aws import get_security_group
+from shepherd.resources.aws import get_security_group, poll, unpoll
 
 SPOT_REQUEST_ACTIVE = 'active'
 SPOT_REQUEST_FULFILLED = 'fulfilled'
 INST_RUNNING_STATE = 'running'
 INST_REACHABLE_STATE = 'passed'
 
+# The (device, ephemeral name) pairs of the block device mapping,
+# which is built from them for each call that needs one.
+EPHEMERAL_DEVICES = (
+    ('/dev/sdb', 'ephemeral0'),
+    ('/dev/sdc', 'ephemeral1'),
+    ('/dev/sdd', 'ephemeral1'),
+    ('/dev/sde', 'ephemeral1'),
+)
+
 
 def get_block_device_mapping():
     mapping = BlockDeviceMapping()
 
-    eph0 = BlockDeviceType()
-    eph1 = BlockDeviceType()
-    eph2 = BlockDeviceType()
-    eph3 = BlockDeviceType()
-    eph0.ephemeral_name = 'ephemeral0'
-    eph1.ephemeral_name = 'ephemeral1'
-    eph2.ephemeral_name = 'ephemeral2'
-    eph3.ephemeral_name = 'ephemeral3'
-
-    mapping['/dev/sdb'] = eph0
-    mapping['/dev/sdc'] = eph1
-    mapping['/dev/sdd'] = eph1
-    mapping['/dev/sde'] = eph1
+    for device, ephemeral_name in EPHEMERAL_DEVICES:
+        device_type = BlockDeviceType()
+        device_type.ephemeral_name = ephemeral_name
+        mapping[device] = device_type
 
     return mapping
 
 
 class Instance(Resource):
+    _attributes = {
+        'availability_zone': '_availability_zone',
+        'image_id': '_image_id',
+        'instance_type': '_instance_type',
+        'security_groups': '_security_groups',
+        'key_name': '_key_name',
+        'spot_price': '_spot_price',
+        'volumes': '_volumes',
+        'user_data': '_user_data',
+        'instance_id': '_instance_id',
+        'spot_instance_request': '_spot_instance_request',
+        'terminated': '_terminated',
+    }
+
     def __init__(self):
         super(Instance, self).__init__('aws')
         self._availability_zone = None
@@ -55,23 +64,8 @@ class Instance(Resource):
         self._spot_instance_request = None
         self._ip = None
         self._reservation = None
-        self._block_device_map = get_block_device_mapping()
         self._terminated = True
 
-        self._attributes_map.update({
-            'availability_zone': '_availability_zone',
-            'image_id': '_image_id',
-            'instance_type': '_instance_type',
-            'security_groups': '_security_groups',
-            'key_name': '_key_name',
-            'spot_price': '_spot_price',
-            'volumes': '_volumes',
-            'user_data': '_user_data',
-            'instance_id': '_instance_id',
-            'spot_instance_request': '_spot_instance_request',
-            'terminated': '_terminated',
-        })
-
     def get_dependencies(self):
         deps = []
 
@@ -95,6 +89,10 @@ class Instance(Resource):
     def ip(self):
         return self._ip
 
+    @property
+    def _block_device_map(self):
+        return get_block_device_mapping()
+
     @Resource.validate_create()
     def create(self):
         """
@@ -111,18 +109,16 @@ class Instance(Resource):
             7. ssh_accessible
         """
         common_tasks = (
-            create_task('get_security_group_ids', self._get_security_group_ids),
-            create_task(
+            ('get_security_group_ids', self._get_security_group_ids, ()),
+            self.wait_task(
                 'check_running', self._check_running, ('get_instance_id',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
+                cleanup=lambda: unpoll('instances', self._instance_id, stack=self.stack)
             ),
-            create_task('create_tags', self._create_tags, ('check_running',)),
-            create_task('attach_volumes', self.attach_volumes, ('check_running',)),
-            create_task(
+            ('create_tags', self._create_tags, ('check_running',)),
+            ('attach_volumes', self.attach_volumes, ('check_running',)),
+            self.wait_task(
                 'check_initialized', self._check_reachable, ('check_running',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
+                cleanup=lambda: unpoll('instance_status', self._instance_id, stack=self.stack)
             ),
             # Test ssh accessibility
         )
@@ -130,20 +126,19 @@ class Instance(Resource):
         type_specific_tasks = ()
         if self._spot_price:
             type_specific_tasks = (
-                create_task('request_spot', self._request_spot, ('get_security_group_ids',)),
-                create_task(
+                ('request_spot', self._request_spot, ('get_security_group_ids',)),
+                self.wait_task(
                     'get_instance_id', self._check_spot, ('request_spot',),
-                    retries=self.stack.settings['retries'],
-                    delay=self.stack.settings['delay']
+                    cleanup=self._unpoll_spot
                 ),
             )
         else:
             type_specific_tasks = (
-                create_task('get_instance_id', self._request_demand, ('get_security_group_ids',)),
+                ('get_instance_id', self._request_demand, ('get_security_group_ids',)),
             )
 
         tasks = common_tasks + type_specific_tasks
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
 
         self._available = tasks_passed(
             results, self._logger,
@@ -152,20 +147,21 @@ class Instance(Resource):
 
     @Resource.validate_destroy()
     def destroy(self):
-        conn = boto.connect_ec2()
         if self._spot_instance_request:
-            conn.cancel_spot_instance_requests(self._spot_instance_request)
+            with self.connection('ec2') as conn:
+                conn.cancel_spot_instance_requests(self._spot_instance_request)
             self._spot_instance_request = None
 
+        # The check clears the instance id once it's terminated.
+        instance_id = self._instance_id
         tasks = (
-            create_task('terminate', self._terminate_instance),
-            create_task(
+            ('terminate', self._terminate_instance, ()),
+            self.wait_task(
                 'check', self._check_terminated, ('terminate',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
+                cleanup=lambda: unpoll('instances', instance_id, stack=self.stack)
             ),
         )
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
 
         return tasks_passed(
             results, self._logger,
@@ -175,39 +171,38 @@ class Instance(Resource):
     # Might want to organize this and create tags better
     def attach_volumes(self):
         if self._instance_id:
-            conn = boto.connect_ec2()
-
-            for volume_dict in self._volumes:
-                volume_id = self._get_volume_id(
-                    volume_dict['VolumeId']
-                )
-                # volume = get_volume(volume_id)
-                mountpoint = volume_dict['Device']
-
-                self._logger.debug(
-                    'Attaching volume %s to %s an %s',
-                    volume_id, self._instance_id, mountpoint
-                )
-
-                conn.attach_volume(
-                    volume_id=volume_id,
-                    instance_id=self._instance_id,
-                    device=mountpoint
-                )
+            with self.connection('ec2') as conn:
+                for volume_dict in self._volumes:
+                    volume_id = self._get_volume_id(
+                        volume_dict['VolumeId']
+                    )
+                    # volume = get_volume(volume_id)
+                    mountpoint = volume_dict['Device']
+
+                    self._logger.debug(
+                        'Attaching volume %s to %s an %s',
+                        volume_id, self._instance_id, mountpoint
+                    )
+
+                    conn.attach_volume(
+                        volume_id=volume_id,
+                        instance_id=self._instance_id,
+                        device=mountpoint
+                    )
         return True
 
     def _request_demand(self):
         self._logger.debug('Requesting demand instance %s', self._local_name)
-        conn = boto.connect_ec2()
-        reservation = conn.run_instances(
-            image_id=self._image_id,
-            instance_type=self._instance_type,
-            key_name=self._key_name,
-            user_data=self._user_data,
-            security_group_ids=self._security_group_ids,
-            placement=self._availability_zone,
-            block_device_map=self._block_device_map
-        )
+        with self.connection('ec2') as conn:
+            reservation = conn.run_instances(
+                image_id=self._image_id,
+                instance_type=self._instance_type,
+                key_name=self._key_name,
+                user_data=self._user_data,
+                security_group_ids=self._security_group_ids,
+                placement=self._availability_zone,
+                block_device_map=self._block_device_map
+            )
 
         assert len(reservation.instances) == 1
 
@@ -216,28 +211,28 @@ class Instance(Resource):
 
     def _request_spot(self):
         self._logger.debug('Requesting spot instance %s', self._local_name)
-        conn = boto.connect_ec2()
-        self._spot_instance_request = conn.request_spot_instances(
-            image_id=self._image_id,
-            price=self._spot_price,
-            type='one-time',
-            instance_type=self._instance_type,
-            key_name=self._key_name,
-            user_data=self._user_data,
-            security_group_ids=self._security_group_ids,
-            placement=self._availability_zone,
-            block_device_map=self._block_device_map
-        )[0]
+        with self.connection('ec2') as conn:
+            self._spot_instance_request = conn.request_spot_instances(
+                image_id=self._image_id,
+                price=self._spot_price,
+                type='one-time',
+                instance_type=self._instance_type,
+                key_name=self._key_name,
+                user_data=self._user_data,
+                security_group_ids=self._security_group_ids,
+                placement=self._availability_zone,
+                block_device_map=self._block_device_map
+            )[0]
         return True
 
     def _terminate_instance(self):
-        conn = boto.connect_ec2()
         if self._instance_id:
             if not self._terminated:
                 self._logger.debug('Terminating instance %s', self._local_name)
-                conn.terminate_instances(
-                    instance_ids=[self._instance_id]
-                )
+                with self.connection('ec2') as conn:
+                    conn.terminate_instances(
+                        instance_ids=[self._instance_id]
+                    )
                 self._terminated = True
 
         return self._terminated
@@ -246,12 +241,8 @@ class Instance(Resource):
         self._logger.debug('Checking if instance %s is running', self._local_name)
         resp = False
         assert self._instance_id
-        conn = boto.connect_ec2()
-        instances = conn.get_only_instances(
-            instance_ids=[self._instance_id]
-        )
-        assert len(instances) == 1
-        instance = instances[0]
+        instance = poll('instances', self._instance_id, stack=self.stack)
+        assert instance is not None
         if instance.state == INST_RUNNING_STATE:
             self._terminated = False
             self._ip = instance.ip_address
@@ -263,31 +254,24 @@ class Instance(Resource):
         self._logger.debug('Checking if instance %s is reachable', self._local_name)
         resp = False
         assert self._instance_id
-        conn = boto.connect_ec2()
-        status = conn.get_all_instance_status(
-            instance_ids=[self._instance_id]
-        )
+        status = poll('instance_status', self._instance_id, stack=self.stack)
 
-        if len(status) > 0:
-            if status[0].system_status.details['reachability'] == INST_REACHABLE_STATE:
+        if status is not None:
+            if status.system_status.details['reachability'] == INST_REACHABLE_STATE:
                 resp = True
             else:
                 self._logger.debug(
                     'Reachability Status = %s',
-                    status[0].system_status.details['reachability']
+                    status.system_status.details['reachability']
                 )
 
         return resp
 
     def _check_terminated(self):
-        conn = boto.connect_ec2()
         if self._instance_id:
-            reservation = conn.get_all_instances(
-                instance_ids=[self._instance_id]
-            )[0]
-            instance = reservation.instances[0]
+            instance = poll('instances', self._instance_id, stack=self.stack)
 
-            if instance.state == 'terminated':
+            if instance is not None and instance.state == 'terminated':
                 self._available = False
                 self._instance_id = None
 
@@ -299,13 +283,9 @@ class Instance(Resource):
             self._spot_instance_request.id
         )
         resp = False
-        conn = boto.connect_ec2()
 
-        requests = conn.get_all_spot_instance_requests(
-            request_ids=[self._spot_instance_request.id]
-        )
-        assert len(requests) == 1
-        request = requests[0]
+        request = poll('spot_requests', self._spot_instance_request.id, stack=self.stack)
+        assert request is not None
         if (request.state == SPOT_REQUEST_ACTIVE and
                 request.status.code == SPOT_REQUEST_FULFILLED and
                 request.instance_id):
@@ -314,11 +294,19 @@ class Instance(Resource):
 
         return resp
 
+    def _unpoll_spot(self):
+        if self._spot_instance_request:
+            unpoll('spot_requests', self._spot_instance_request.id, stack=self.stack)
+
     def _create_tags(self):
-        conn = boto.connect_ec2()
         self._logger.debug('Creating tags for instance %s', self._local_name)
-        self._tags.update(self.stack.tags)
-        conn.create_tags([self._instance_id], self._tags)
+        # Set the tags through the setter so the stack reindexes them
+        tags = dict(self._tags)
+        tags.update(self.stack.tags)
+        self.tags = tags
+
+        with self.connection('ec2') as conn:
+            conn.create_tags([self._instance_id], self.tags)
         return True
 
     def _get_security_group_ids(self):
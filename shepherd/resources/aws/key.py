@@ -8,11 +8,6 @@ Handles creation of IAM access key resources on aws.
 
 from __future__ import print_function
 
-import boto
-
-from arbiter import create_task
-from arbiter.sync import run_tasks
-
 from shepherd.common.plugins import Resource
 from shepherd.common.utils import pascal_to_underscore, tasks_passed
 from shepherd.resources.aws import get_access_key
@@ -23,14 +18,15 @@ class AccessKey(Resource):
     Subclasses :class:`Resource <Resource>` plugin
     to create and destroy AWS IAM access keys for IAM users.
     """
+    _attributes = {
+        'user_name': '_user_name',
+        'access_key_id': '_access_key_id',
+    }
+
     def __init__(self):
         super(AccessKey, self).__init__('aws')
         self._user_name = None
         self._access_key_id = None
-        self._attributes_map.update({
-            'user_name': '_user_name',
-            'access_key_id': '_access_key_id',
-        })
 
     def deserialize(self, data):
         super(AccessKey, self).deserialize(data)
@@ -60,14 +56,10 @@ class AccessKey(Resource):
         # create one before.
         # Reminder: self._user_name and iamuser.local_name are the same.
         tasks = (
-            create_task('create', self._create_key),
-            create_task(
-                'check', self._check_created, ('create',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
-            )
+            ('create', self._create_key, ()),
+            self.wait_task('check', self._check_created, ('create',))
         )
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
         return tasks_passed(
             results, self._logger,
             msg='Failed to provision key {}'.format(self._local_name)
@@ -76,14 +68,10 @@ class AccessKey(Resource):
     @Resource.validate_destroy()
     def destroy(self):
         tasks = (
-            create_task('delete', self._delete_key),
-            create_task(
-                'check', self._check_deleted, ('delete',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
-            )
+            ('delete', self._delete_key, ()),
+            self.wait_task('check', self._check_deleted, ('delete',))
         )
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
 
         return tasks_passed(
             results, self._logger,
@@ -104,8 +92,8 @@ class AccessKey(Resource):
             )
 
             # Create the key
-            conn = boto.connect_iam()
-            resp = conn.create_access_key(self._global_name)
+            with self.connection('iam') as conn:
+                resp = conn.create_access_key(self._global_name)
             result = resp.create_access_key_response.create_access_key_result
             self._access_key_id = result.access_key.access_key_id
 
@@ -117,18 +105,17 @@ class AccessKey(Resource):
             'Requesting deletion of IAM Access Key (%s)...',
             self._access_key_id
         )
-        conn = boto.connect_iam()
-
-        conn.delete_access_key(
-            self._access_key_id,
-            self._global_name
-        )
+        with self.connection('iam') as conn:
+            conn.delete_access_key(
+                self._access_key_id,
+                self._global_name
+            )
 
         return True
 
     def _check_created(self):
         """ Performs a check that the access key is available """
-        if get_access_key(self._global_name, self._access_key_id):
+        if get_access_key(self._global_name, self._access_key_id, stack=self.stack):
             self._logger.debug(
                 'AccessKey %s is now available.', self._local_name
             )
@@ -138,7 +125,7 @@ class AccessKey(Resource):
 
     def _check_deleted(self):
         """ Performs a check to ensure that the key was successfully deleted """
-        if not get_access_key(self._global_name, self._access_key_id):
+        if not get_access_key(self._global_name, self._access_key_id, stack=self.stack):
             self._logger.debug('AccessKey %s deleted', self._local_name)
             self._access_key_id = None
             self._available = False
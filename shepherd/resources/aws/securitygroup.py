@@ -5,28 +5,23 @@ Handles creation and destruction of security groups
 """
 from __future__ import print_function
 
-import boto
-
-from arbiter import create_task
-from arbiter.sync import run_tasks
-
 from shepherd.common.plugins import Resource
 from shepherd.common.exceptions import StackError
 from shepherd.common.utils import tasks_passed
-from shepherd.resources.aws import get_security_group
+from shepherd.resources.aws import get_security_group, poll, unpoll
 
 
 class SecurityGroup(Resource):
+    _attributes = {
+        'group_id': '_group_id',
+        'group_description': '_group_description',
+    }
+
     def __init__(self):
         super(SecurityGroup, self).__init__('aws')
         self._group_id = None
         self._group_description = None
 
-        self._attributes_map.update({
-            'group_id': '_group_id',
-            'group_description': '_group_description'
-        })
-
     def get_dependencies(self):
         deps = []
         self._logger.debug(
@@ -38,14 +33,13 @@ class SecurityGroup(Resource):
     @Resource.validate_create()
     def create(self):
         tasks = (
-            create_task('create', self._create_group),
-            create_task(
+            ('create', self._create_group, ()),
+            self.wait_task(
                 'check', self._check_created, ('create',),
-                retries=self.stack.settings["retries"],
-                delay=self.stack.settings["delay"]
+                cleanup=lambda: unpoll('security_groups', self._group_id, stack=self.stack)
             )
         )
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
 
         return tasks_passed(
             results, self._logger,
@@ -54,10 +48,11 @@ class SecurityGroup(Resource):
 
     @Resource.validate_destroy()
     def destroy(self):
-        conn = boto.connect_ec2()
         logger = self._logger
-        if self._group_id is not None and get_security_group(group_id=self._group_id):
-            resp = conn.delete_security_group(group_id=self._group_id)
+        if (self._group_id is not None and
+                get_security_group(group_id=self._group_id, stack=self.stack)):
+            with self.connection('ec2') as conn:
+                resp = conn.delete_security_group(group_id=self._group_id)
 
             if resp:
                 logger.info(
@@ -80,7 +75,6 @@ class SecurityGroup(Resource):
 
     def _create_group(self):
         """ Handles the creation request """
-        conn = boto.connect_ec2()
         if self._group_id is None:
             self._logger.debug(
                 'Requesting EC2 Security Group %s...',
@@ -92,16 +86,17 @@ class SecurityGroup(Resource):
             )
 
             # Create the Security group
-            self._group_id = conn.create_security_group(
-                self._global_name,
-                self._group_description
-            ).id
+            with self.connection('ec2') as conn:
+                self._group_id = conn.create_security_group(
+                    self._global_name,
+                    self._group_description
+                ).id
 
         return True
 
     def _check_created(self):
         """ Checks that group is available """
-        if get_security_group(group_id=self._group_id):
+        if poll('security_groups', self._group_id, stack=self.stack):
             self._logger.info(
                 'EC2 Security Group %s is now available.',
                 self._local_name
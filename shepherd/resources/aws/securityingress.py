@@ -1,13 +1,22 @@
 from __future__ import print_function
 
-import boto
-
 from shepherd.common.plugins import Resource
 from shepherd.common.exceptions import StackError
 from shepherd.resources.aws import get_security_group
 
 
 class SecurityGroupIngress(Resource):
+    _attributes = {
+        'group_name': '_group_name',
+        'group_id': '_group_id',
+        'src_security_group_name': '_src_security_group_name',
+        'src_group_id': '_src_group_id',
+        'cidr_ip': '_cidr_ip',
+        'ip_protocol': '_ip_protocol',
+        'from_port': '_from_port',
+        'to_port': '_to_port',
+    }
+
     def __init__(self):
         super(SecurityGroupIngress, self).__init__('aws')
         self._group_name = None
@@ -19,17 +28,6 @@ class SecurityGroupIngress(Resource):
         self._from_port = None
         self._to_port = None
 
-        self._attributes_map.update({
-            'group_name': '_group_name',
-            'group_id': '_group_id',
-            'src_security_group_name': '_src_security_group_name',
-            'src_group_id': '_src_group_id',
-            'cidr_ip': '_cidr_ip',
-            'ip_protocol': '_ip_protocol',
-            'from_port': '_from_port',
-            'to_port': '_to_port',
-        })
-
     def get_dependencies(self):
         deps = []
 
@@ -55,8 +53,8 @@ class SecurityGroupIngress(Resource):
     def create(self):
         self._set_group_names()
 
-        conn = boto.connect_ec2()
-        resp = self._exec(conn.authorize_security_group)
+        with self.connection('ec2') as conn:
+            resp = self._exec(conn.authorize_security_group)
         if resp:
             self._available = True
         else:
@@ -70,8 +68,8 @@ class SecurityGroupIngress(Resource):
     def destroy(self):
         self._set_group_names()
 
-        conn = boto.connect_ec2()
-        resp = self._exec(conn.revoke_security_group)
+        with self.connection('ec2') as conn:
+            resp = self._exec(conn.revoke_security_group)
         if resp:
             self._available = False
         else:
@@ -1,20 +1,25 @@
 from __future__ import print_function
 
-import boto
-
-from arbiter import create_task
-from arbiter.sync import run_tasks
-
 # from shepherd.resource import Resource, TemplateObject
 from shepherd.common.plugins import Resource
 from shepherd.common.exceptions import StackError
 from shepherd.common.utils import pascal_to_underscore, tasks_passed
-from shepherd.resources.aws import get_volume
+from shepherd.resources.aws import get_volume, poll, unpoll
 
 DEFAULT_VOL_SIZE = 128
 
 
 class Volume(Resource):
+    _attributes = {
+        'snapshot_id': '_snapshot_id',
+        'volume_id': '_volume_id',
+        'availability_zone': '_availability_zone',
+        'iops': '_iops',
+        'size': '_size',
+        'encrypted': '_encrypted',
+        'volume_type': '_volume_type',
+    }
+
     def __init__(self):
         super(Volume, self).__init__('aws')
         self._snapshot_id = None
@@ -25,16 +30,6 @@ class Volume(Resource):
         self._volume_type = "io1"
         self._encrypted = False
 
-        self._attributes_map.update({
-            'snapshot_id': '_snapshot_id',
-            'volume_id': '_volume_id',
-            'availability_zone': '_availability_zone',
-            'iops': '_iops',
-            'size': '_size',
-            'encrypted': '_encrypted',
-            'volume_type': '_volume_type',
-        })
-
     @property
     def volume_id(self):
         return self._volume_id
@@ -58,16 +53,15 @@ class Volume(Resource):
     @Resource.validate_create()
     def create(self):
         tasks = (
-            create_task('check_snapshot', self._check_snapshot),
-            create_task('create_volume', self._create_volume, ('check_snapshot',)),
-            create_task('create_tags', self._create_tags, ('create_volume',)),
-            create_task(
+            ('check_snapshot', self._check_snapshot, ()),
+            ('create_volume', self._create_volume, ('check_snapshot',)),
+            ('create_tags', self._create_tags, ('create_volume',)),
+            self.wait_task(
                 'check_created', self._check_created, ('create_volume',),
-                retries=self.stack.settings['retries'],
-                delay=self.stack.settings['delay']
+                cleanup=lambda: unpoll('volumes', self._volume_id, stack=self.stack)
             ),
         )
-        results = run_tasks(tasks)
+        results = self.run_tasks(tasks)
         return tasks_passed(
             results, self._logger,
             msg='Failed to provision volume {}'.format(self._local_name)
@@ -75,9 +69,9 @@ class Volume(Resource):
 
     @Resource.validate_destroy()
     def destroy(self):
-        if self._volume_id and get_volume(self._volume_id):
-            conn = boto.connect_ec2()
-            rc = conn.delete_volume(self._volume_id)
+        if self._volume_id and get_volume(self._volume_id, stack=self.stack):
+            with self.connection('ec2') as conn:
+                rc = conn.delete_volume(self._volume_id)
 
             if not rc:
                 StackError(
@@ -95,17 +89,17 @@ class Volume(Resource):
         self._available = False
 
     def _create_volume(self):
-        conn = boto.connect_ec2()
         if not self._volume_id:
             self._logger.debug('Creating volume %s', self._local_name)
-            volume = conn.create_volume(
-                size=self._size,
-                zone=self._availability_zone,
-                snapshot=self._snapshot_id,
-                volume_type=self._volume_type,
-                iops=self._iops,
-                encrypted=self._encrypted
-            )
+            with self.connection('ec2') as conn:
+                volume = conn.create_volume(
+                    size=self._size,
+                    zone=self._availability_zone,
+                    snapshot=self._snapshot_id,
+                    volume_type=self._volume_type,
+                    iops=self._iops,
+                    encrypted=self._encrypted
+                )
 
             if volume:
                 self._volume_id = volume.id
@@ -119,17 +113,21 @@ class Volume(Resource):
         return True
 
     def _create_tags(self):
-        conn = boto.connect_ec2()
-        self._tags.update(self.stack.tags)
-        conn.create_tags(self._volume_id, self._tags)
+        # Set the tags through the setter so the stack reindexes them
+        tags = dict(self._tags)
+        tags.update(self.stack.tags)
+        self.tags = tags
+
+        with self.connection('ec2') as conn:
+            conn.create_tags(self._volume_id, self.tags)
         return True
 
     def _check_snapshot(self):
-        conn = boto.connect_ec2()
         if self._snapshot_id and not self._size:
-            snapshots = conn.get_all_snapshots(
-                snapshot_ids=[self._snapshot_id]
-            )
+            with self.connection('ec2') as conn:
+                snapshots = conn.get_all_snapshots(
+                    snapshot_ids=[self._snapshot_id]
+                )
 
             if len(snapshots) > 0 and snapshots[0] is not None:
                 self._size = snapshots[0].volume_size
@@ -143,7 +141,7 @@ class Volume(Resource):
         return True
 
     def _check_created(self):
-        volume = get_volume(self._volume_id)
+        volume = poll('volumes', self._volume_id, stack=self.stack)
         if volume:
             self._logger.debug('Volume status = %s', volume.status)
 
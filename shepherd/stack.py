@@ -6,18 +6,45 @@ Stacks will support higher level operations like "create","wake","sleep".
 from __future__ import print_function
 from future.builtins import dict
 
+import time
 import logging
+import threading
 from datetime import datetime
-from arbiter import create_task
-from arbiter.sync import run_tasks
 
 from shepherd.config import Config
 from shepherd.manifest import Manifest
-from shepherd.common.exceptions import PluginError, StackError
+from shepherd.common.poller import BatchPoller
+from shepherd.common.executors import execute
+from shepherd.common.exceptions import PluginError, StackError, StorageError
 from shepherd.common.utils import dict_contains, tasks_passed
 
 logger = logging.getLogger(__name__)
 _DEFAULT_NAME_FMT = '{stack_name}_{stack_creation}'
+_DEFAULT_SAVE_INTERVAL = 5
+
+
+def get_store(config):
+    """
+    Builds and configures the storage plugin specified in config.settings.
+
+    Args:
+        config (Config): the config object used to find the storage plugin.
+
+    Raises:
+        PluginError: if the storage plugin listed in the config.settings
+            can't be found.
+    """
+    store_name = config.settings.storage.name
+    store = config.make_plugin('Storage', store_name)
+
+    if store is None:
+        raise PluginError(
+            'Failed to locate storage plugin {}'.format(store_name)
+        )
+
+    store.configure(config.settings.storage.settings)
+    store.connections = config.connections
+    return store
 
 
 class Stack(object):
@@ -51,6 +78,12 @@ class Stack(object):
         self._config_name = config.name
         self._settings = self._config.settings
         self._resources = []
+        self._by_name = {}
+        self._by_type = {}
+        self._by_tag = {}
+        self._tag_items = {}
+        self._index_lock = threading.RLock()
+        self._dependencies = {}
         self._tags = {
             'stack_name': self._local_name,
             'stack_creation': datetime.strftime(
@@ -66,6 +99,20 @@ class Stack(object):
             self._tags.update(self._settings.tags)
 
         self._global_name = self._name_fmt.format(**self._tags)
+        self._poller = BatchPoller(
+            self._settings.get('poll_interval', self._settings.get('delay', 0))
+        )
+
+        # Persistence state, new stacks are dirty until they're first saved.
+        self._store = None
+        self._store_name = None
+        self._dirty = True
+        self._saved_at = 0
+        self._changed = set()
+        self._full_dump = True
+        self._state_lock = threading.Lock()
+        self._save_lock = threading.RLock()
+        self._save_timer = None
 
     def __repr__(self):
         return u"Stack({}. {}".format(
@@ -92,6 +139,14 @@ class Stack(object):
     def tags(self):
         return self._tags
 
+    @property
+    def connections(self):
+        return self._config.connections
+
+    @property
+    def poller(self):
+        return self._poller
+
     @classmethod
     def make(cls, name, config):
         """
@@ -137,30 +192,63 @@ class Stack(object):
                 can't be found.
         """
         logger.debug('Stack.restore: Storage setting=%s', config.settings.storage)
-        store_name = config.settings.storage.name
-        # Get storage plugin
-        stores = config.get_plugins(
-            category_name='Storage',
-            plugin_name=store_name
-        )
-        if stores:
-            store = stores[0]
-            store.configure(config.settings.storage.settings)
-            serialized = store.load(name)
-
-            if not serialized:
-                raise StackError(
-                    'Could not find stack {} in store {}'
-                    .format(name, store_name),
-                    logger=logger
-                )
+        store = get_store(config)
+        serialized = store.load(name)
+
+        if not serialized:
+            store.close()
+            raise StackError(
+                'Could not find stack {} in store {}'
+                .format(name, config.settings.storage.name),
+                logger=logger
+            )
+
+        return Stack._restored(serialized, store, config)
+
+    @classmethod
+    def restore_many(cls, names, config):
+        """
+        Restores the stacks with the given names using a single
+        ``load_many`` call to the storage plugin specified in config.settings
+
+        Args:
+            names (list): the stack names to look for in the storage plugin
+            config (Config): the config object used to find the storage
+                plugin to load the stacks from.
 
-            stack = Stack.deserialize(serialized)
-        else:
-            raise PluginError(
-                'Failed to locate storage plugin {}'.format(store_name)
+        Returns:
+            list: of the restored stacks in the same order as the names.
+
+        Raises:
+            StackError: if any of the stacks can't be found.
+            PluginError: if the storage plugin listed in the config.settings
+                can't be found.
+        """
+        store = get_store(config)
+        loaded = store.load_many(names)
+
+        missing = [name for name, serialized in zip(names, loaded) if not serialized]
+        if missing:
+            store.close()
+            raise StackError(
+                'Could not find stacks {} in store {}'
+                .format(', '.join(missing), config.settings.storage.name),
+                logger=logger
             )
 
+        return [Stack._restored(serialized, store, config) for serialized in loaded]
+
+    @staticmethod
+    def _restored(serialized, store, config):
+        stack = Stack.deserialize(serialized)
+
+        # The stack is already in the store, so it only needs to be
+        # dumped again once something changes.
+        stack._store = store
+        stack._store_name = config.settings.storage.name
+        stack._dirty = False
+        stack._full_dump = False
+
         return stack
 
     def save(self):
@@ -173,20 +261,125 @@ class Stack(object):
                 can't be found.
         """
         logger.debug('Stack.save: Storage settings=%s', self._config.settings.storage)
-        store_name = self._config.settings.storage.name
-        # Get the storage plugin
-        stores = self._config.get_plugins(
-            category_name='Storage',
-            plugin_name=store_name
-        )
-        if stores:
-            store = stores[0]
-            store.configure(self._config.settings.storage.settings)
-            store.dump(self.serialize())
-        else:
-            raise PluginError(
-                'Failed to locate storage plugin {}'.format(store_name)
-            )
+
+        with self._save_lock:
+            # Reuse the storage plugin unless the settings point at a new one.
+            store_name = self._config.settings.storage.name
+            if self._store is None or self._store_name != store_name:
+                if self._store is not None:
+                    self._store.close()
+
+                self._store = get_store(self._config)
+                self._store_name = store_name
+                self._full_dump = True
+
+            with self._state_lock:
+                changed = self._changed
+                full = self._full_dump or not changed
+                self._changed = set()
+                self._dirty = False
+
+                # This save covers any deferred changes
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+
+            try:
+                if full or not self._store.supports_delta:
+                    self._store.dump(self.serialize())
+                    self._full_dump = False
+                else:
+                    logger.debug('Stack.save: Dumping changed resources %s', changed)
+                    try:
+                        self._store.dump_delta(self.serialize_delta(changed))
+                    except StorageError:
+                        # The stored stack is missing or unreadable, so replace it
+                        logger.warn('Stack.save: Falling back to dumping the whole stack')
+                        self._store.dump(self.serialize())
+            except:
+                with self._state_lock:
+                    self._changed.update(changed)
+                    self._dirty = True
+                raise
+
+            self._saved_at = time.time()
+
+    def mark_dirty(self, resource=None):
+        """
+        Marks the stack as changed since it was last saved. If the
+        ``save_interval`` setting has elapsed since the last save the
+        stack is flushed, otherwise (or if another thread is already
+        saving) a trailing save is scheduled for when the interval expires.
+
+        If only specific resources are marked as changed the next save
+        will only dump those resources when the storage plugin supports it.
+
+        Args:
+            resource (Resource, optional): the resource that changed. If not
+                supplied the whole stack will be dumped on the next save.
+        """
+        interval = self._settings.get('save_interval', _DEFAULT_SAVE_INTERVAL)
+
+        with self._state_lock:
+            self._dirty = True
+
+            if resource is None:
+                self._full_dump = True
+            else:
+                self._changed.add(resource.local_name)
+
+            remaining = interval - (time.time() - self._saved_at)
+
+        if remaining > 0 or not self.flush(blocking=False):
+            self._schedule_flush(max(remaining, 0))
+
+    def _schedule_flush(self, delay):
+        """
+        Starts a timer to flush the stack after the delay, unless one is
+        already pending.
+        """
+        with self._state_lock:
+            if self._save_timer is not None:
+                return
+
+            timer = threading.Timer(delay, self._trailing_flush)
+            timer.daemon = True
+            self._save_timer = timer
+
+        timer.start()
+
+    def _trailing_flush(self):
+        with self._state_lock:
+            self._save_timer = None
+
+        try:
+            self.flush()
+        except Exception as exc:
+            # The changes stay dirty for the next save to retry
+            logger.exception(exc)
+
+    def flush(self, blocking=True):
+        """
+        Saves the stack if it has changed since it was last saved.
+
+        Args:
+            blocking (bool, optional): whether to wait on a save already in
+                progress in another thread rather than skipping this flush.
+
+        Returns:
+            bool: whether the stack was saved.
+        """
+        if not self._save_lock.acquire(blocking):
+            return False
+
+        try:
+            if not self._dirty:
+                return False
+
+            self.save()
+            return True
+        finally:
+            self._save_lock.release()
 
     @classmethod
     def deserialize(cls, data):
@@ -239,6 +432,27 @@ class Stack(object):
 
         return result
 
+    def serialize_delta(self, names):
+        """
+        Serializes only the named resources for storage plugins which
+        support incremental dumps.
+
+        Args:
+            names (set): the local names of the resources which changed.
+
+        Returns:
+            dict: containing the global_name, the ordered list of all
+                resource_names and the serialized changed resources.
+        """
+        return {
+            'global_name': self._global_name,
+            'resource_names': [resource.local_name for resource in self._resources],
+            'resources': [
+                resource.serialize() for resource in self._resources
+                if resource.local_name in names
+            ],
+        }
+
     def get_global_resource_name(self, name):
         """
         Generates the global name for a resources, which by defaults is
@@ -274,11 +488,7 @@ class Stack(object):
         Returns:
             the resource or None
         """
-        for resource in self._resources:
-            if resource.local_name == local_name:
-                return resource
-
-        return None
+        return self._by_name.get(local_name)
 
     def get_resource_by_type(self, resource_type):
         """
@@ -295,21 +505,16 @@ class Stack(object):
             list: of the resource of that type.
         """
         logger.info('Looking up resources of type %s', resource_type)
-        resources = []
-        for resource in self._resources:
-            if type(resource).__name__ == resource_type:
-                resources.append(resource)
-            elif hasattr(resource, 'type'):
-                if resource.type == resource_type:
-                    resources.append(resource)
-
-        return resources
+        return list(self._by_type.get(resource_type, []))
 
     def get_resource_by_tags(self, tags):
         """
         Returns a list of resources where the resource tags contains the same
         key values as the tags provided.
 
+        NOTE: the tag index is updated when a resource's tags are set, so if
+        you modify a resource's tags dict in place call :meth:`reindex`.
+
         Args:
             tags (dict): of tags to search by.
 
@@ -317,33 +522,160 @@ class Stack(object):
             list: of resource with the specified tags.
         """
         logger.info('Looking up resources with tags %s', str(tags))
+        candidates = self._resources
+
+        with self._index_lock:
+            try:
+                for item in tags.items():
+                    bucket = self._by_tag.get(item, [])
+                    if len(bucket) < len(candidates):
+                        candidates = bucket
+            except TypeError:
+                # Unhashable tag values aren't indexed.
+                candidates = self._resources
+
+            candidates = list(candidates)
+
         return [
-            resource for resource in self._resources if dict_contains(
+            resource for resource in candidates if dict_contains(
                 resource.tags, tags
             )
         ]
 
-    def task_function_wrapper(self, function):
+    def get_dependency_graph(self, resources=None):
         """
-        Wraps a resource function with
-          - saving the stack
-          - logging errors
-          - etc
+        Returns the dependencies of each resource. The dependencies of a
+        resource are only computed once and cached until resources are added.
 
         Args:
+            resources (list, optional): the subset of resources to include.
+                Defaults to all of them.
+
+        Returns:
+            dict: mapping each resource local_name to a tuple of the
+                local_names of the resources it depends on.
+        """
+        if resources is None:
+            resources = self._resources
+
+        graph = {}
+        for resource in resources:
+            deps = self._dependencies.get(resource.local_name)
+            if deps is None:
+                deps = tuple(dep.local_name for dep in resource.get_dependencies())
+                self._dependencies[resource.local_name] = deps
+
+            graph[resource.local_name] = deps
+
+        return graph
+
+    def get_dependents_graph(self, resources=None):
+        """
+        Returns the reverse of the dependency graph (ie: which resources
+        depend on each resource), which is the order resources must be
+        deprovisioned in.
+
+        Args:
+            resources (list, optional): the subset of resources to include.
+                Defaults to all of them. Only dependents within the subset
+                are included.
+
+        Returns:
+            dict: mapping each resource local_name to a list of the local_names
+                of the resources that depend on it.
+        """
+        graph = self.get_dependency_graph(resources)
+        dependents = dict((name, []) for name in graph)
+
+        for name, deps in graph.items():
+            for dep in deps:
+                dependents.setdefault(dep, []).append(name)
+
+        return dependents
+
+    def reindex(self, resource=None):
+        """
+        Rebuilds the name, type and tag indexes for a resource or for
+        all resources if none is supplied. Only the tag index entries
+        of a single resource are replaced, which is safe to call from
+        the threads running resource tasks.
+
+        Args:
+            resource (Resource, optional): the resource to reindex.
+        """
+        with self._index_lock:
+            if resource is None:
+                self._by_name = {}
+                self._by_type = {}
+                self._by_tag = {}
+                self._tag_items = {}
+                self._dependencies = {}
+                for res in self._resources:
+                    self._index(res)
+            elif self._by_name.get(resource.local_name) is resource:
+                for item in self._tag_items.pop(id(resource), []):
+                    bucket = self._by_tag[item]
+                    bucket.remove(resource)
+
+                    if not bucket:
+                        del self._by_tag[item]
+
+                self._index_tags(resource)
+
+    def _index(self, resource):
+        """ Adds the resource to the name, type and tag indexes """
+        with self._index_lock:
+            if resource.local_name not in self._by_name:
+                self._by_name[resource.local_name] = resource
+
+            types = [type(resource).__name__]
+            resource_type = getattr(resource, 'type', None)
+            if resource_type is not None and resource_type not in types:
+                types.append(resource_type)
+
+            for resource_type in types:
+                self._by_type.setdefault(resource_type, []).append(resource)
+
+            self._index_tags(resource)
+
+    def _index_tags(self, resource):
+        # Remember the indexed items so reindexing only touches their buckets
+        items = []
+        for item in resource.tags.items():
+            try:
+                self._by_tag.setdefault(item, []).append(resource)
+                items.append(item)
+            except TypeError:
+                pass
+
+        self._tag_items[id(resource)] = items
+
+    def _resource_task(self, resource, function):
+        """
+        Wraps a resource function so that it holds the resource type limit
+        from the config while running and marks the stack dirty afterwards.
+
+        Args:
+            resource (Resource): the resource the function belongs to.
             function (function): the function to wrap
         """
-        try:
-            function()
-            self.save()
-        except Exception as exc:
-            logger.exception(exc)
+        def run():
+            try:
+                with self._config.limiter.resource(resource.type):
+                    return function()
+            finally:
+                try:
+                    self.mark_dirty(resource)
+                except Exception as exc:
+                    logger.exception(exc)
+
+        return run
 
     def provision_resources(self, resources=None):
         """
         Handles building a list of create tasks and
         running them with dynamic dependency handling via
-        run_tasks. Roles back changes in case of failure.
+        the executor selected in the settings. Roles back changes in case of failure.
         ke: if provisioning fails any already provisioned resource
         are deprovision automatically.
 
@@ -363,6 +695,8 @@ class Stack(object):
             )
             resources = self._resources
 
+        dependencies = self.get_dependency_graph(resources)
+
         tasks = []
         for resource in resources:
             logger.info(
@@ -371,20 +705,22 @@ class Stack(object):
             )
             logger.debug(
                 'Stack.provision_resources - Dependencies: %s',
-                resource.get_dependencies()
+                dependencies[resource.local_name]
             )
 
-            tasks.append(
-                create_task(
-                    resource.local_name,
-                    resource.create,
-                    tuple(dep.local_name for dep in resource.get_dependencies())
-                )
-            )
+            tasks.append((
+                resource.local_name,
+                self._resource_task(resource, resource.create),
+                dependencies[resource.local_name]
+            ))
 
         # This should be in a try except cause arbiter won't catch anything
         logger.info("Provisioning Resources ...")
-        results = run_tasks(tasks)
+        try:
+            results = execute(tasks, self._settings)
+        finally:
+            self.flush()
+
         tasks_passed(
             results,
             logger,
@@ -396,7 +732,7 @@ class Stack(object):
         """
         Handles building a list of destroy tasks and
         running them with dynamic dependency handling via
-        run_tasks.
+        the executor selected in the settings.
 
         NOTE: We are also responsible for inverting the
         dependency cases to the standard creation dependencies.
@@ -417,15 +753,7 @@ class Stack(object):
             )
             resources = self._resources
 
-        inverse_dependencies = {}
-        for resource in resources:
-            inverse_dependencies[resource.local_name] = []
-
-            for dep in resource.get_dependencies():
-                if dep.local_name not in inverse_dependencies:
-                    inverse_dependencies[dep.local_name] = []
-
-                inverse_dependencies[dep.local_name].append(resource.local_name)
+        inverse_dependencies = self.get_dependents_graph(resources)
 
         tasks = []
         for resource in resources:
@@ -438,19 +766,21 @@ class Stack(object):
                 inverse_dependencies[resource.local_name]
             )
 
-            tasks.append(
-                create_task(
-                    resource.local_name,
-                    resource.destroy,
-                    tuple(dep for dep in inverse_dependencies[resource.local_name])
-                )
-            )
+            tasks.append((
+                resource.local_name,
+                self._resource_task(resource, resource.destroy),
+                tuple(dep for dep in inverse_dependencies[resource.local_name])
+            ))
 
         # TODO: Should check for failed tasks and throw an exception and traceback
 
         # This should be in a try except
         logger.info("Deprovisioning Resources ...")
-        results = run_tasks(tasks)
+        try:
+            results = execute(tasks, self._settings)
+        finally:
+            self.flush()
+
         tasks_passed(
             results,
             logger,
@@ -479,35 +809,32 @@ class Stack(object):
             # Get the resource plugin and deserialize it with the dict
             classname = rsrc_dict['type']
 
-            resources = self._config.get_plugins(
-                category_name='Resource',
-                plugin_name=classname
+            resource = self._config.make_plugin(
+                'Resource',
+                classname,
+                provider=rsrc_dict['provider']
             )
 
-            if not resources:
+            if resource is None:
                 raise PluginError(
-                    'Failed to locate resource plugin named {}'
-                    .format(classname)
+                    'Failed to locate resource plugin named {} for provider {}'
+                    .format(classname, rsrc_dict['provider'].lower())
                 )
 
-            for resource in resources:
-                if resource.provider.lower() == rsrc_dict['provider'].lower():
-                    # Simply deserialize the stack
-                    resource.deserialize(rsrc_dict)
+            # Simply deserialize the stack
+            resource.deserialize(rsrc_dict)
 
-                    # Add stack tags to resource if they
-                    # aren't already there ie: this will add stack level
-                    # tags to resource that are being deserialized from a manifest.
-                    newtags = resource.tags
-                    newtags.update(self._tags)
-                    resource.tags = newtags
+            # Add stack tags to resource if they
+            # aren't already there ie: this will add stack level
+            # tags to resource that are being deserialized from a manifest.
+            newtags = resource.tags
+            newtags.update(self._tags)
+            resource.tags = newtags
 
-                    # Set the stack reference on the resource to our stack.
-                    resource.stack = self
+            # Set the stack reference on the resource to our stack.
+            resource.stack = self
 
-                    self._resources.append(resource)
-                else:
-                    raise PluginError(
-                        'Failed to locate resource named {} for provider {}'
-                        .format(classname, rsrc_dict['provider'].lower())
-                    )
+            self._resources.append(resource)
+            self._index(resource)
+            self._dependencies = {}
+            self._full_dump = True
@@ -2,6 +2,25 @@
 This file contains code for storing and accessing serialized
 stacks on Amazon's DynamoDB.
 
+Stacks are stored as items in the ``table_name`` table. So that ``search``
+doesn't need to scan every stack ever saved, an index item is written to
+the ``index_table_name`` table (default ``<table_name>_tags``) for each of
+the stack's ``indexed_tags``, with the hash key ``<tag>=<value>`` and the
+stack name as the range key. Searches which include an indexed tag query
+those items, while any other search falls back to a scan.
+
+Each stack item carries a ``version`` attribute which is incremented on
+every write. With the default ``write_mode`` of ``'blind'``, ``dump`` puts
+the whole item conditioned on the version the plugin last loaded or wrote,
+rather than reading the existing item first (unless the plugin hasn't
+loaded or written it yet), and raises a StackError if another writer has
+modified the stack in the meantime. The ``'read'``
+write mode reads and updates the existing item instead.
+
+Resources and any other dicts or lists are encoded with the ``codec``
+settings (see :mod:`shepherd.common.serialization`), which by default
+compress any value of 1KB or more with zlib.
+
 TODO:
 1) Improve documentation
 3) some unit tests
@@ -9,40 +28,152 @@ TODO:
 from __future__ import print_function
 
 import time
-import boto
-import json
 
 from attrdict import AttrDict
 from boto.dynamodb.condition import EQ
 from boto.dynamodb.exceptions import DynamoDBResponseError, DynamoDBKeyNotFoundError
+from boto.dynamodb.exceptions import DynamoDBConditionalCheckFailedError
 
+from shepherd.common.exceptions import ConfigError, StackError, StorageError
+from shepherd.common.serialization import get_codec, decode, DEFAULT_CODEC
 from shepherd.common.utils import get_logger
 from shepherd.common.plugins import Storage
 
 
+RESOURCE_PREFIX = 'resource.'
+
+# The attributes (along with each RESOURCE_PREFIX attribute) which hold
+# encoded dicts and lists, including those of stacks stored as unmarked
+# json before codecs were added.
+ENCODED_KEYS = ('resources', 'resource_names', 'settings')
 DEFAULT_SETTINGS = AttrDict({
     'table_name': 'stacks',
     'hash_key_name': 'global_name',
     'hash_key_proto_value': str,
     'read_units': 10,
     'write_units': 5,
+    'index_table_name': None,
+    'indexed_tags': ['stack_name', 'environment_name'],
+    'write_mode': 'blind',
+    'codec': {
+        'format': 'json',
+        'compression': 'zlib',
+        'threshold': 1024,
+    },
 })
+INDEX_HASH_KEY = 'tag'
+VERSION_KEY = 'version'
+WRITE_MODES = ('blind', 'read')
+
+# The most keys DynamoDB accepts in a single BatchGetItem and BatchWriteItem.
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+BATCH_RETRY_DELAY = 0.1
 
 
-def dynamize(stack):
+def dynamize(stack, codec=DEFAULT_CODEC):
+    """
+    Converts a stack dict into dynamodb item attributes.
+
+    Args:
+        stack (dict): the stack dict, which is modified in place.
+        codec (StackCodec, optional): encodes the resources and any
+            other dicts or lists.
+    """
     if 'tags' in stack:
         for key in stack['tags']:
             stack['tag_{}'.format(key)] = stack['tags'][key]
 
         del stack['tags']
 
+    # Each resource gets its own attribute, so that individual
+    # resources can be updated without rewriting the others. Anything
+    # other than serialized resources is stored as a single attribute.
+    if 'resources' in stack and all(
+        isinstance(resource, dict) for resource in stack['resources']
+    ):
+        names = []
+        for resource in stack['resources']:
+            names.append(resource['local_name'])
+            stack['{}{}'.format(RESOURCE_PREFIX, resource['local_name'])] = codec.encode(
+                dict(resource)
+            )
+
+        del stack['resources']
+
+        if 'resource_names' not in stack:
+            stack['resource_names'] = names
+
     for key in stack:
         if isinstance(stack[key], dict) or isinstance(stack[key], AttrDict):
-            stack[key] = json.dumps(dict(stack[key]))
+            stack[key] = codec.encode(dict(stack[key]))
             get_logger(stack).debug('dynamize - key=%s, value=%s\n', key, stack[key])
 
         elif isinstance(stack[key], list):
-            stack[key] = json.dumps(list(stack[key]))
+            stack[key] = codec.encode(list(stack[key]))
+
+
+def get_tags(item):
+    """
+    Returns the tags of a dynamized stack item.
+    """
+    return dict(
+        (key[4:], item[key]) for key in item if key.startswith('tag_')
+    )
+
+
+def get_index_keys(tags, indexed_tags):
+    """
+    Returns the index hash keys for the indexed tags in the tags dict.
+
+    Args:
+        tags (dict): the stack tags.
+        indexed_tags (list): the names of the indexed tags.
+
+    Returns:
+        list: of '<tag>=<value>' keys.
+    """
+    return [
+        '{}={}'.format(key, tags[key]) for key in indexed_tags if key in tags
+    ]
+
+
+def get_unprocessed_writes(tables, unprocessed):
+    """
+    Converts the (decoded) UnprocessedItems of a BatchWriteItem response
+    back into (table, 'put' or 'delete', item or key) writes.
+
+    Args:
+        tables (dict): the tables written to by name.
+        unprocessed (dict): the UnprocessedItems by table name.
+
+    Returns:
+        list: of the writes to retry.
+    """
+    writes = []
+    for name, requests in unprocessed.items():
+        table = tables[name]
+        hash_key_name = table.schema.hash_key_name
+        range_key_name = table.schema.range_key_name
+
+        for request in requests:
+            if 'PutRequest' in request:
+                attrs = request['PutRequest']['Item']
+                writes.append((table, 'put', table.new_item(
+                    hash_key=attrs[hash_key_name],
+                    range_key=attrs.get(range_key_name),
+                    attrs=attrs
+                )))
+            else:
+                key = request['DeleteRequest']['Key']
+                if 'RangeKeyElement' in key:
+                    key = (key['HashKeyElement'], key['RangeKeyElement'])
+                else:
+                    key = key['HashKeyElement']
+
+                writes.append((table, 'delete', key))
+
+    return writes
 
 
 def dedynamize(stack):
@@ -60,21 +191,57 @@ def dedynamize(stack):
     for key in to_delete:
         del stack[key]
 
+    # Only values written by a codec (or the json dicts and lists of older
+    # stacks) are decoded, rather than trying to parse every attribute.
     for key in stack:
-        try:
-            stack[key] = json.loads(stack[key])
-        except(TypeError, ValueError):
-            pass
+        stack[key] = decode(
+            stack[key],
+            legacy=key in ENCODED_KEYS or key.startswith(RESOURCE_PREFIX)
+        )
+
+    # Reassemble the resource list from the individual resource attributes
+    # (stacks dumped before resources were split only have 'resources').
+    if 'resource_names' in stack:
+        stack['resources'] = [
+            stack['{}{}'.format(RESOURCE_PREFIX, name)]
+            for name in stack['resource_names']
+        ]
+        del stack['resource_names']
+
+    for key in [key for key in stack if key.startswith(RESOURCE_PREFIX)]:
+        del stack[key]
 
 
 class DynamoStorage(Storage):
+    supports_delta = True
+
     def __init__(self):
         super(DynamoStorage, self).__init__()
         self._table = None
-        self._settings = DEFAULT_SETTINGS
+        self._index_table = None
+        self._settings = AttrDict(DEFAULT_SETTINGS)
+        self._codec = get_codec(self._settings.codec)
+
+        # The version and tags of each stack as last loaded or written.
+        self._stored = {}
 
     def configure(self, settings):
+        if settings.get('write_mode', self._settings.write_mode) not in WRITE_MODES:
+            raise ConfigError(
+                'Unknown write_mode {}, expected one of {}'
+                .format(settings['write_mode'], ', '.join(WRITE_MODES)),
+                logger=self._logger
+            )
+
         self._settings.update(settings)
+        self._codec = get_codec(self._settings.codec)
+
+    @property
+    def index_table_name(self):
+        return (
+            self._settings.index_table_name or
+            '{}_tags'.format(self._settings.table_name)
+        )
 
     def create_table(self):
         """
@@ -82,49 +249,185 @@ class DynamoStorage(Storage):
 
         TODO: Accept a configuration object for the table schema.
         """
-        self._logger.info('Creating dynamodb table %s', self._settings.table_name)
-        conn = boto.connect_dynamodb()
-
-        schema = conn.create_schema(
+        self._table = self._create_table(
+            self._settings.table_name,
             hash_key_name=self._settings.hash_key_name,
             hash_key_proto_value=self._settings.hash_key_proto_value
         )
 
-        table = conn.create_table(
-            name=self._settings.table_name,
-            schema=schema,
-            read_units=self._settings.read_units,
-            write_units=self._settings.write_units
+    def create_index_table(self):
+        """
+        Creates the dynamodb tag index table and waits for it to become active.
+        """
+        self._index_table = self._create_table(
+            self.index_table_name,
+            hash_key_name=INDEX_HASH_KEY,
+            hash_key_proto_value=str,
+            range_key_name=self._settings.hash_key_name,
+            range_key_proto_value=self._settings.hash_key_proto_value
         )
 
-        # Could probably use a retry decorator
-        while table.status != 'ACTIVE':
-            self._logger.debug(
-                'Waiting for table %s to become active',
-                self._settings.table_name
+    def _create_table(self, name, **kwargs):
+        self._logger.info('Creating dynamodb table %s', name)
+
+        with self.connections.connection('dynamodb') as conn:
+            schema = conn.create_schema(**kwargs)
+
+            table = conn.create_table(
+                name=name,
+                schema=schema,
+                read_units=self._settings.read_units,
+                write_units=self._settings.write_units
             )
-            table = conn.get_table(self._settings.table_name)
-            time.sleep(5)
 
-        self._table = table
+            # Could probably use a retry decorator
+            while table.status != 'ACTIVE':
+                self._logger.debug('Waiting for table %s to become active', name)
+                table = conn.get_table(name)
+                time.sleep(5)
+
+        return table
 
     def get_table(self):
         """
         Handles getting or creating the Dynamodb
         table.
         """
-        conn = boto.connect_dynamodb()
-
         if self._table is not None:
             return self._table
 
         try:
-            self._table = conn.get_table(self._settings.table_name)
+            with self.connections.connection('dynamodb') as conn:
+                self._table = conn.get_table(self._settings.table_name)
         except DynamoDBResponseError:
             self.create_table()
 
         return self._table
 
+    def get_index_table(self):
+        """
+        Handles getting or creating the Dynamodb tag index table.
+        """
+        if self._index_table is not None:
+            return self._index_table
+
+        try:
+            with self.connections.connection('dynamodb') as conn:
+                self._index_table = conn.get_table(self.index_table_name)
+        except DynamoDBResponseError:
+            self.create_index_table()
+
+        return self._index_table
+
+    def index(self, name, tags, stale=None):
+        """
+        Writes the index items for a stack's indexed tags.
+
+        Args:
+            name (str): the global_name of the stack.
+            tags (dict): the stack's tags.
+            stale (dict, optional): the previously stored tags of the stack,
+                whose index items are removed if they no longer apply.
+        """
+        self._batch_write(self._index_writes(name, tags, stale))
+
+    def _index_writes(self, name, tags, stale=None):
+        """
+        Returns the batch writes which update the index items of a stack.
+        """
+        keys = get_index_keys(tags, self._settings.indexed_tags)
+        old_keys = get_index_keys(stale or {}, self._settings.indexed_tags)
+
+        if not keys and not old_keys:
+            return []
+
+        table = self.get_index_table()
+        writes = [
+            (table, 'delete', (key, name))
+            for key in old_keys if key not in keys
+        ]
+        writes.extend(
+            (table, 'put', table.new_item(hash_key=key, range_key=name))
+            for key in keys if key not in old_keys
+        )
+
+        return writes
+
+    def _batch_get(self, names):
+        """
+        Reads the raw stack items with the given names, BATCH_GET_SIZE at
+        a time, retrying any keys dynamodb didn't process.
+
+        Returns:
+            dict: of the found items by name.
+        """
+        items = {}
+        table = self.get_table()
+        remaining = list(set(names))
+
+        with self.connections.connection('dynamodb') as conn:
+            while remaining:
+                keys = remaining[:BATCH_GET_SIZE]
+                remaining = remaining[BATCH_GET_SIZE:]
+
+                batch_list = conn.new_batch_list()
+                batch_list.add_batch(table, keys=keys)
+                response = conn.batch_get_item(batch_list)
+
+                for item in response.get('Responses', {}).get(table.name, {}).get('Items', []):
+                    items[item[self._settings.hash_key_name]] = item
+
+                unprocessed = response.get('UnprocessedKeys') or {}
+                if unprocessed:
+                    remaining.extend(
+                        key['HashKeyElement']
+                        for key in unprocessed.get(table.name, {}).get('Keys', [])
+                    )
+                    time.sleep(BATCH_RETRY_DELAY)
+
+        return items
+
+    def _batch_write(self, writes):
+        """
+        Runs the (table, 'put' or 'delete', item or key) writes,
+        BATCH_WRITE_SIZE at a time, retrying any dynamodb didn't process.
+        """
+        tables = dict((table.name, table) for table, _, _ in writes)
+
+        with self.connections.connection('dynamodb') as conn:
+            while writes:
+                batch = writes[:BATCH_WRITE_SIZE]
+                writes = writes[BATCH_WRITE_SIZE:]
+
+                requests = {}
+                for table, action, value in batch:
+                    puts, deletes = requests.setdefault(table.name, ([], []))
+                    (puts if action == 'put' else deletes).append(value)
+
+                batch_list = conn.new_batch_write_list()
+                for name, (puts, deletes) in requests.items():
+                    batch_list.add_batch(tables[name], puts=puts, deletes=deletes)
+
+                response = conn.batch_write_item(batch_list)
+
+                unprocessed = response.get('UnprocessedItems') or {}
+                if unprocessed:
+                    writes.extend(get_unprocessed_writes(tables, unprocessed))
+                    time.sleep(BATCH_RETRY_DELAY)
+
+    def reindex(self):
+        """
+        Rebuilds the index items of every stored stack, which is only needed
+        for stacks saved before their tags were indexed.
+        """
+        table = self.get_table()
+
+        with self.connections.connection('dynamodb') as conn:
+            items = list(conn.scan(table))
+
+        for item in items:
+            self.index(item[self._settings.hash_key_name], get_tags(item))
+
     def search(self, tags):
         """
         Given a dict of tags.
@@ -133,9 +436,14 @@ class DynamoStorage(Storage):
         that match to those tags. Returning a list of
         the stack names that match.
 
-        NOTE: Run O(n) time, so you should try and
-        archive old/unused stacks whenever possible.
+        NOTE: Unless one of the tags is indexed this runs in O(n) time,
+        so you should try and archive old/unused stacks whenever possible.
         """
+        keys = get_index_keys(tags, self._settings.indexed_tags)
+
+        if keys:
+            return self._search_index(keys, tags)
+
         stacks = []
 
         table = self.get_table()
@@ -143,15 +451,45 @@ class DynamoStorage(Storage):
         for key, value in tags.items():
             scan_filter['tag_{}'.format(key)] = EQ(value)
 
-        results = table.scan(scan_filter=scan_filter)
+        with self.connections.connection('dynamodb') as conn:
+            results = list(conn.scan(table, scan_filter=scan_filter))
 
-        for result in results:
-            stack = result
+        for stack in results:
+            name = stack[self._settings.hash_key_name]
+            self._stored[name] = (stack.pop(VERSION_KEY, None), get_tags(stack))
             dedynamize(stack)
             stacks.append(stack)
 
         return stacks
 
+    def _search_index(self, keys, tags):
+        """
+        Looks up the stacks with all the indexed tag keys and returns
+        those which match the remaining tags.
+        """
+        names = None
+        index_table = self.get_index_table()
+
+        with self.connections.connection('dynamodb') as conn:
+            for key in keys:
+                found = set(
+                    item[self._settings.hash_key_name]
+                    for item in conn.query(index_table, key)
+                )
+                names = found if names is None else names & found
+
+                if not names:
+                    return []
+
+        # Index items are only removed when a stack is deleted or
+        # re-dumped, so skip any which are out of date.
+        return [
+            stack for stack in self.load_many(sorted(names))
+            if stack is not None and all(
+                stack['tags'].get(key) == value for key, value in tags.items()
+            )
+        ]
+
     def load(self, name):
         """
         Given a unique name.
@@ -163,53 +501,338 @@ class DynamoStorage(Storage):
         table = self.get_table()
 
         try:
-            stack = table.get_item(name)
+            with self.connections.connection('dynamodb') as conn:
+                stack = conn.get_item(table, name)
+
+            self._stored[name] = (stack.pop(VERSION_KEY, None), get_tags(stack))
             dedynamize(stack)
         except DynamoDBKeyNotFoundError:
             self._logger.warn('Could not find stack %s', name)
 
         return stack
 
+    def load_many(self, names):
+        """
+        Loads the stacks with the given names using BatchGetItem.
+
+        Returns:
+            list: of the stack dicts in the same order as the names, with
+                None for any stacks that couldn't be found.
+        """
+        items = self._batch_get(names)
+        stacks = []
+
+        for name in names:
+            stack = None
+
+            if name in items:
+                stack = dict(items[name])
+                self._stored[name] = (stack.pop(VERSION_KEY, None), get_tags(stack))
+                dedynamize(stack)
+            else:
+                self._logger.warn('Could not find stack %s', name)
+
+            stacks.append(stack)
+
+        return stacks
+
     def dump(self, stack):
         """
         Takes a stack dict and stores it
         in the datastore of your choice.
+
+        Raises:
+            StackError: if the stack was modified by another writer since
+                it was last loaded or dumped (only in the 'blind' write_mode).
         """
         # Copy the stack dict cause we are going to mutate it
         # before inserting into dynamo
         entry = stack.copy()
-        item = None
-        conn = boto.connect_dynamodb()
         table = self.get_table()
-        dynamize(entry)
+        dynamize(entry, self._codec)
+        name = entry[self._settings.hash_key_name]
 
-        try:
-            item = conn.get_item(table, entry[self._settings.hash_key_name])
+        if self._settings.write_mode == 'read':
+            version, stale = self._dump_read(table, entry)
+        else:
+            version, stale = self._dump_blind(table, entry)
+
+        tags = get_tags(entry)
+        self._stored[name] = (version, tags)
+        self.index(name, tags, stale)
+
+    def _dump_blind(self, table, entry):
+        """
+        Puts the whole item conditioned on its version being unchanged
+        since it was last loaded or dumped, without reading it first.
+        If this store hasn't loaded or dumped the stack, its current
+        version and tags are read first.
+        """
+        name = entry[self._settings.hash_key_name]
+
+        with self.connections.connection('dynamodb') as conn:
+            if name in self._stored:
+                version, stale = self._stored[name]
+            else:
+                version, stale = self._read_version(conn, table, name)
+
+            try:
+                self._put_checked(conn, table, entry, version)
+            except DynamoDBConditionalCheckFailedError:
+                self._stored.pop(name, None)
+                raise StackError(
+                    'Stack {} was modified since it was last loaded or saved'
+                    .format(name),
+                    logger=self._logger
+                )
+
+        return entry[VERSION_KEY], stale
+
+    def _put_checked(self, conn, table, entry, version):
+        """
+        Puts the entry as the next version, conditioned on the stored item
+        still being at the given version.
+
+        Raises:
+            DynamoDBConditionalCheckFailedError: if the stored version differs.
+        """
+        entry[VERSION_KEY] = (version or 0) + 1
 
-            for key in entry:
-                item[key] = entry[key]
+        # A stack which didn't exist (or predates versioning)
+        # must not have gained a version since.
+        expected = {VERSION_KEY: version if version is not None else False}
+        item = table.new_item(hash_key=entry[self._settings.hash_key_name], attrs=entry)
+
+        self._logger.debug(
+            'Putting entry %s version %s', entry[self._settings.hash_key_name], entry[VERSION_KEY]
+        )
+        conn.put_item(item, expected_value=expected)
+
+    def _read_version(self, conn, table, name):
+        """
+        Returns the version and tags of the stored stack item, or
+        (None, None) if it doesn't exist.
+        """
+        try:
+            item = conn.get_item(table, name)
         except DynamoDBKeyNotFoundError:
-            self._logger.info(
-                'Stack %s not found. Creating new stack entry.',
-                entry[self._settings.hash_key_name]
-            )
-            item = table.new_item(
-                hash_key=entry[self._settings.hash_key_name],
-                attrs=entry
-            )
+            return None, None
 
-        if item is not None:
-            self._logger.debug('Inserting new entry %s', entry[self._settings.hash_key_name])
+        return item.get(VERSION_KEY), get_tags(item)
+
+    def _dump_read(self, table, entry):
+        """
+        Reads the existing item and updates its attributes.
+        """
+        item = None
+        stale = None
+        name = entry[self._settings.hash_key_name]
+
+        with self.connections.connection('dynamodb') as conn:
+            try:
+                item = conn.get_item(table, name)
+                stale = get_tags(item)
+
+                for key in entry:
+                    item[key] = entry[key]
+            except DynamoDBKeyNotFoundError:
+                self._logger.info(
+                    'Stack %s not found. Creating new stack entry.', name
+                )
+                item = table.new_item(hash_key=name, attrs=entry)
+
+            item[VERSION_KEY] = item.get(VERSION_KEY, 0) + 1
+            self._logger.debug('Inserting new entry %s', name)
             conn.put_item(item)
 
+        return item[VERSION_KEY], stale
+
+    def dump_many(self, stacks):
+        """
+        Dumps the stacks, writing their index items using BatchWriteItem.
+
+        DynamoDB doesn't support conditional batch writes, so in the 'blind'
+        write_mode each stack item is still put conditioned on its version
+        (the versions of stacks this store hasn't loaded or dumped are read
+        with a single BatchGetItem). In the 'read' write_mode, which doesn't
+        check versions, the stack items are batch written as well.
+
+        Raises:
+            StackError: if any of the stacks were modified by another writer
+                since they were last loaded or dumped (only in the 'blind'
+                write_mode). The other stacks are still dumped.
+        """
+        table = self.get_table()
+        entries = []
+
+        for stack in stacks:
+            entry = stack.copy()
+            dynamize(entry, self._codec)
+            entries.append(entry)
+
+        names = [entry[self._settings.hash_key_name] for entry in entries]
+
+        if self._settings.write_mode == 'read':
+            writes, stored, modified = self._dump_many_read(table, names, entries)
+        else:
+            writes, stored, modified = self._dump_many_blind(table, names, entries)
+
+        for name in stored:
+            writes.extend(self._index_writes(name, stored[name][1], self._stored[name][1]))
+
+        self._logger.debug('Batch writing %s items for %s stacks', len(writes), len(stored))
+        self._batch_write(writes)
+        self._stored.update(stored)
+
+        if modified:
+            raise StackError(
+                'Stacks {} were modified since they were last loaded or saved'
+                .format(', '.join(modified)),
+                logger=self._logger
+            )
+
+    def _dump_many_read(self, table, names, entries):
+        """
+        Reads the existing items and batch writes their updated attributes.
+        """
+        existing = self._batch_get(names)
+        writes = []
+        stored = {}
+
+        for name, entry in zip(names, entries):
+            version, tags = None, None
+
+            if name in existing:
+                item = dict(existing[name])
+                version, tags = item.get(VERSION_KEY), get_tags(item)
+                item.update(entry)
+                entry = item
+
+            # The index items to remove are looked up from the stored tags
+            self._stored[name] = (version, tags)
+            entry[VERSION_KEY] = (version or 0) + 1
+            stored[name] = (entry[VERSION_KEY], get_tags(entry))
+            writes.append((table, 'put', table.new_item(hash_key=name, attrs=entry)))
+
+        return writes, stored, []
+
+    def _dump_many_blind(self, table, names, entries):
+        """
+        Puts each entry conditioned on its version, reading the versions
+        of the stacks this store hasn't seen in one batch.
+        """
+        existing = self._batch_get([name for name in names if name not in self._stored])
+        stored = {}
+        modified = []
+
+        for name in names:
+            if name not in self._stored:
+                item = existing.get(name)
+                self._stored[name] = (
+                    (None, None) if item is None else (item.get(VERSION_KEY), get_tags(item))
+                )
+
+        with self.connections.connection('dynamodb') as conn:
+            for name, entry in zip(names, entries):
+                try:
+                    self._put_checked(conn, table, entry, self._stored[name][0])
+                    stored[name] = (entry[VERSION_KEY], get_tags(entry))
+                except DynamoDBConditionalCheckFailedError:
+                    self._stored.pop(name, None)
+                    modified.append(name)
+
+        return [], stored, modified
+
+    def dump_delta(self, delta):
+        """
+        Updates only the changed resource attributes (and the resource
+        order) of an existing stack item, conditioned on its version being
+        unchanged since it was last loaded or dumped. If this store hasn't
+        loaded or dumped the stack, its current version is read first.
+
+        Raises:
+            StorageError: if the stack item doesn't exist.
+            StackError: if the stack was modified by another writer.
+        """
+        entry = delta.copy()
+        table = self.get_table()
+        dynamize(entry, self._codec)
+        name = entry.pop(self._settings.hash_key_name)
+
+        item = table.new_item(hash_key=name)
+        for key, value in entry.items():
+            item.put_attribute(key, value)
+
+        item.add_attribute(VERSION_KEY, 1)
+
+        with self.connections.connection('dynamodb') as conn:
+            if name in self._stored:
+                version, tags = self._stored[name]
+            else:
+                try:
+                    stored = conn.get_item(table, name)
+                except DynamoDBKeyNotFoundError:
+                    raise StorageError(
+                        'Cannot update stack {} which has not been dumped'.format(name),
+                        logger=self._logger
+                    )
+
+                version, tags = stored.get(VERSION_KEY), get_tags(stored)
+
+            # Like a dump, a stack which predates versioning must not
+            # have gained a version since.
+            expected = {VERSION_KEY: version if version is not None else False}
+
+            self._logger.debug('Updating %s attributes of %s', len(entry), name)
+            try:
+                response = conn.update_item(
+                    item, expected_value=expected, return_values='UPDATED_NEW'
+                )
+            except DynamoDBConditionalCheckFailedError:
+                self._stored.pop(name, None)
+                raise StackError(
+                    'Stack {} was modified since it was last loaded or saved'
+                    .format(name),
+                    logger=self._logger
+                )
+
+        version = response.get('Attributes', {}).get(VERSION_KEY)
+        self._stored[name] = (version, tags)
+
     def delete(self, name):
         item = None
         table = self.get_table()
 
-        try:
-            # attempt an update
-            item = table.get_item(name)
-            table.delete_item(item)
+        with self.connections.connection('dynamodb') as conn:
+            try:
+                # attempt an update
+                item = conn.get_item(table, name)
+                conn.delete_item(item)
 
-        except DynamoDBKeyNotFoundError:
-            self._logger.warn('No stack named %s exists to delete.', name)
+            except DynamoDBKeyNotFoundError:
+                self._logger.warn('No stack named %s exists to delete.', name)
+
+        self._stored.pop(name, None)
+
+        if item is not None:
+            self.index(name, {}, get_tags(item))
+
+    def delete_many(self, names):
+        """
+        Deletes the stacks and their index items using BatchWriteItem.
+        """
+        table = self.get_table()
+        items = self._batch_get(names)
+        writes = []
+
+        for name in names:
+            self._stored.pop(name, None)
+
+            if name not in items:
+                self._logger.warn('No stack named %s exists to delete.', name)
+                continue
+
+            writes.append((table, 'delete', name))
+            writes.extend(self._index_writes(name, {}, get_tags(items.pop(name))))
+
+        self._batch_write(writes)
@@ -0,0 +1,364 @@
+"""
+This file contains code for storing and accessing serialized
+stacks as json documents in a local directory.
+
+Each stack is written to its own ``<global_name>.json`` file in the
+``stacks`` subdirectory of the ``path`` directory (default
+``~/.shepherd/stacks``). Files are written to a temporary file first and
+renamed over the old document, so readers never see a partially written
+stack. The tags of every stack are kept in an ``index.json`` file in
+``path``, so ``search`` only opens the files of the stacks which match.
+Keeping the documents in their own directory means no stack name can
+collide with the index or lock files.
+
+Writes are serialized between threads with a lock and between processes
+with an exclusive ``flock`` on the ``.lock`` file in the directory (where
+fcntl is available).
+
+Stack documents are plain json unless ``codec`` settings are given (see
+:mod:`shepherd.common.serialization`), ie: to compress them.
+
+NOTE: a file can't be partially updated, so ``dump_delta`` still reads
+and rewrites the whole stack document. It only saves the stack from
+serializing its unchanged resources.
+"""
+from __future__ import print_function
+
+import os
+import json
+import errno
+import tempfile
+import threading
+
+from contextlib import contextmanager
+
+from attrdict import AttrDict
+
+from shepherd.common.exceptions import ConfigError, StorageError
+from shepherd.common.plugins import Storage
+from shepherd.common.serialization import get_codec, decode, is_encoded
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = '.lock'
+STACKS_DIR = 'stacks'
+STACK_EXT = '.json'
+DEFAULT_SETTINGS = AttrDict({
+    'path': os.path.join('~', '.shepherd', 'stacks'),
+    'codec': None,
+})
+
+
+def write_atomic(filename, data):
+    """
+    Writes the data to a temporary file in the same directory and renames
+    it over the filename.
+
+    Args:
+        filename (str): the file to write.
+        data (str): the contents to write.
+    """
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(filename), prefix='.', suffix='.tmp'
+    )
+
+    try:
+        with os.fdopen(fd, 'w') as fobj:
+            fobj.write(data)
+            fobj.flush()
+            os.fsync(fobj.fileno())
+
+        # os.replace also overwrites existing files on windows
+        getattr(os, 'replace', os.rename)(tmp, filename)
+    except:
+        os.remove(tmp)
+        raise
+
+
+def get_stat(filename):
+    """
+    Returns the inode, mtime and size of the file, which change
+    whenever it's replaced.
+    """
+    stat = os.stat(filename)
+    return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+
+class FileStorage(Storage):
+    supports_delta = True
+
+    def __init__(self):
+        super(FileStorage, self).__init__()
+        self._settings = AttrDict(DEFAULT_SETTINGS)
+        self._codec = None
+        self._lock = threading.RLock()
+
+        # The parsed index and the stat of the index file it was read from.
+        self._index = None
+        self._index_stat = None
+
+    def configure(self, settings):
+        self._settings.update(settings)
+        self._codec = get_codec(self._settings.codec) if self._settings.codec else None
+        self._index = None
+        self._index_stat = None
+
+    @property
+    def path(self):
+        return os.path.abspath(os.path.expanduser(self._settings.path))
+
+    def get_filename(self, name):
+        """
+        Returns the path of the document for the stack name.
+        """
+        return os.path.join(self.path, STACKS_DIR, quote(name, safe='') + STACK_EXT)
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the storage lock, for writing to the directory, in this
+        thread and (where supported) process.
+        """
+        with self._lock:
+            path = self.path
+
+            try:
+                os.makedirs(os.path.join(path, STACKS_DIR))
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+            with open(os.path.join(path, LOCK_FILE), 'a') as fobj:
+                if fcntl is not None:
+                    fcntl.flock(fobj.fileno(), fcntl.LOCK_EX)
+
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(fobj.fileno(), fcntl.LOCK_UN)
+
+    def get_index(self):
+        """
+        Returns the stack tags by name, rereading the index file only
+        if it has changed since it was last read.
+        """
+        filename = os.path.join(self.path, INDEX_FILE)
+
+        with self._lock:
+            try:
+                stat = get_stat(filename)
+            except OSError:
+                return {}
+
+            if self._index is None or self._index_stat != stat:
+                with open(filename) as fobj:
+                    self._index = json.load(fobj)
+
+                self._index_stat = stat
+
+            return self._index
+
+    def _update_index(self, tags=None, removed=()):
+        """
+        Writes the index with the tags of the updated stacks and without
+        the removed ones. Must be called while holding the lock.
+        """
+        index = dict(self.get_index())
+        index.update(tags or {})
+
+        for name in removed:
+            index.pop(name, None)
+
+        self._write_index(index)
+
+    def _write_index(self, index):
+        filename = os.path.join(self.path, INDEX_FILE)
+        write_atomic(filename, json.dumps(index, separators=(',', ':')))
+
+        self._index = index
+        self._index_stat = get_stat(filename)
+
+    def reindex(self):
+        """
+        Rebuilds the index from the stack documents in the directory,
+        skipping any which can't be decoded.
+        """
+        with self.locked():
+            index = {}
+            stacks_dir = os.path.join(self.path, STACKS_DIR)
+
+            for filename in os.listdir(stacks_dir):
+                if filename.endswith(STACK_EXT):
+                    try:
+                        stack = self._read(os.path.join(stacks_dir, filename))
+                    except StorageError:
+                        self._logger.warn('Skipping undecodable stack document %s', filename)
+                        continue
+
+                    if stack is not None:
+                        index[stack['global_name']] = stack.get('tags', {})
+
+            self._write_index(index)
+
+    def search(self, tags):
+        """
+        Given a dict of tags.
+
+        Search the index for the stacks that match those tags and
+        returns the list of matching stacks.
+        """
+        stacks = []
+        index = self.get_index()
+
+        for name in sorted(index):
+            if all(index[name].get(key) == value for key, value in tags.items()):
+                stack = self.load(name)
+                if stack is not None:
+                    stacks.append(stack)
+
+        return stacks
+
+    def _read(self, filename):
+        """
+        Returns the stack in the document, or None if it doesn't exist.
+
+        Raises:
+            StorageError: if the document can't be decoded.
+        """
+        try:
+            with open(filename) as fobj:
+                data = fobj.read()
+        except IOError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+
+            return None
+
+        try:
+            # Documents written without a codec are plain json
+            stack = decode(data) if is_encoded(data) else json.loads(data)
+        except ConfigError:
+            raise
+        except Exception as exc:
+            raise StorageError(
+                'Failed to decode the stack document {}'.format(filename),
+                error=exc,
+                logger=self._logger
+            )
+
+        if not isinstance(stack, dict):
+            raise StorageError(
+                'The stack document {} is not a json object'.format(filename),
+                logger=self._logger
+            )
+
+        return stack
+
+    def _write(self, stack):
+        if self._codec is None:
+            data = json.dumps(stack, separators=(',', ':'))
+        else:
+            data = self._codec.encode(stack)
+
+        write_atomic(self.get_filename(stack['global_name']), data)
+
+    def load(self, name):
+        """
+        Given a unique name.
+
+        Reads the document of the stack with that name.
+        Returns a single stack dict or None if it doesn't exist.
+        """
+        stack = self._read(self.get_filename(name))
+
+        if stack is None:
+            self._logger.warn('Could not find stack %s', name)
+
+        return stack
+
+    def dump(self, stack):
+        """
+        Writes the stack document and updates its tags in the index.
+        """
+        self.dump_many([stack])
+
+    def dump_many(self, stacks):
+        """
+        Writes the stack documents and updates the index once.
+        """
+        with self.locked():
+            tags = {}
+            for stack in stacks:
+                self._logger.debug('Writing stack %s', stack['global_name'])
+                self._write(stack)
+                tags[stack['global_name']] = stack.get('tags', {})
+
+            if any(self.get_index().get(name) != value for name, value in tags.items()):
+                self._update_index(tags)
+
+    def dump_delta(self, delta):
+        """
+        Replaces the changed resources (and the resource order) in the
+        stack document, rewriting the whole document.
+
+        Raises:
+            StorageError: if the stack document doesn't exist or can't be
+                decoded, in which case the whole stack should be dumped.
+        """
+        name = delta['global_name']
+        changed = dict(
+            (resource['local_name'], resource) for resource in delta['resources']
+        )
+
+        with self.locked():
+            stack = self._read(self.get_filename(name))
+
+            if stack is None:
+                raise StorageError(
+                    'Cannot update stack {} which has not been dumped'.format(name),
+                    logger=self._logger
+                )
+
+            existing = dict(
+                (resource['local_name'], resource)
+                for resource in stack.get('resources', [])
+            )
+            existing.update(changed)
+
+            stack['resources'] = [
+                existing[local_name] for local_name in delta['resource_names']
+                if local_name in existing
+            ]
+
+            self._logger.debug('Updating %s resources of %s', len(changed), name)
+            self._write(stack)
+
+    def delete(self, name):
+        self.delete_many([name])
+
+    def delete_many(self, names):
+        """
+        Removes the stack documents and updates the index once.
+        """
+        with self.locked():
+            for name in names:
+                try:
+                    os.remove(self.get_filename(name))
+                except OSError as exc:
+                    if exc.errno != errno.ENOENT:
+                        raise
+
+                    self._logger.warn('No stack named %s exists to delete.', name)
+
+            self._update_index(removed=names)
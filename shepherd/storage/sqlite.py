@@ -0,0 +1,328 @@
+"""
+This file contains code for storing and accessing serialized
+stacks in a local SQLite database.
+
+Stacks are normalized into three tables:
+
+1. ``stacks``: the stack attributes (other than its tags and resources)
+   and the ordered names of its resources.
+2. ``tags``: one row per stack tag, indexed by tag name and value so
+   ``search`` doesn't read every stack.
+3. ``resources``: one row per serialized resource, so ``dump_delta``
+   only replaces the rows of the resources which changed.
+
+The database (``path``, default ``~/.shepherd/stacks.db``) is opened in WAL
+mode so other processes' readers don't block on writers. Each plugin holds
+a single connection, opened (and its tables created) when it's configured,
+which threads take turns using. The stack attributes and resources are stored as plain json
+unless ``codec`` settings are given (see :mod:`shepherd.common.serialization`).
+"""
+from __future__ import print_function
+
+import os
+import json
+import errno
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from attrdict import AttrDict
+
+from shepherd.common.exceptions import StorageError
+from shepherd.common.plugins import Storage
+from shepherd.common.serialization import get_codec, decode
+
+
+DEFAULT_SETTINGS = AttrDict({
+    'path': os.path.join('~', '.shepherd', 'stacks.db'),
+    'timeout': 30,
+    'codec': None,
+})
+
+# Stays well under SQLite's default limit of 999 parameters per statement.
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stacks (
+    global_name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    resource_names TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    global_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (global_name, name)
+);
+CREATE INDEX IF NOT EXISTS tags_name_value ON tags (name, value, global_name);
+CREATE TABLE IF NOT EXISTS resources (
+    global_name TEXT NOT NULL,
+    local_name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (global_name, local_name)
+);
+"""
+
+
+def encode(value):
+    return json.dumps(value, separators=(',', ':'), sort_keys=True)
+
+
+def chunks(values, size=BATCH_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class SqliteStorage(Storage):
+    supports_delta = True
+
+    def __init__(self):
+        super(SqliteStorage, self).__init__()
+        self._settings = AttrDict(DEFAULT_SETTINGS)
+        self._codec = None
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def configure(self, settings):
+        """
+        Applies the settings and (re)opens the connection to the database,
+        creating its tables if need be.
+        """
+        self._settings.update(settings)
+        self._codec = get_codec(self._settings.codec) if self._settings.codec else None
+
+        with self._lock:
+            self.close()
+            self._conn = self._connect()
+
+    @property
+    def path(self):
+        if self._settings.path == ':memory:':
+            return self._settings.path
+
+        return os.path.abspath(os.path.expanduser(self._settings.path))
+
+    def _connect(self):
+        path = self.path
+
+        if path != ':memory:':
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+        self._logger.debug('Connecting to sqlite database %s', path)
+        conn = sqlite3.connect(path, timeout=self._settings.timeout, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Holds the connection to the database for the calling thread,
+        connecting with the default settings if the plugin wasn't configured.
+        """
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+
+            yield self._conn
+
+    def close(self):
+        """
+        Closes the connection to the database. It's reopened if the
+        plugin is used again.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _encode(self, value):
+        """
+        Encodes a stack or resource dict with the codec, or as plain json
+        if none is configured.
+        """
+        if self._codec is None:
+            return encode(value)
+
+        return self._codec.encode(value)
+
+    def search(self, tags):
+        """
+        Given a dict of tags.
+
+        Looks up the stacks with all of those tags in the tags table
+        and returns the list of matching stacks.
+        """
+        if tags:
+            query = ' INTERSECT '.join(
+                ['SELECT global_name FROM tags WHERE name = ? AND value = ?'] * len(tags)
+            )
+            params = []
+            for key, value in tags.items():
+                params.extend([key, encode(value)])
+        else:
+            query, params = 'SELECT global_name FROM stacks', []
+
+        with self.connection() as conn:
+            names = sorted(row[0] for row in conn.execute(query, params))
+
+        return [stack for stack in self.load_many(names) if stack is not None]
+
+    def load(self, name):
+        """
+        Given a unique name.
+
+        Reads the stack with that name from the database.
+        Returns a single stack dict or None if it doesn't exist.
+        """
+        return self.load_many([name])[0]
+
+    def load_many(self, names):
+        """
+        Reads the stacks, their tags and resources BATCH_SIZE stacks
+        per query.
+        """
+        stacks = {}
+        resources = {}
+
+        with self.connection() as conn:
+            for batch in chunks(list(set(names))):
+                params = ','.join('?' * len(batch))
+
+                for name, data, resource_names in conn.execute(
+                    'SELECT global_name, data, resource_names FROM stacks '
+                    'WHERE global_name IN ({})'.format(params), batch
+                ):
+                    # Rows written without a codec are plain json
+                    stack = decode(data, legacy=True)
+                    stack['global_name'] = name
+                    stack['tags'] = {}
+                    stack['resources'] = json.loads(resource_names)
+                    stacks[name] = stack
+                    resources[name] = {}
+
+                for name, key, value in conn.execute(
+                    'SELECT global_name, name, value FROM tags '
+                    'WHERE global_name IN ({})'.format(params), batch
+                ):
+                    if name in stacks:
+                        stacks[name]['tags'][key] = json.loads(value)
+
+                for name, local_name, data in conn.execute(
+                    'SELECT global_name, local_name, data FROM resources '
+                    'WHERE global_name IN ({})'.format(params), batch
+                ):
+                    if name in resources:
+                        resources[name][local_name] = decode(data, legacy=True)
+
+        result = []
+        for name in names:
+            stack = stacks.get(name)
+
+            if stack is None:
+                self._logger.warn('Could not find stack %s', name)
+            else:
+                # Replace the resource names with the resources, copying
+                # the stack in case the same name was requested twice.
+                stack = dict(stack)
+                stack['resources'] = [
+                    resources[name][local_name] for local_name in stack['resources']
+                    if local_name in resources[name]
+                ]
+
+            result.append(stack)
+
+        return result
+
+    def dump(self, stack):
+        """
+        Replaces the stack, its tags and resources in a single transaction.
+        """
+        self.dump_many([stack])
+
+    def dump_many(self, stacks):
+        """
+        Replaces the stacks, their tags and resources in a single transaction.
+        """
+        # Entering the connection itself wraps the writes in a transaction
+        with self.connection() as conn, conn:
+            for stack in stacks:
+                name = stack['global_name']
+                resources = stack.get('resources', [])
+                data = dict(
+                    (key, value) for key, value in stack.items()
+                    if key not in ('global_name', 'tags', 'resources')
+                )
+
+                self._logger.debug('Writing stack %s', name)
+                conn.execute(
+                    'INSERT OR REPLACE INTO stacks (global_name, data, resource_names) '
+                    'VALUES (?, ?, ?)',
+                    (name, self._encode(data), encode([r['local_name'] for r in resources]))
+                )
+
+                conn.execute('DELETE FROM tags WHERE global_name = ?', (name,))
+                conn.executemany(
+                    'INSERT INTO tags (global_name, name, value) VALUES (?, ?, ?)',
+                    [(name, key, encode(value)) for key, value in stack.get('tags', {}).items()]
+                )
+
+                conn.execute('DELETE FROM resources WHERE global_name = ?', (name,))
+                conn.executemany(
+                    'INSERT INTO resources (global_name, local_name, data) VALUES (?, ?, ?)',
+                    [(name, r['local_name'], self._encode(dict(r))) for r in resources]
+                )
+
+    def dump_delta(self, delta):
+        """
+        Upserts the rows of the changed resources and updates the
+        resource order of the stack. Rows of removed resources are
+        ignored when loading and cleared by the next full dump.
+
+        Raises:
+            StorageError: if the stack doesn't exist, in which case the
+                whole stack should be dumped.
+        """
+        name = delta['global_name']
+
+        with self.connection() as conn, conn:
+            self._logger.debug('Updating %s resources of %s', len(delta['resources']), name)
+            cursor = conn.execute(
+                'UPDATE stacks SET resource_names = ? WHERE global_name = ?',
+                (encode(list(delta['resource_names'])), name)
+            )
+            if not cursor.rowcount:
+                raise StorageError(
+                    'Cannot update stack {} which has not been dumped'.format(name),
+                    logger=self._logger
+                )
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO resources (global_name, local_name, data) '
+                'VALUES (?, ?, ?)',
+                [(name, r['local_name'], self._encode(dict(r))) for r in delta['resources']]
+            )
+
+    def delete(self, name):
+        self.delete_many([name])
+
+    def delete_many(self, names):
+        """
+        Deletes the stacks, their tags and resources in a single transaction.
+        """
+        params = [(name,) for name in names]
+
+        with self.connection() as conn, conn:
+            for name in names:
+                cursor = conn.execute('DELETE FROM stacks WHERE global_name = ?', (name,))
+                if not cursor.rowcount:
+                    self._logger.warn('No stack named %s exists to delete.', name)
+
+            conn.executemany('DELETE FROM tags WHERE global_name = ?', params)
+            conn.executemany('DELETE FROM resources WHERE global_name = ?', params)
@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from shepherd.config import Config, REGISTRY, _BUILTIN_PATHS
+
+
+class TestConfig(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_plugin_cache(self):
+        Config.make(name='test_cache_config')
+        stats = REGISTRY.stats
+
+        config = Config.make(name='test_cache_config')
+        self.assertEqual(REGISTRY.stats['hits'], stats['hits'] + 1)
+        self.assertEqual(REGISTRY.stats['misses'], stats['misses'])
+        self.assertIsNotNone(config.startup_time)
+        self.assertEqual(len(config.get_plugins('Storage', 'DynamoStorage')), 1)
+
+    def test_extension_paths(self):
+        # Extension paths shouldn't leak into the builtin paths.
+        builtin_paths = list(_BUILTIN_PATHS)
+        config = Config(
+            {'verbosity': 0, 'extension_paths': [self.tmpdir]},
+            'test_extension_config'
+        )
+        self.assertEqual(_BUILTIN_PATHS, builtin_paths)
+        self.assertIn(self.tmpdir, config._paths)
+
+    def test_plugin_index(self):
+        index_path = os.path.join(self.tmpdir, 'index.json')
+        REGISTRY.clear()
+        config = Config(
+            {'verbosity': 0, 'plugin_index': index_path},
+            'test_index_config'
+        )
+
+        with open(index_path) as fobj:
+            index = json.load(fobj)
+
+        names = set(entry[1] for entry in index.values())
+        self.assertIn('Instance', names)
+        self.assertIn('DynamoStorage', names)
+        self.assertEqual(len(config.get_plugins('Resource', 'Instance')), 1)
+
+        # A cold start with the index should find the same plugins.
+        REGISTRY.clear()
+        config = Config(
+            {'verbosity': 0, 'plugin_index': index_path},
+            'test_index_config'
+        )
+        self.assertEqual(len(config.get_plugins('Resource', 'Instance')), 1)
+
+    def test_get_plugins(self):
+        config = Config.make(name='test_lookup_config')
+
+        instances = config.get_plugins('Resource', 'Instance')
+        self.assertEqual(len(instances), 1)
+        self.assertIsNot(instances[0], config.get_plugins('Resource', 'Instance')[0])
+        self.assertEqual(config.get_plugins('Resource', 'Missing'), [])
+        self.assertEqual(len(config.get_plugins(plugin_name='DynamoStorage')), 1)
+
+        resources = config.get_plugins(category_name='Resource')
+        self.assertIn('Volume', [resource.__class__.__name__ for resource in resources])
+        self.assertTrue(len(config.get_plugins()) > len(resources))
+
+    def test_make_plugin(self):
+        config = Config.make(name='test_lookup_config')
+
+        volume = config.make_plugin('Resource', 'Volume', provider='AWS')
+        self.assertEqual(volume.__class__.__name__, 'Volume')
+        self.assertIsNot(volume, config.make_plugin('Resource', 'Volume'))
+        self.assertIsNone(config.make_plugin('Resource', 'Volume', provider='gce'))
+        self.assertIsNone(config.make_plugin('Storage', 'Missing'))
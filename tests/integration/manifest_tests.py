@@ -1,10 +1,17 @@
 import os
+import json
 import fnmatch
 
+from attrdict import AttrDict
+from nose.tools import assert_raises
+from shutil import rmtree
+from tempfile import mkdtemp
 from within.shell import working_directory
 
 from shepherd.config import Config
 from shepherd.stack import Stack
+from shepherd.manifest import Manifest, Loader, ParseCache
+from shepherd.common.exceptions import ManifestError
 
 MANIFEST_PATH = 'manifests'
 
@@ -45,3 +52,243 @@ def validate_manifests(path):
             )
 
             Stack.make('TestStack', config)
+
+
+def test_parse_cache():
+    """
+    manifests_tests - test_parse_cache.
+
+    Checks that shared manifest files are only parsed once and
+    that the loaded templates can be modified without affecting the cache.
+    """
+    working_dir = os.path.dirname(os.path.realpath(__file__))
+    filename = os.path.join(working_dir, MANIFEST_PATH, 'simple', 'lamp-manifest.yml')
+    cache = ParseCache()
+
+    first = Loader(filename, cache=cache).run()
+    assert cache.stats == {'hits': 0, 'disk_hits': 0, 'misses': 2}
+
+    first['vars']['instance_type'] = 'modified'
+    second = Loader(filename, cache=cache).run()
+    assert cache.stats == {'hits': 2, 'disk_hits': 0, 'misses': 2}
+    assert second['vars']['instance_type'] == 't1.micro'
+
+    # Every hit is a copy of the cached file
+    second['vars']['instance_type'] = 'modified'
+    third = Loader(filename, cache=cache).run()
+    assert cache.stats == {'hits': 4, 'disk_hits': 0, 'misses': 2}
+    assert third['vars']['instance_type'] == 't1.micro'
+
+
+def test_parse_cache_path():
+    """
+    manifests_tests - test_parse_cache_path.
+
+    Checks that parsed files are shared through the cache directory.
+    """
+    working_dir = os.path.dirname(os.path.realpath(__file__))
+    filename = os.path.join(working_dir, MANIFEST_PATH, 'simple', 'lamp-manifest.yml')
+    cache_dir = mkdtemp()
+
+    try:
+        expected = Loader(filename, cache=ParseCache(path=cache_dir)).run()
+
+        cache = ParseCache(path=cache_dir)
+        assert Loader(filename, cache=cache).run() == expected
+        assert cache.stats == {'hits': 0, 'disk_hits': 2, 'misses': 0}
+    finally:
+        rmtree(cache_dir)
+
+
+def test_loader_includes():
+    """
+    manifests_tests - test_loader_includes.
+
+    Checks that nested includes are resolved relative to the including
+    file and merged in declared order, with or without a thread pool.
+    """
+    tmpdir = mkdtemp()
+    files = {
+        'root.json': {'includes': ['sub/a.json', 'b.json'], 'name': 'root'},
+        'sub/a.json': {'includes': ['../c.json'], 'value': 'a', 'a': True},
+        'b.json': {'includes': ['c.json'], 'value': 'b'},
+        'c.json': {'value': 'c', 'c': True},
+    }
+
+    try:
+        os.mkdir(os.path.join(tmpdir, 'sub'))
+        for name, data in files.items():
+            with open(os.path.join(tmpdir, name), 'w') as fobj:
+                json.dump(data, fobj)
+
+        cwd = os.getcwd()
+        for workers in (1, 4):
+            data = Loader(
+                os.path.join(tmpdir, 'root.json'),
+                cache=ParseCache(),
+                workers=workers
+            ).run()
+
+            assert os.getcwd() == cwd
+            assert data['name'] == 'root'
+            assert data['value'] == 'b'
+            assert data['a'] and data['c']
+    finally:
+        rmtree(tmpdir)
+
+
+def test_loader_circular_includes():
+    """
+    manifests_tests - test_loader_circular_includes.
+    """
+    tmpdir = mkdtemp()
+
+    try:
+        for name, include in (('a.json', 'b.json'), ('b.json', 'a.json')):
+            with open(os.path.join(tmpdir, name), 'w') as fobj:
+                json.dump({'includes': [include]}, fobj)
+
+        assert_raises(
+            ManifestError,
+            Loader(os.path.join(tmpdir, 'a.json'), cache=ParseCache()).run
+        )
+    finally:
+        rmtree(tmpdir)
+
+
+def make_artifact_config(policy, path=None, variables=None):
+    working_dir = os.path.dirname(os.path.realpath(__file__))
+    return Config(
+        AttrDict({
+            'verbosity': 0,
+            'manifest_path': os.path.join(
+                working_dir, MANIFEST_PATH, 'simple', 'lamp-manifest.yml'
+            ),
+            'vars': variables or {
+                'db_password': 'Daisy',
+                'db_root_password': 'Daisy',
+                'db_username': 'Dave',
+                'key_name': 'mytest-key',
+                'webserver_ami': 'ami-abcd1234',
+            },
+            'manifest_artifacts': {'policy': policy, 'path': path},
+        }),
+        'test_artifacts'
+    )
+
+
+def test_artifacts():
+    """
+    manifests_tests - test_artifacts.
+
+    Checks when the manifest debug artifacts are written.
+    """
+    tmpdir = mkdtemp()
+
+    try:
+        manifest = Manifest(make_artifact_config('off'))
+        manifest.load()
+        manifest.parse()
+        manifest.map()
+        assert manifest._working_dir is None
+        assert len(manifest.resources) > 0
+
+        manifest = Manifest(make_artifact_config('always', tmpdir))
+        manifest.load()
+        manifest.parse()
+        manifest.map()
+        manifest.clear()
+
+        artifact_dirs = os.listdir(tmpdir)
+        assert len(artifact_dirs) == 1
+        assert sorted(os.listdir(os.path.join(tmpdir, artifact_dirs[0]))) == [
+            'final.json', 'loaded.json', 'parsed.json'
+        ]
+    finally:
+        rmtree(tmpdir)
+
+
+def test_artifacts_on_error():
+    """
+    manifests_tests - test_artifacts_on_error.
+
+    Checks that the artifacts are only written when a step fails.
+    """
+    manifest = Manifest(make_artifact_config('on_error'))
+    manifest.load()
+    assert manifest._working_dir is None
+
+    variables = {'key_name': None, 'db_username': 'Dave'}
+    manifest = Manifest(make_artifact_config('on_error', variables=variables))
+    manifest.load()
+    assert_raises(ManifestError, manifest.parse)
+
+    try:
+        assert sorted(os.listdir(manifest._working_dir)) == ['loaded.json', 'parsed.json']
+
+        # Each artifact holds the result of its own stage
+        with open(os.path.join(manifest._working_dir, 'loaded.json')) as fobj:
+            assert json.load(fobj)['vars'] == {'instance_type': 't1.micro'}
+
+        with open(os.path.join(manifest._working_dir, 'parsed.json')) as fobj:
+            assert json.load(fobj)['db_username'] == 'Dave'
+    finally:
+        manifest.clear()
+
+
+def test_rebuild():
+    """
+    manifests_tests - test_rebuild.
+
+    Checks that a rebuild only re-renders and reports the resources whose
+    definitions or referenced vars changed.
+    """
+    tmpdir = mkdtemp()
+    filename = os.path.join(tmpdir, 'manifest.json')
+    resources = {
+        'Web': {'type': 'Instance', 'image_id': '{{ ami }}'},
+        'Db': {'type': 'Instance', 'instance_type': '{{ db_type }}'},
+        'Data': {'type': 'Volume', 'size': 10},
+    }
+
+    def write(resources):
+        with open(filename, 'w') as fobj:
+            json.dump({'vars': {}, 'resources': resources}, fobj)
+
+        # Make sure the mtime differs from the previous write
+        mtime = os.path.getmtime(filename) + 1
+        os.utime(filename, (mtime, mtime))
+
+    try:
+        write(resources)
+        config = Config(
+            AttrDict({
+                'verbosity': 0,
+                'manifest_path': filename,
+                'vars': {'ami': 'ami-1', 'db_type': 'm1.small'},
+                'manifest_artifacts': {'policy': 'off'},
+            }),
+            'test_rebuild'
+        )
+        manifest = Manifest(config)
+        manifest.load()
+        manifest.parse()
+        manifest.map()
+        data = manifest.resources[[r['local_name'] for r in manifest.resources].index('Data')]
+
+        assert manifest.rebuild() == {'added': [], 'changed': [], 'removed': []}
+
+        config.settings['vars']['ami'] = 'ami-2'
+        assert manifest.rebuild() == {'added': [], 'changed': ['Web'], 'removed': []}
+        assert data in manifest.resources
+
+        del resources['Db']
+        resources['Data']['size'] = 20
+        resources['Logs'] = {'type': 'Volume', 'size': 5}
+        write(resources)
+
+        assert manifest.rebuild() == {'added': ['Logs'], 'changed': ['Data'], 'removed': ['Db']}
+        web = [r for r in manifest.resources if r['local_name'] == 'Web'][0]
+        assert web['image_id'] == 'ami-2'
+    finally:
+        rmtree(tmpdir)
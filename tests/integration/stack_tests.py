@@ -1,14 +1,17 @@
 import os
+import time
 import fnmatch
+import threading
 
 from unittest import TestCase
+from mock import MagicMock
 from moto import mock_iam, mock_ec2, mock_dynamodb
 
 from within.shell import working_directory
 
 from shepherd.stack import Stack
 from shepherd.config import Config
-from shepherd.common.exceptions import PluginError
+from shepherd.common.exceptions import PluginError, StackError
 
 MANIFEST_PATH = 'manifests/simple'
 
@@ -131,6 +134,16 @@ class TestStack(TestCase):
         bars = self.stack.get_resource_by_type('Bar')
         self.assertEquals(len(bars), 0)
 
+        # Resources without a type attribute are indexed by their class name
+        class Bar(object):
+            local_name = 'TestBar'
+            tags = {}
+
+        bar = Bar()
+        self.stack._resources.append(bar)
+        self.stack.reindex()
+        self.assertEquals(self.stack.get_resource_by_type('Bar'), [bar])
+
     def test_get_resource_by_tags(self):
         self.stack = Stack('test_stack', self.config)
         self.stack.deserialize_resources(self.resources)
@@ -150,6 +163,76 @@ class TestStack(TestCase):
         )
         self.assertEquals(len(resources), 0)
 
+    def test_reindex(self):
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+
+        key = self.stack.get_resource_by_name('TestKey')
+        tags = dict(key.tags)
+        tags['role'] = 'auth'
+        key.tags = tags
+
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'auth'}), [key])
+
+        key.tags['role'] = 'other'
+        self.stack.reindex()
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'auth'}), [])
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'other'}), [key])
+
+        # Only the resource's previously indexed tags are removed
+        key.tags['role'] = 'third'
+        self.stack.reindex(key)
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'other'}), [])
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'third'}), [key])
+        self.assertTrue(len(self.stack.get_resource_by_tags({'stack_name': 'test_stack'})) > 1)
+
+    def test_reindex_threads(self):
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+        resources = [self.stack.get_resource_by_name(r['local_name']) for r in self.resources]
+
+        def retag(resource):
+            for index in range(100):
+                resource.tags = dict(resource.tags, index=index)
+
+        threads = [threading.Thread(target=retag, args=(r,)) for r in resources]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(
+            len(self.stack.get_resource_by_tags({'index': 99})), len(resources)
+        )
+        self.assertEquals(self.stack.get_resource_by_tags({'index': 98}), [])
+
+    def test_create_tags(self):
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+        self.stack.tags['role'] = 'storage'
+
+        volume = self.stack.get_resource_by_name('TestVolume')
+        volume.connection = MagicMock()
+        volume._create_tags()
+
+        self.assertEquals(volume.tags['role'], 'storage')
+        self.assertEquals(self.stack.get_resource_by_tags({'role': 'storage'}), [volume])
+
+    def test_dependency_graph(self):
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+
+        graph = self.stack.get_dependency_graph()
+        self.assertEquals(graph['TestKey'], ('TestUser',))
+        self.assertEquals(graph['TestSecurityGroupIngress'], ('TestSecurityGroup',))
+
+        dependents = self.stack.get_dependents_graph()
+        self.assertEquals(dependents['TestUser'], ['TestKey'])
+        self.assertEquals(dependents['TestKey'], [])
+
+        subset = [self.stack.get_resource_by_name('TestUser')]
+        self.assertEquals(self.stack.get_dependents_graph(subset), {'TestUser': []})
+
     @mock_iam()
     @mock_ec2()
     @mock_dynamodb()
@@ -191,6 +274,66 @@ class TestStack(TestCase):
 
         self.stack._config._settings['storage']['name'] = 'DynamoStorage'
 
+    @mock_dynamodb()
+    def test_flush(self):
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+
+        # New stacks are dirty until first saved
+        self.assertTrue(self.stack.flush())
+        self.assertFalse(self.stack.flush())
+
+        # Saves within the save_interval are deferred until the next flush
+        self.stack.mark_dirty()
+        self.assertTrue(self.stack.flush())
+
+        # Only the changed resource is dumped
+        volume = self.stack.get_resource_by_name('TestVolume')
+        volume._size = 20
+        self.stack.mark_dirty(volume)
+        self.assertTrue(self.stack.flush())
+
+        restored = Stack.restore(self.stack.global_name, self.config)
+        self.assertEquals(restored.get_resource_by_name('TestVolume')._size, 20)
+        self.assertEquals(len(restored.serialize()['resources']), len(self.resources))
+
+    @mock_dynamodb()
+    def test_trailing_save(self):
+        self.config._settings['save_interval'] = 0.2
+        self.stack = Stack('test_stack', self.config)
+        self.stack.deserialize_resources(self.resources)
+        self.stack.save()
+
+        # A change within the save_interval is saved once it expires
+        volume = self.stack.get_resource_by_name('TestVolume')
+        volume._size = 20
+        self.stack.mark_dirty(volume)
+        self.assertTrue(self.stack._dirty)
+
+        deadline = time.time() + 5
+        while self.stack._dirty and time.time() < deadline:
+            time.sleep(0.05)
+
+        self.assertFalse(self.stack._dirty)
+        self.assertIsNone(self.stack._save_timer)
+        restored = Stack.restore(self.stack.global_name, self.config)
+        self.assertEquals(restored.get_resource_by_name('TestVolume')._size, 20)
+
+    @mock_dynamodb()
+    def test_restore_many(self):
+        stacks = [Stack(name, self.config) for name in ('test_stack', 'other_stack')]
+        for stack in stacks:
+            stack.deserialize_resources(self.resources)
+            stack.save()
+
+        names = [stack.global_name for stack in stacks]
+        restored = Stack.restore_many(names, self.config)
+        self.assertEquals([stack.global_name for stack in restored], names)
+        self.assertEquals(len(restored[1].serialize()['resources']), len(self.resources))
+
+        with self.assertRaises(StackError):
+            Stack.restore_many(names + ['test_stack'], self.config)
+
     @mock_iam()
     @mock_ec2()
     @mock_dynamodb()
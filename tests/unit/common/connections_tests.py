@@ -0,0 +1,51 @@
+from unittest import TestCase
+from mock import MagicMock
+
+from shepherd.common.connections import ConnectionPool, get_pool, DEFAULT_POOL
+
+
+class TestConnectionPool(TestCase):
+    def setUp(self):
+        self.connector = MagicMock(side_effect=lambda service, region: object())
+        self.pool = ConnectionPool(connector=self.connector)
+
+    def tearDown(self):
+        pass
+
+    def test_reuse(self):
+        with self.pool.connection('ec2') as conn:
+            first = conn
+
+        with self.pool.connection('ec2') as conn:
+            self.assertIs(conn, first)
+
+        self.assertEquals(self.pool.opened, 1)
+        self.assertEquals(self.pool.reused, 1)
+        self.assertEquals(self.connector.call_count, 1)
+
+    def test_concurrent_checkout(self):
+        with self.pool.connection('ec2') as conn1:
+            with self.pool.connection('ec2') as conn2:
+                self.assertIsNot(conn1, conn2)
+
+        self.assertEquals(self.pool.stats['opened'], 2)
+        self.assertEquals(self.pool.stats['idle'], 2)
+
+    def test_keyed_by_service_and_region(self):
+        with self.pool.connection('ec2'):
+            pass
+        with self.pool.connection('iam'):
+            pass
+        with self.pool.connection('ec2', region='us-west-2'):
+            pass
+
+        self.assertEquals(self.pool.opened, 3)
+        self.assertEquals(self.pool.reused, 0)
+
+    def test_get_pool(self):
+        stack = MagicMock()
+        self.assertIs(get_pool(stack), DEFAULT_POOL)
+        self.assertIs(get_pool(), DEFAULT_POOL)
+
+        stack.connections = self.pool
+        self.assertIs(get_pool(stack), self.pool)
@@ -0,0 +1,177 @@
+import time
+import threading
+
+from unittest import TestCase, skipIf
+
+from shepherd.common.exceptions import ConfigError
+from shepherd.common.executors import execute, AsyncioExecutor
+from shepherd.common.waits import FixedWait, wait_task
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+
+@skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncioExecutor(TestCase):
+    def setUp(self):
+        self.settings = {'executor': 'asyncio', 'max_workers': 2}
+        self.order = []
+        self.lock = threading.Lock()
+
+    def task(self, name, result=True):
+        def function():
+            with self.lock:
+                self.order.append(name)
+            return result
+        return function
+
+    def test_dependencies(self):
+        tasks = [
+            ('c', self.task('c'), ('a', 'b')),
+            ('a', self.task('a'), ()),
+            ('b', self.task('b'), ('a',)),
+        ]
+        results = execute(tasks, self.settings)
+
+        self.assertEquals(results.completed, set(['a', 'b', 'c']))
+        self.assertEquals(results.failed, set())
+        self.assertEquals(self.order, ['a', 'b', 'c'])
+
+    def test_failure_propagates(self):
+        def broken():
+            raise ValueError('boom')
+
+        tasks = [
+            ('a', self.task('a', result=False), ()),
+            ('b', self.task('b'), ('a',)),
+            ('c', broken, ()),
+            ('d', self.task('d'), ('c',)),
+            ('e', self.task('e'), ()),
+        ]
+        results = execute(tasks, self.settings)
+
+        self.assertEquals(results.completed, set(['e']))
+        self.assertEquals(results.failed, set(['a', 'b', 'c', 'd']))
+
+    def test_unknown_dependency(self):
+        results = AsyncioExecutor().run([('a', self.task('a'), ('missing',))])
+        self.assertEquals(results.failed, set(['a']))
+        self.assertEquals(self.order, [])
+
+    def test_many(self):
+        tasks = [('t{}'.format(i), self.task(i), ()) for i in range(200)]
+        results = execute(tasks, self.settings)
+        self.assertEquals(len(results.completed), 200)
+
+    def rendezvous(self, count, timeout=5):
+        """
+        Returns a function which only succeeds once count calls are running.
+        """
+        condition = threading.Condition()
+        arrived = [0]
+
+        def function():
+            deadline = time.time() + timeout
+            with condition:
+                arrived[0] += 1
+                condition.notify_all()
+
+                while arrived[0] < count and time.time() < deadline:
+                    condition.wait(deadline - time.time())
+
+                return arrived[0] >= count
+
+        return function
+
+    def test_concurrent(self):
+        # Every task blocks until all of them are running, so they
+        # only complete if none are queued behind the others.
+        function = self.rendezvous(12)
+        tasks = [('t{}'.format(i), function, ()) for i in range(12)]
+        results = execute(tasks, {'executor': 'asyncio', 'max_workers': 12})
+
+        self.assertEquals(len(results.completed), 12)
+        self.assertEquals(results.failed, set())
+
+    def test_waits(self):
+        # Waits sleep on the loop rather than in the single worker thread
+        def wait(name):
+            results = [False, False, True]
+            return wait_task(name, lambda: results.pop(0), strategy=FixedWait(2, 0.2))
+
+        start = time.time()
+        results = execute(
+            [wait('w{}'.format(i)) for i in range(5)],
+            {'executor': 'asyncio', 'max_workers': 1}
+        )
+
+        self.assertEquals(len(results.completed), 5)
+        self.assertLess(time.time() - start, 1.5)
+
+        results = execute([wait_task('w', lambda: False, strategy=FixedWait(1, 0))], self.settings)
+        self.assertEquals(results.failed, set(['w']))
+
+    def test_wait_cleanup(self):
+        cleaned = []
+        tasks = [
+            wait_task(
+                'w', lambda: False, strategy=FixedWait(1, 0),
+                cleanup=lambda: cleaned.append('w')
+            ),
+            wait_task('x', self.task('x'), cleanup=lambda: cleaned.append('x')),
+        ]
+        results = execute(tasks, self.settings)
+
+        self.assertEquals(results.failed, set(['w']))
+        self.assertEquals(sorted(cleaned), ['w', 'x'])
+
+    def test_blocking_cleanup(self):
+        # A cleanup blocked (ie: behind an in-flight poll) doesn't stall
+        # the loop, so other waits keep polling until they release it.
+        released = threading.Event()
+        blocked = []
+        checks = [False, False, True]
+
+        def check():
+            ready = checks.pop(0)
+            if ready:
+                released.set()
+            return ready
+
+        tasks = [
+            wait_task('a', self.task('a'), cleanup=lambda: blocked.append(released.wait(5))),
+            wait_task('b', check, strategy=FixedWait(2, 0.05)),
+        ]
+        results = execute(tasks, self.settings)
+
+        self.assertEquals(results.completed, set(['a', 'b']))
+        self.assertEquals(blocked, [True])
+
+    def test_nested(self):
+        def resource(name):
+            # Like a resource's create, which runs its own task graph
+            def function():
+                results = execute([
+                    ('a', self.task(name + '.a'), ()),
+                    wait_task('b', self.task(name + '.b'), ('a',)),
+                ])
+                return not results.failed
+            return function
+
+        tasks = [('r{}'.format(i), resource('r{}'.format(i)), ()) for i in range(4)]
+        results = execute(tasks, self.settings)
+
+        self.assertEquals(len(results.completed), 4)
+        self.assertEquals(len(self.order), 8)
+
+    def test_start_fails(self):
+        # A malformed task fails the graph rather than hanging the loop
+        results = execute([('a', self.task('a'))], self.settings)
+        self.assertEquals(results.completed, set())
+        self.assertEquals(results.failed, set(['a']))
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ConfigError):
+            execute([], {'executor': 'foo'})
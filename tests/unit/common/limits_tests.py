@@ -0,0 +1,91 @@
+import time
+import threading
+
+from unittest import TestCase
+from mock import MagicMock
+
+from shepherd.common.connections import ConnectionPool
+from shepherd.common.limits import Limit, Limiter, TokenBucket
+
+
+class TestLimits(TestCase):
+    def setUp(self):
+        self.settings = {
+            'global': {'concurrency': 4},
+            'services': {'ec2': {'concurrency': 1}},
+            'resources': {'Instance': {'concurrency': 2}},
+        }
+
+    def tearDown(self):
+        pass
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, burst=1)
+        start = time.time()
+        for _ in range(5):
+            bucket.acquire()
+
+        self.assertTrue(time.time() - start >= 0.03)
+
+    def test_concurrency(self):
+        limiter = Limiter(self.settings)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            with limiter.service('ec2'):
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.01)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(max(peak), 1)
+        stats = limiter.stats
+        self.assertEquals(stats['service.ec2']['acquired'], 5)
+        self.assertEquals(stats['global']['acquired'], 5)
+        self.assertTrue(stats['service.ec2']['queued'] > 0)
+
+    def test_rate_per_call(self):
+        limiter = Limiter({'services': {'iam': {'concurrency': 1, 'rate': 100, 'burst': 1}}})
+        pool = ConnectionPool(connector=lambda service, region: MagicMock(), limiter=limiter)
+        start = time.time()
+
+        # Every call made in a single checkout takes its own token
+        with pool.connection('iam') as conn:
+            for _ in range(5):
+                conn.add_user_to_group('group', 'user')
+
+        self.assertTrue(time.time() - start >= 0.03)
+        self.assertEquals(limiter.stats['service.iam']['acquired'], 1)
+        self.assertEquals(limiter.stats['service.iam']['throttled'], 5)
+
+    def test_unlimited(self):
+        limiter = Limiter()
+        with limiter.service('iam'):
+            with limiter.resource('Volume'):
+                pass
+
+        self.assertEquals(limiter.stats, {})
+
+    def test_release_on_error(self):
+        limit = Limit(concurrency=1)
+        limiter = Limiter()
+        limiter._resources['Instance'] = limit
+
+        with self.assertRaises(ValueError):
+            with limiter.resource('Instance'):
+                raise ValueError('boom')
+
+        with limiter.resource('Instance'):
+            pass
+
+        self.assertEquals(limit.stats['acquired'], 2)
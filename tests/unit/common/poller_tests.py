@@ -0,0 +1,114 @@
+import time
+import threading
+
+from unittest import TestCase
+from mock import MagicMock
+
+from shepherd.common.poller import BatchPoller, get_poller, DEFAULT_POLLER
+
+
+class TestBatchPoller(TestCase):
+    def setUp(self):
+        self.fetched = []
+
+    def tearDown(self):
+        pass
+
+    def fetch(self, ids):
+        self.fetched.append(list(ids))
+        return dict((i, 'state-{}'.format(i)) for i in ids)
+
+    def test_get(self):
+        poller = BatchPoller()
+        self.assertEquals(poller.get('volumes', 'vol-1', self.fetch), 'state-vol-1')
+        self.assertEquals(self.fetched, [['vol-1']])
+
+    def test_coalesce(self):
+        poller = BatchPoller(interval=60)
+        poller.get('volumes', 'vol-1', self.fetch)
+        poller.get('volumes', 'vol-2', self.fetch)
+
+        # vol-1 is fresh, vol-2 triggered a batch for both
+        self.assertEquals(self.fetched, [['vol-1'], ['vol-1', 'vol-2']])
+
+        poller.get('volumes', 'vol-1', self.fetch)
+        poller.get('volumes', 'vol-2', self.fetch)
+        self.assertEquals(len(self.fetched), 2)
+        self.assertEquals(poller.stats, {'requests': 4, 'fetches': 2})
+
+    def test_concurrent(self):
+        # The first fetch blocks until the other callers are queued behind it
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch(ids):
+            started.set()
+            release.wait(5)
+            return self.fetch(ids)
+
+        poller = BatchPoller()
+        threads = [
+            threading.Thread(target=poller.get, args=('volumes', 'vol-1', fetch))
+            for _ in range(10)
+        ]
+
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+
+        deadline = time.time() + 5
+        while poller.requests < len(threads) and time.time() < deadline:
+            time.sleep(0.01)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        # The queued callers share a single fetch
+        self.assertEquals(poller.stats, {'requests': 10, 'fetches': 2})
+
+    def test_release(self):
+        poller = BatchPoller()
+        poller.get('volumes', 'vol-1', self.fetch)
+        poller.release('volumes', 'vol-1')
+        poller.get('volumes', 'vol-2', self.fetch)
+        self.assertEquals(self.fetched, [['vol-1'], ['vol-2']])
+
+    def test_release_while_fetching(self):
+        poller = BatchPoller()
+
+        def fetch(ids):
+            # The wait gives up on the key during the fetch, without
+            # waiting for the fetch to finish
+            thread = threading.Thread(target=poller.release, args=('volumes', 'vol-1'))
+            thread.start()
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+            return self.fetch(ids)
+
+        # The released key's result is discarded
+        self.assertIsNone(poller.get('volumes', 'vol-1', fetch))
+        self.assertEquals(poller._watched['volumes'], set())
+        self.assertEquals(poller._results['volumes'], {})
+
+    def test_missing(self):
+        poller = BatchPoller()
+        self.assertIsNone(poller.get('volumes', 'vol-1', lambda ids: {}))
+
+    def test_batch_failure(self):
+        def fetch(ids):
+            if 'vol-bad' in ids:
+                raise ValueError('not found')
+            return self.fetch(ids)
+
+        poller = BatchPoller(interval=60)
+        poller.get('volumes', 'vol-1', fetch)
+
+        with self.assertRaises(ValueError):
+            poller.get('volumes', 'vol-bad', fetch)
+
+        self.assertEquals(poller.get('volumes', 'vol-1', fetch), 'state-vol-1')
+
+    def test_get_poller(self):
+        self.assertIs(get_poller(MagicMock()), DEFAULT_POLLER)
@@ -0,0 +1,53 @@
+import os
+import json
+import shutil
+import tempfile
+
+from unittest import TestCase
+from jsonschema import ValidationError
+
+from shepherd.common.schemas import SchemaRegistry
+
+
+class TestSchemas(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.schema_file = os.path.join(self.tmpdir, 'test.schema')
+        self.write_schema(['name'])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_schema(self, required):
+        with open(self.schema_file, 'w') as fobj:
+            json.dump({
+                'type': 'object',
+                'properties': {'name': {'type': 'string'}},
+                'required': required,
+            }, fobj)
+
+    def test_validate(self):
+        registry = SchemaRegistry()
+        registry.validate(self.schema_file, {'name': 'test'})
+
+        with self.assertRaises(ValidationError):
+            registry.validate(self.schema_file, {'name': 1})
+
+        with self.assertRaises(ValidationError):
+            registry.validate(self.schema_file, {})
+
+        self.assertEqual(registry.stats['loads'], 1)
+        self.assertEqual(registry.stats['validations'], 3)
+
+    def test_reload(self):
+        registry = SchemaRegistry()
+        validator = registry.get(self.schema_file)
+        self.assertIs(registry.get(self.schema_file), validator)
+
+        self.write_schema([])
+        mtime = os.path.getmtime(self.schema_file) + 1
+        os.utime(self.schema_file, (mtime, mtime))
+
+        self.assertIsNot(registry.get(self.schema_file), validator)
+        registry.validate(self.schema_file, {})
+        self.assertEqual(registry.stats['loads'], 2)
@@ -0,0 +1,77 @@
+import json
+
+from unittest import TestCase, skipIf
+
+from shepherd.common.exceptions import ConfigError, StorageError
+from shepherd.common.serialization import StackCodec, decode, get_codec, MARKER
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class TestSerialization(TestCase):
+    def setUp(self):
+        self.small = {'local_name': 'foo', 'size': 1, 'tags': ['a', 'b']}
+        self.large = {
+            'local_name': 'foo',
+            'resources': [
+                {'local_name': 'resource{}'.format(i), 'type': 'Volume', 'size': i}
+                for i in range(100)
+            ],
+        }
+
+    def test_json(self):
+        codec = get_codec()
+
+        # Plain json is stored as is behind the marker
+        encoded = codec.encode(self.small)
+        self.assertTrue(encoded.startswith(MARKER + 'json' + MARKER))
+        self.assertEquals(json.loads(encoded.split(MARKER)[2]), self.small)
+        self.assertEquals(decode(encoded), self.small)
+        self.assertEquals(decode(codec.encode(self.large)), self.large)
+
+    def test_compression(self):
+        codec = StackCodec(compression='zlib', threshold=100)
+
+        self.assertEquals(
+            codec.encode(self.small),
+            MARKER + 'json' + MARKER + json.dumps(self.small, separators=(',', ':'))
+        )
+
+        encoded = codec.encode(self.large)
+        self.assertTrue(encoded.startswith(MARKER + 'json+zlib' + MARKER))
+        self.assertLess(len(encoded), len(json.dumps(self.large)))
+        self.assertEquals(decode(encoded), self.large)
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        codec = get_codec({'format': 'msgpack', 'compression': 'zlib'})
+
+        for value in (self.small, self.large):
+            encoded = codec.encode(value)
+            self.assertTrue(encoded.startswith(MARKER + 'msgpack'))
+            self.assertEquals(decode(encoded), value)
+
+    def test_decode(self):
+        # Anything else is returned unchanged
+        for value in ('foo', '{foo', '123', '[1]', '{"a":1}', 123, None, {'foo': 'bar'}):
+            self.assertEquals(decode(value), value)
+
+    def test_decode_legacy(self):
+        # Values stored as unmarked json before codecs
+        self.assertEquals(decode('{"a":1}', legacy=True), {'a': 1})
+        self.assertEquals(decode('[1]', legacy=True), [1])
+
+        for value in ('foo', '{foo', '123', 123, None):
+            self.assertEquals(decode(value, legacy=True), value)
+
+    def test_decode_malformed(self):
+        for value in (MARKER, MARKER + 'json', MARKER + 'foo' + MARKER + '{}',
+                      MARKER + 'json+foo' + MARKER + 'eJy', MARKER + '+zlib' + MARKER):
+            self.assertRaises(StorageError, decode, value)
+
+    def test_invalid(self):
+        self.assertRaises(ConfigError, get_codec, {'format': 'foo'})
+        self.assertRaises(ConfigError, get_codec, {'compression': 'foo'})
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from jinja2 import UndefinedError
+
+from shepherd.common.templates import TemplateEngine, is_template, get_template_engine
+
+
+class TestTemplates(TestCase):
+    def setUp(self):
+        self.context = {'size': 10, 'name': 'web', 'quoted': 'say "hi"\n'}
+
+    def tearDown(self):
+        pass
+
+    def test_is_template(self):
+        self.assertTrue(is_template('{{ size }}'))
+        self.assertTrue(is_template('{% if x %}y{% endif %}'))
+        self.assertFalse(is_template('plain'))
+        self.assertFalse(is_template(10))
+
+    def test_render(self):
+        engine = TemplateEngine()
+        data = {
+            '{{ name }}Server': {
+                'size': '{{ size }}',
+                'count': 2,
+                'enabled': True,
+                'user_data': '#!/bin/bash\necho {{ quoted }}',
+                'groups': ['{{ name }}-group', 'static', None],
+            }
+        }
+
+        result = engine.render(data, self.context)
+        self.assertEqual(result, {
+            'webServer': {
+                'size': '10',
+                'count': 2,
+                'enabled': True,
+                'user_data': '#!/bin/bash\necho say "hi"\n',
+                'groups': ['web-group', 'static', None],
+            }
+        })
+
+        # The source data shouldn't be modified
+        self.assertEqual(data['{{ name }}Server']['size'], '{{ size }}')
+
+    def test_cache(self):
+        engine = TemplateEngine(cache_size=1)
+        engine.render(['{{ size }}', '{{ size }}'], self.context)
+        self.assertEqual(engine.stats, {'compiled': 1, 'hits': 1})
+
+        engine.render(['{{ name }}', '{{ size }}'], self.context)
+        self.assertEqual(engine.stats, {'compiled': 3, 'hits': 1})
+
+    def test_undefined(self):
+        engine = TemplateEngine()
+
+        with self.assertRaises(UndefinedError):
+            engine.render({'size': '{{ missing }}'}, self.context)
+
+    def test_bytecode_cache(self):
+        tmpdir = tempfile.mkdtemp()
+
+        try:
+            engine = TemplateEngine(bytecode_cache=tmpdir)
+            self.assertEqual(engine.render('{{ size }}', self.context), '10')
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+
+            # A new engine should reuse the compiled bytecode
+            engine = TemplateEngine(bytecode_cache=tmpdir)
+            self.assertEqual(engine.render('{{ size }}', self.context), '10')
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_get_template_engine(self):
+        settings = {'cache_size': 10, 'bytecode_cache': None}
+        engine = get_template_engine(settings)
+
+        self.assertIs(get_template_engine(dict(settings)), engine)
+        self.assertIsNot(get_template_engine(), engine)
+        self.assertIsNone(engine.environment.bytecode_cache)
+
+    def test_variables(self):
+        engine = TemplateEngine()
+        data = {
+            '{{ name }}Server': {
+                'size': '{{ size.value }}',
+                'groups': ['{% for g in groups %}{{ g }}{% endfor %}', 'static'],
+                'count': 2,
+            }
+        }
+
+        self.assertEqual(engine.variables(data), set(['name', 'size', 'groups']))
+        self.assertEqual(engine.variables('plain'), set())
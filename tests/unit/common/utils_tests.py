@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from shepherd.common.utils import (
+    AttributeMapping, pascal_to_underscore, setattrs, getattrs
+)
+
+
+class Dummy(object):
+    def __init__(self):
+        self._local_name = None
+        self._volume_id = None
+
+
+class TestUtils(TestCase):
+    def setUp(self):
+        self.attrmap = {
+            'local_name': '_local_name',
+            'volume_id': '_volume_id',
+            'size': '_size',
+        }
+
+    def tearDown(self):
+        pass
+
+    def test_pascal_to_underscore(self):
+        self.assertEqual(pascal_to_underscore('VolumeId'), 'volume_id')
+        self.assertEqual(pascal_to_underscore('SnapshotID'), 'snapshot_id')
+        self.assertEqual(pascal_to_underscore('local_name'), 'local_name')
+        # Cached results should match
+        self.assertEqual(pascal_to_underscore('VolumeId'), 'volume_id')
+
+    def test_mapping_setattrs(self):
+        mapping = AttributeMapping(self.attrmap)
+        data = {'LocalName': 'TestVolume', 'volume_id': 'vol-1234', 'Unknown': 1}
+
+        for _ in range(2):
+            obj = mapping.setattrs(Dummy(), data)
+            self.assertEqual(obj._local_name, 'TestVolume')
+            self.assertEqual(obj._volume_id, 'vol-1234')
+            self.assertFalse(hasattr(obj, '_unknown'))
+
+        expected = setattrs(Dummy(), self.attrmap, data)
+        self.assertEqual(obj.__dict__, expected.__dict__)
+
+        # Only the declared keys are compiled
+        self.assertEqual(
+            sorted(mapping._setters),
+            ['LocalName', 'Size', 'VolumeId', 'local_name', 'size', 'volume_id']
+        )
+
+    def test_mapping_getattrs(self):
+        mapping = AttributeMapping(self.attrmap)
+        obj = Dummy()
+        obj._local_name = 'TestVolume'
+
+        result = mapping.getattrs(obj)
+        self.assertEqual(result, {'local_name': 'TestVolume', 'volume_id': None})
+        self.assertEqual(result, getattrs(obj, self.attrmap))
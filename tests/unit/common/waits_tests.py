@@ -0,0 +1,146 @@
+from unittest import TestCase
+
+from shepherd.common.exceptions import ConfigError
+
+from shepherd.common.waits import ExponentialWait, FixedWait, WaitStats
+from shepherd.common.waits import get_wait_strategy, wait, wait_task, STATS
+
+
+class TestWaits(TestCase):
+    def setUp(self):
+        self.settings = {'retries': 3, 'delay': 0}
+        STATS.clear()
+
+    def tearDown(self):
+        STATS.clear()
+
+    def test_fixed_default(self):
+        strategy = get_wait_strategy(self.settings, 'Volume')
+        self.assertTrue(isinstance(strategy, FixedWait))
+        self.assertEquals(list(strategy.delays()), [0, 0, 0])
+
+    def test_exponential(self):
+        self.settings['wait'] = {
+            'strategy': 'exponential',
+            'jitter': 0,
+            'resources': {'Volume': {'initial': 1, 'max_delay': 3}},
+        }
+        strategy = get_wait_strategy(self.settings, 'Volume')
+        self.assertTrue(isinstance(strategy, ExponentialWait))
+        self.assertEquals(list(strategy.delays()), [1, 2, 3])
+
+    def test_mixed_settings(self):
+        self.settings['wait'] = {
+            'strategy': 'fixed',
+            'initial': 5,
+            'factor': 3,
+            'max_delay': 60,
+            'jitter': 0,
+            'timeout': 100,
+            'resources': {'Volume': {'delay': 2, 'initial': 1}},
+        }
+
+        # Exponential settings are ignored by the fixed strategy
+        strategy = get_wait_strategy(self.settings, 'Instance')
+        self.assertTrue(isinstance(strategy, FixedWait))
+        self.assertEquals(list(strategy.delays()), [0, 0, 0])
+        self.assertEquals(strategy.timeout, 100)
+
+        strategy = get_wait_strategy(self.settings, 'Volume')
+        self.assertEquals(list(strategy.delays()), [2, 2, 2])
+
+        # and the fixed delay by the exponential strategy
+        self.settings['wait']['strategy'] = 'exponential'
+        self.settings['wait']['resources'] = {'Volume': {'delay': 2}}
+        strategy = get_wait_strategy(self.settings, 'Volume')
+        self.assertTrue(isinstance(strategy, ExponentialWait))
+        self.assertEquals(strategy.factor, 3)
+
+    def test_resource_defaults(self):
+        self.settings['wait'] = {'strategy': 'exponential', 'jitter': 0}
+
+        # Types are polled with their own defaults
+        strategy = get_wait_strategy(self.settings, 'SecurityGroup')
+        self.assertEquals((strategy.initial, strategy.max_delay), (0.25, 5))
+
+        strategy = get_wait_strategy(self.settings, 'Instance')
+        self.assertEquals((strategy.initial, strategy.max_delay), (2, 30))
+
+    def test_precedence(self):
+        self.settings['wait'] = {
+            'strategy': 'exponential',
+            'initial': 5,
+            'jitter': 0,
+            'resources': {'Instance': {'max_delay': 10}},
+        }
+
+        # The global settings override the type defaults
+        strategy = get_wait_strategy(self.settings, 'Volume')
+        self.assertEquals((strategy.initial, strategy.max_delay), (5, 15))
+
+        # and are overridden by the type's settings
+        strategy = get_wait_strategy(self.settings, 'Instance')
+        self.assertEquals((strategy.initial, strategy.max_delay), (5, 10))
+
+        # Types without defaults use the global settings
+        self.settings['wait']['max_delay'] = 60
+        strategy = get_wait_strategy(self.settings, 'Custom')
+        self.assertEquals((strategy.initial, strategy.max_delay), (5, 60))
+
+    def test_unknown_strategy(self):
+        self.settings['wait'] = {'strategy': 'foo'}
+        self.assertRaises(ConfigError, get_wait_strategy, self.settings, 'Volume')
+
+    def test_jitter(self):
+        strategy = ExponentialWait(10, initial=1, factor=1, jitter=0.5)
+        for delay in strategy.delays():
+            self.assertTrue(0.5 <= delay <= 1)
+
+    def test_wait(self):
+        results = [False, False, True]
+        result = wait(lambda: results.pop(0), FixedWait(3, 0), label='Volume')
+        self.assertTrue(result)
+        self.assertEquals(STATS.summary()['Volume']['attempts'], 3)
+
+    def test_wait_exhausted(self):
+        result = wait(lambda: False, FixedWait(2, 0), label='Volume')
+        self.assertFalse(result)
+        self.assertEquals(STATS.summary()['Volume']['failed'], 1)
+
+    def test_wait_raises(self):
+        def check():
+            raise ValueError('not ready')
+
+        with self.assertRaises(ValueError):
+            wait(check, FixedWait(1, 0))
+
+    def test_wait_cleanup(self):
+        def check():
+            raise ValueError('not ready')
+
+        cleaned = []
+        _, function, _ = wait_task(
+            'w', check, strategy=FixedWait(1, 0), cleanup=lambda: cleaned.append('w')
+        )
+
+        with self.assertRaises(ValueError):
+            function()
+
+        _, function, _ = wait_task('w', lambda: False, cleanup=lambda: cleaned.append('w'))
+        self.assertFalse(function())
+        self.assertEquals(cleaned, ['w', 'w'])
+
+    def test_timeout(self):
+        result = wait(lambda: False, FixedWait(100, 10, timeout=5))
+        self.assertFalse(result)
+
+    def test_stats(self):
+        stats = WaitStats()
+        stats.record('Instance', 2.0, 2, True)
+        stats.record('Instance', 4.0, 4, True)
+        stats.record('Instance', 10.0, 10, False)
+        summary = stats.summary()['Instance']
+        self.assertEquals(summary['count'], 3)
+        self.assertEquals(summary['mean'], 3.0)
+        self.assertEquals(summary['min'], 2.0)
+        self.assertEquals(summary['max'], 4.0)
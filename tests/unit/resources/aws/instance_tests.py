@@ -5,7 +5,7 @@ from datetime import datetime
 from mock import MagicMock
 from moto import mock_ec2
 
-from shepherd.resources.aws.instance import Instance
+from shepherd.resources.aws.instance import Instance, EPHEMERAL_DEVICES
 from tests.unit import validate_empty_resource
 from tests.unit import validate_deserialized_resource
 from tests.unit import validate_serialized_resource
@@ -85,6 +85,41 @@ class TestInstance(TestCase):
 
         validate_empty_resource(instance)
 
+    def test_shared_state(self):
+        instance = Instance()
+        other = Instance()
+
+        # The attribute map and logger are per class.
+        self.assertIs(instance._attributes_map, other._attributes_map)
+        self.assertIs(instance._logger, other._logger)
+        self.assertEqual(instance._attributes_map['local_name'], '_local_name')
+        self.assertEqual(instance._attributes_map['image_id'], '_image_id')
+        self.assertNotIn('image_id', instance.__dict__)
+
+    def test_block_device_map(self):
+        instance = Instance()
+
+        # Each call gets its own mapping, which it's free to modify
+        mapping = instance._block_device_map
+        self.assertIsNot(mapping, instance._block_device_map)
+
+        del mapping['/dev/sdb']
+        self.assertEqual(
+            dict((device, t.ephemeral_name) for device, t in instance._block_device_map.items()),
+            dict(EPHEMERAL_DEVICES)
+        )
+
+    def test_attributes_map_read_only(self):
+        instance = Instance()
+
+        with self.assertRaises(TypeError):
+            instance._attributes_map['foo'] = '_foo'
+
+        with self.assertRaises(AttributeError):
+            instance._attributes_map = {'foo': '_foo'}
+
+        self.assertNotIn('foo', Instance()._attributes_map)
+
     def test_deserialize(self):
         instance = Instance()
         instance.deserialize(self.test_instance)
@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+
+from datetime import datetime
+
+from shepherd.common.exceptions import StorageError
+
+
+class StorageContract(object):
+    """
+    The tests every local Storage plugin must pass, mixed into a TestCase
+    which defines ``make_store`` to return a plugin configured to use
+    ``self.tmpdir``.
+    """
+    def setUp(self):
+        name_fmt = '{stack_name}_{stack_creation}'
+        self.test_stack = {
+            'local_name': 'MyTestStack',
+            'tags': {
+                'stack_name': 'MyTestStack',
+                'stack_creation': datetime.strftime(
+                    datetime.utcnow(),
+                    "%Y-%m-%d-%H-%M-%S"
+                ),
+            },
+            'resources': [],
+        }
+
+        self.test_stack['global_name'] = name_fmt.format(**self.test_stack['tags'])
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def test_load(self):
+        self.store.dump(self.test_stack)
+
+        stack = self.store.load(self.test_stack['global_name'])
+        self.assertEquals(stack, self.test_stack)
+
+        stack = self.store.load('foo')
+        self.assertIsNone(stack)
+
+    def test_search(self):
+        self.store.dump(self.test_stack)
+
+        stacks = self.store.search(self.test_stack['tags'])
+        self.assertEquals(len(stacks), 1)
+
+        stacks = self.store.search({
+            'stack_creation': self.test_stack['tags']['stack_creation'],
+        })
+        self.assertEquals(len(stacks), 1)
+
+        stacks = self.store.search({'foo': 'bar'})
+        self.assertEquals(len(stacks), 0)
+
+        # Another store sees the updated index
+        other = self.make_store()
+        self.test_stack['tags']['foo'] = 'bar'
+        other.dump(self.test_stack)
+
+        stacks = self.store.search({'foo': 'bar'})
+        self.assertEquals(len(stacks), 1)
+
+        self.store.delete(self.test_stack['global_name'])
+        self.assertEquals(self.store.search({}), [])
+
+    def test_dump_delta(self):
+        self.test_stack['resources'] = [
+            {'local_name': 'foo', 'size': 1},
+            {'local_name': 'bar', 'size': 2},
+        ]
+        self.store.dump(self.test_stack)
+
+        self.store.dump_delta({
+            'global_name': self.test_stack['global_name'],
+            'resource_names': ['bar', 'foo'],
+            'resources': [{'local_name': 'bar', 'size': 3}],
+        })
+
+        stack = self.store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['resources'], [
+            {'local_name': 'bar', 'size': 3},
+            {'local_name': 'foo', 'size': 1},
+        ])
+        self.assertEquals(stack['tags'], self.test_stack['tags'])
+
+    def test_dump_delta_missing(self):
+        delta = {
+            'global_name': self.test_stack['global_name'],
+            'resource_names': ['foo'],
+            'resources': [{'local_name': 'foo', 'size': 1}],
+        }
+
+        self.assertRaises(StorageError, self.store.dump_delta, delta)
+        self.assertIsNone(self.store.load(self.test_stack['global_name']))
+
+    def test_batch(self):
+        stacks = []
+        for index in range(10):
+            stack = dict(self.test_stack)
+            stack['global_name'] = 'MyTestStack/{}'.format(index)
+            stacks.append(stack)
+
+        names = [stack['global_name'] for stack in stacks]
+        self.store.dump_many(stacks)
+        self.assertEquals(self.store.load_many(names), stacks)
+
+        self.store.delete_many(names[:5] + ['foo'])
+        self.assertEquals(self.store.load_many(names[4:6]), [None, stacks[5]])
+        self.assertEquals(len(self.store.search({'stack_name': 'MyTestStack'})), 5)
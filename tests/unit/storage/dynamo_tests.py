@@ -4,6 +4,7 @@ from unittest import TestCase
 from datetime import datetime
 from moto import mock_dynamodb
 
+from shepherd.common.exceptions import ConfigError, StackError, StorageError
 from shepherd.storage.dynamo import DynamoStorage
 
 
@@ -51,10 +52,11 @@ class TestDynamoStorage(TestCase):
         stacks = store.search(self.test_stack['tags'])
         self.assertEquals(len(stacks), 1)
 
+        # The scanned stacks match the loaded ones
         stacks = store.search({
             'stack_creation': self.test_stack['tags']['stack_creation'],
         })
-        self.assertEquals(len(stacks), 1)
+        self.assertEquals(stacks, [self.test_stack])
 
         stacks = store.search({'foo': 'bar'})
         self.assertEquals(len(stacks), 0)
@@ -69,3 +71,228 @@ class TestDynamoStorage(TestCase):
 
         stack = store.load('foo')
         self.assertIsNone(stack)
+
+    @mock_dynamodb
+    def test_dump_delta(self):
+        store = DynamoStorage()
+        self.test_stack['resources'] = [
+            {'local_name': 'foo', 'size': 1},
+            {'local_name': 'bar', 'size': 2},
+        ]
+        store.dump(self.test_stack)
+
+        store.dump_delta({
+            'global_name': self.test_stack['global_name'],
+            'resource_names': ['foo', 'bar'],
+            'resources': [{'local_name': 'bar', 'size': 3}],
+        })
+
+        stack = store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['resources'], [
+            {'local_name': 'foo', 'size': 1},
+            {'local_name': 'bar', 'size': 3},
+        ])
+        self.assertEquals(stack['tags'], self.test_stack['tags'])
+
+        # A store which hasn't seen the stack reads its version first
+        other = DynamoStorage()
+        other.dump_delta({
+            'global_name': self.test_stack['global_name'],
+            'resource_names': ['foo'],
+            'resources': [],
+        })
+        self.assertRaises(StackError, store.dump, self.test_stack)
+
+        # and stacks which were never dumped can't be updated
+        self.assertRaises(StorageError, other.dump_delta, {
+            'global_name': 'foo',
+            'resource_names': [],
+            'resources': [],
+        })
+        self.assertIsNone(other.load('foo'))
+
+    @mock_dynamodb
+    def test_search_index(self):
+        store = DynamoStorage()
+        store.dump(self.test_stack)
+
+        other = dict(self.test_stack)
+        other['global_name'] = 'MyTestStack_other'
+        other['tags'] = dict(self.test_stack['tags'], stack_creation='other')
+        store.dump(other)
+
+        # Served from the index, filtered by the unindexed tag
+        stacks = store.search({'stack_name': 'MyTestStack'})
+        self.assertEquals(len(stacks), 2)
+
+        stacks = store.search({
+            'stack_name': 'MyTestStack',
+            'stack_creation': 'other',
+        })
+        self.assertEquals([s['global_name'] for s in stacks], ['MyTestStack_other'])
+
+        # Changing an indexed tag moves the stack between index keys
+        other['tags']['stack_name'] = 'Renamed'
+        store.dump(other)
+        self.assertEquals(len(store.search({'stack_name': 'MyTestStack'})), 1)
+        self.assertEquals(len(store.search({'stack_name': 'Renamed'})), 1)
+
+        store.delete(self.test_stack['global_name'])
+        self.assertEquals(len(store.search({'stack_name': 'MyTestStack'})), 0)
+
+        conn = boto.connect_dynamodb()
+        table = conn.get_table(store.index_table_name)
+        self.assertEquals(len(list(conn.query(table, 'stack_name=MyTestStack'))), 0)
+
+    @mock_dynamodb
+    def test_dump_version(self):
+        store = DynamoStorage()
+        store.dump(self.test_stack)
+        store.dump(self.test_stack)
+
+        other = DynamoStorage()
+        stack = other.load(self.test_stack['global_name'])
+        self.assertNotIn('version', stack)
+
+        other.dump_delta({
+            'global_name': self.test_stack['global_name'],
+            'resource_names': [],
+            'resources': [],
+        })
+        other.dump(stack)
+
+        # The first store's version is out of date
+        self.assertRaises(StackError, store.dump, self.test_stack)
+
+        conn = boto.connect_dynamodb()
+        table = conn.get_table('stacks')
+        item = conn.get_item(table, self.test_stack['global_name'])
+        self.assertEquals(item['version'], 4)
+
+    @mock_dynamodb
+    def test_dump_unloaded(self):
+        store = DynamoStorage()
+        store.dump(self.test_stack)
+
+        # A store which hasn't loaded the stack reads its version first
+        other = DynamoStorage()
+        stack = dict(self.test_stack)
+        stack['tags'] = dict(self.test_stack['tags'], stack_name='Renamed')
+        other.dump(stack)
+
+        self.assertEquals(other.load(stack['global_name'])['tags'], stack['tags'])
+        self.assertEquals(len(other.search({'stack_name': 'Renamed'})), 1)
+
+        # and removes the index items of its old tags
+        conn = boto.connect_dynamodb()
+        table = conn.get_table(other.index_table_name)
+        self.assertEquals(len(list(conn.query(table, 'stack_name=MyTestStack'))), 0)
+
+        # The first store's version is now out of date
+        self.assertRaises(StackError, store.dump, self.test_stack)
+
+    @mock_dynamodb
+    def test_dump_read(self):
+        store = DynamoStorage()
+        store.configure({'write_mode': 'read'})
+        store.dump(self.test_stack)
+
+        # Reading before writing doesn't depend on the last version seen
+        other = DynamoStorage()
+        other.configure({'write_mode': 'read'})
+        other.dump(self.test_stack)
+        store.dump(self.test_stack)
+        other.dump_many([self.test_stack])
+        store.dump_many([self.test_stack])
+
+        stack = store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['tags'], self.test_stack['tags'])
+
+        self.assertRaises(ConfigError, store.configure, {'write_mode': 'foo'})
+
+    @mock_dynamodb
+    def test_batch(self):
+        store = DynamoStorage()
+        stacks = []
+        for index in range(30):
+            stack = dict(self.test_stack)
+            stack['global_name'] = 'MyTestStack_{}'.format(index)
+            stack['tags'] = dict(self.test_stack['tags'], stack_name='Stack{}'.format(index % 2))
+            stack['resources'] = [{'local_name': 'foo', 'size': index}]
+            stacks.append(stack)
+
+        store.dump_many(stacks)
+
+        conn = boto.connect_dynamodb()
+        names = [stack['global_name'] for stack in stacks]
+        loaded = store.load_many(names + ['foo'])
+        self.assertEquals(len(loaded), 31)
+        self.assertIsNone(loaded[-1])
+        self.assertEquals(loaded[:-1], stacks)
+        self.assertEquals(len(store.search({'stack_name': 'Stack1'})), 15)
+
+        # Versions are kept in sync with the single stack calls
+        store.dump(stacks[0])
+        store.dump_many(stacks[:1])
+        store.dump(stacks[0])
+
+        # A store which hasn't seen the stacks reads their versions
+        other = DynamoStorage()
+        other.dump_many(stacks[:2])
+        item = conn.get_item(conn.get_table('stacks'), names[0])
+        self.assertEquals(item['version'], 5)
+
+        # and the first store's version of those is now out of date,
+        # while the rest are still dumped
+        stacks[2]['resources'] = []
+        self.assertRaises(StackError, store.dump_many, stacks[:3])
+        self.assertEquals(other.load(names[2]), stacks[2])
+
+        store.delete_many(names[:20] + ['foo'])
+        self.assertEquals(store.load_many(names[19:21]), [None, stacks[20]])
+        self.assertEquals(len(store.search({'stack_name': 'Stack1'})), 5)
+
+    @mock_dynamodb
+    def test_codec(self):
+        store = DynamoStorage()
+        store.configure({'codec': {'compression': 'zlib', 'threshold': 100}})
+        self.test_stack['resources'] = [
+            {'local_name': 'foo', 'size': 1},
+            {'local_name': 'bar', 'tags': dict(('tag{}'.format(i), i) for i in range(20))},
+        ]
+        store.dump(self.test_stack)
+
+        conn = boto.connect_dynamodb()
+        item = conn.get_item(conn.get_table('stacks'), self.test_stack['global_name'])
+        self.assertEquals(item['resource.foo'], '\x1fjson\x1f{"local_name":"foo","size":1}')
+        self.assertTrue(item['resource.bar'].startswith('\x1fjson+zlib\x1f'))
+
+        stack = store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['resources'], self.test_stack['resources'])
+
+    @mock_dynamodb
+    def test_decode(self):
+        store = DynamoStorage()
+        self.test_stack['description'] = '[draft] {stack}'
+        self.test_stack['note'] = '{"a":1}'
+        store.dump(self.test_stack)
+
+        # Strings which look like json aren't decoded
+        stack = store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['description'], '[draft] {stack}')
+        self.assertEquals(stack['note'], '{"a":1}')
+
+        # Stacks stored as unmarked json before codecs can still be loaded
+        conn = boto.connect_dynamodb()
+        table = conn.get_table('stacks')
+        conn.put_item(table.new_item(hash_key='legacy', attrs={
+            'local_name': 'legacy',
+            'settings': '{"retries":0}',
+            'resources': '[{"local_name":"foo","size":1}]',
+            'note': '{"a":1}',
+        }))
+
+        stack = store.load('legacy')
+        self.assertEquals(stack['settings'], {'retries': 0})
+        self.assertEquals(stack['resources'], [{'local_name': 'foo', 'size': 1}])
+        self.assertEquals(stack['note'], '{"a":1}')
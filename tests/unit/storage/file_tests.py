@@ -0,0 +1,74 @@
+import os
+
+from unittest import TestCase
+
+from shepherd.common.exceptions import StorageError
+from shepherd.storage.file import FileStorage, INDEX_FILE, STACKS_DIR
+from tests.unit.storage import StorageContract
+
+
+class TestFileStorage(StorageContract, TestCase):
+    def make_store(self):
+        store = FileStorage()
+        store.configure({'path': self.tmpdir})
+        return store
+
+    def test_dump(self):
+        self.store.dump(self.test_stack)
+        self.assertTrue(os.path.exists(self.store.get_filename(self.test_stack['global_name'])))
+
+        self.test_stack['resources'] = [{'local_name': 'foo', 'size': 1}]
+        self.store.dump(self.test_stack)
+
+        # Only the stack document and index are left in the directory
+        self.assertEquals(
+            sorted(os.listdir(self.tmpdir)),
+            sorted(['.lock', INDEX_FILE, STACKS_DIR])
+        )
+        self.assertEquals(
+            os.listdir(os.path.join(self.tmpdir, STACKS_DIR)),
+            [os.path.basename(self.store.get_filename(self.test_stack['global_name']))]
+        )
+
+    def test_index_name(self):
+        # Stack names can't collide with the index
+        for name in ('index', '.lock'):
+            self.store.dump(dict(self.test_stack, global_name=name))
+
+        self.store.dump(self.test_stack)
+        self.assertEquals(self.store.load('index')['global_name'], 'index')
+        self.assertEquals(len(self.store.search({'stack_name': 'MyTestStack'})), 3)
+
+        self.store.reindex()
+        self.assertEquals(len(self.store.search({'stack_name': 'MyTestStack'})), 3)
+
+    def test_reindex(self):
+        self.store.dump(self.test_stack)
+        os.remove(os.path.join(self.tmpdir, INDEX_FILE))
+        self.assertEquals(self.store.search({}), [])
+
+        self.store.reindex()
+        self.assertEquals(self.store.search({}), [self.test_stack])
+
+    def test_codec(self):
+        self.store.configure({'codec': {'compression': 'zlib', 'threshold': 0}})
+        self.store.dump(self.test_stack)
+
+        with open(self.store.get_filename(self.test_stack['global_name'])) as fobj:
+            self.assertTrue(fobj.read().startswith('\x1fjson+zlib\x1f'))
+
+        self.assertEquals(self.store.search({}), [self.test_stack])
+
+    def test_corrupt(self):
+        self.store.dump(self.test_stack)
+        self.store.dump(dict(self.test_stack, global_name='foo'))
+
+        for data in ('{"global_name": "MyTestSta', '"MyTestStack"', '\x1fjson+zlib\x1ffoo'):
+            with open(self.store.get_filename(self.test_stack['global_name']), 'w') as fobj:
+                fobj.write(data)
+
+            self.assertRaises(StorageError, self.store.load, self.test_stack['global_name'])
+
+        # Reindexing skips the corrupt document
+        self.store.reindex()
+        self.assertEquals(sorted(self.store.get_index()), ['foo'])
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+
+from unittest import TestCase
+
+from shepherd.storage.sqlite import SqliteStorage
+from tests.unit.storage import StorageContract
+
+
+class TestSqliteStorage(StorageContract, TestCase):
+    def make_store(self):
+        store = SqliteStorage()
+        store.configure({'path': os.path.join(self.tmpdir, 'stacks.db')})
+        return store
+
+    def test_dump(self):
+        self.store.dump(self.test_stack)
+
+        self.test_stack['resources'] = [{'local_name': 'foo', 'size': 1}]
+        self.store.dump(self.test_stack)
+
+        stack = self.store.load(self.test_stack['global_name'])
+        self.assertEquals(stack['resources'], self.test_stack['resources'])
+
+        # Resources dropped from the stack are removed
+        self.test_stack['resources'] = []
+        self.store.dump(self.test_stack)
+
+        with self.store.connection() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM resources').fetchone()[0]
+        self.assertEquals(count, 0)
+
+    def test_memory(self):
+        # Every thread shares the connection, and so the in-memory database
+        self.store.configure({'path': ':memory:'})
+        thread = threading.Thread(target=self.store.dump, args=(self.test_stack,))
+        thread.start()
+        thread.join()
+
+        self.assertEquals(self.store.load(self.test_stack['global_name']), self.test_stack)
+        self.assertFalse(os.path.exists(os.path.join(os.getcwd(), ':memory:')))
+
+    def test_close(self):
+        self.store.dump(self.test_stack)
+
+        with self.store.connection() as conn:
+            pass
+
+        self.store.close()
+        self.assertRaises(sqlite3.ProgrammingError, conn.execute, 'SELECT 1')
+
+        # The plugin reconnects when it's used again
+        self.assertEquals(self.store.load(self.test_stack['global_name']), self.test_stack)
+
+    def test_threads(self):
+        errors = []
+
+        with self.store.connection() as connected:
+            pass
+
+        def dump(index):
+            try:
+                stack = dict(self.test_stack, global_name='MyTestStack_{}'.format(index))
+                self.store.dump(stack)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=dump, args=(index,)) for index in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(errors, [])
+        self.assertEquals(len(self.store.search({'stack_name': 'MyTestStack'})), 10)
+
+        # The threads all used the connection opened by configure
+        with self.store.connection() as conn:
+            self.assertIs(conn, connected)